@@ -2,88 +2,257 @@
 Gallery API Endpoints
 Traceability: FUN-GALLERY-VIEW
 """
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Body, HTTPException, Query, Request
+from fastapi.responses import FileResponse, StreamingResponse, Response
+from fastapi.concurrency import run_in_threadpool
 from app.models.schemas import GalleryImage, GalleryFilter, GalleryStatistics
-from typing import List
-import os
+from app.services.gallery_index import (
+    gallery_index, sidecar_for, GALLERY_PATH, SORT_COLUMNS, SEARCH_ORDERS,
+    QUALIFIED_ID_SEPARATOR, REFRESH_INTERVAL
+)
+from app.services.gallery_feed import gallery_feed
+from app.services.gallery_export import stream_archive, EXPORT_FORMATS
+from app.services.thumbnails import (
+    thumbnail_service, THUMBNAIL_SIZES, THUMBNAIL_FORMATS,
+    DEFAULT_THUMBNAIL_SIZE, DEFAULT_THUMBNAIL_FORMAT
+)
+from app.services.structured_log import get_logger, log_event
+from app.api.http_cache import is_not_modified
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timedelta
+import asyncio
+import base64
 import json
+import logging
+import time
 
 router = APIRouter()
 
-GALLERY_PATH = Path.home() / "images" / "outputs"
+logger = get_logger("gallery")
+
+# Largest page a client may request with ?limit=
+MAX_PAGE_SIZE = 1000
+
+# Most ids accepted by one bulk delete request
+MAX_BULK_IDS = 10000
+
+# Most changes returned by one /gallery/changes call or stream event
+MAX_CHANGES_PAGE = 1000
+
+# Seconds between keep-alive comments on an idle change stream
+SSE_KEEPALIVE_INTERVAL = 15
+
+# Thumbnail URLs carry the source mtime, so cached tiles never need revalidation
+THUMBNAIL_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Drop thumbnails when images go away (new ones are warmed on ingest)
+gallery_index.listeners.append(thumbnail_service.on_gallery_change)
 
 @router.get("/gallery", response_model=List[GalleryImage])
 async def load_gallery(
     keywords: str = None,
     date_start: str = None,
     date_end: str = None,
-    model: str = None
+    model: str = None,
+    sort: str = "time",
+    order: str = "desc",
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
 ):
     """
     FUN-GALLERY-VIEW-001: Load images from storage directory
     FUN-GALLERY-VIEW-002: Parse metadata from txt files
+    Served from the gallery index as a streamed JSON array. With `limit`,
+    one page is returned and the X-Next-Cursor header holds the cursor for
+    the following page (absent on the last page). X-Gallery-Revision is the
+    change-feed revision to pass as `since` to /gallery/changes.
+    """
+    if not GALLERY_PATH.exists():
+        return []
+    
+    if sort not in SORT_COLUMNS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid sort: {sort}. Use one of: {', '.join(SORT_COLUMNS)}"
+        )
+    if order not in ("asc", "desc"):
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid order: use asc or desc"
+        )
+    
+    query = {
+        "keywords": keywords,
+        "model": model,
+        "start_time": _parse_date(date_start),
+        "end_time": _parse_date(date_end, end_of_day=True),
+        "sort": sort,
+        "descending": order == "desc",
+        "after": _decode_cursor(cursor)
+    }
+    
+    # Read before listing: a change racing the listing is delivered again, never lost
+    headers = {"X-Gallery-Revision": str(await run_in_threadpool(gallery_index.revision))}
+    if limit is None:
+        rows = gallery_index.iter_rows(**query)
+    else:
+        # Fetch one extra row to learn whether another page exists
+        page = await run_in_threadpool(
+            lambda: list(gallery_index.iter_rows(**query, limit=limit + 1))
+        )
+        if len(page) > limit:
+            page = page[:limit]
+            headers["X-Next-Cursor"] = _encode_cursor(page[-1], sort)
+        rows = iter(page)
+    
+    return StreamingResponse(
+        _stream_json_array(rows),
+        media_type="application/json",
+        headers=headers
+    )
+
+@router.get("/gallery/search", response_model=List[GalleryImage])
+async def search_gallery(
+    q: Optional[str] = None,
+    model: Optional[str] = None,
+    seed_min: Optional[int] = None,
+    seed_max: Optional[int] = None,
+    steps_min: Optional[int] = None,
+    steps_max: Optional[int] = None,
+    cfg_min: Optional[float] = None,
+    cfg_max: Optional[float] = None,
+    order: str = "relevance",
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0)
+):
+    """
+    FUN-GALLERY-VIEW-006: Search prompts, negative prompts and models
+    `q` matches whole words (all must occur); "quoted text" matches a phrase
+    and word* a prefix. Results are ranked by relevance or by recency
     """
+    if order not in SEARCH_ORDERS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid order: {order}. Use one of: {', '.join(SEARCH_ORDERS)}"
+        )
     if not GALLERY_PATH.exists():
         return []
     
-    images = []
-    
-    # FUN-GALLERY-VIEW-001: Load all images from outputs directory
-    for subdir in GALLERY_PATH.iterdir():
-        if subdir.is_dir():
-            for image_file in subdir.glob("*.png"):
-                # FUN-GALLERY-VIEW-002: Parse metadata
-                metadata_file = image_file.with_suffix(".txt")
-                if metadata_file.exists():
-                    metadata = _parse_metadata(metadata_file)
-                else:
-                    metadata = {}
-                
-                # Build GalleryImage object with API URLs
-                image_id = image_file.stem
-                image = GalleryImage(
-                    id=image_id,
-                    image_url=f"/api/gallery/image/{image_id}",
-                    thumbnail_url=f"/api/gallery/image/{image_id}",  # Same for now, could optimize with actual thumbnails
-                    prompt=metadata.get("prompt", ""),
-                    model=metadata.get("model", "unknown"),
-                    seed=metadata.get("seed", -1),
-                    parameters=metadata.get("parameters", {}),
-                    timestamp=datetime.fromtimestamp(image_file.stat().st_mtime),
-                    filesize=image_file.stat().st_size,
-                    metadata=metadata
-                )
-                
-                # Apply filters
-                if keywords and keywords.lower() not in image.prompt.lower():
-                    continue
-                if model and model not in image.model:
-                    continue
-                
-                images.append(image)
-    
-    # FUN-GALLERY-VIEW-006: Sort by timestamp descending
-    images.sort(key=lambda x: x.timestamp, reverse=True)
-    
-    return images
+    try:
+        rows = await run_in_threadpool(
+            gallery_index.search,
+            query=q,
+            model=model,
+            ranges={
+                "seed": (seed_min, seed_max),
+                "steps": (steps_min, steps_max),
+                "cfg": (cfg_min, cfg_max)
+            },
+            order=order,
+            limit=limit,
+            offset=offset
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
+    
+    return [_row_to_image(row) for row in rows]
+
+@router.get("/gallery/changes", response_model=Dict)
+async def get_gallery_changes(
+    since: int = Query(..., ge=0),
+    limit: int = Query(MAX_CHANGES_PAGE, ge=1, le=MAX_CHANGES_PAGE)
+):
+    """
+    FUN-GALLERY-VIEW-001: Images added, updated or removed after revision `since`
+    Added/updated entries have the /gallery shape, removed ones are ids.
+    Pass the returned revision as the next `since`; `more` means call again
+    right away. `reset` means `since` is too old: reload /gallery instead.
+    """
+    delta = await run_in_threadpool(gallery_index.changes, since, limit)
+    return _serialize_delta(delta)
+
+@router.get("/gallery/changes/stream")
+async def stream_gallery_changes(since: Optional[int] = Query(None, ge=0)):
+    """
+    FUN-GALLERY-VIEW-028: Gallery deltas as Server-Sent Events
+    A "changes" event (same body as /gallery/changes) follows every finished
+    generation, deletion or change on disk; "reset" asks the client to reload
+    /gallery. Without `since`, the stream starts at the current revision.
+    """
+    if since is None:
+        since = await run_in_threadpool(gallery_index.revision)
+    
+    async def event_stream():
+        revision = since
+        wake = gallery_feed.subscribe()
+        last_sent = time.monotonic()
+        try:
+            yield f"event: revision\ndata: {json.dumps({'revision': revision})}\n\n"
+            while True:
+                wake.clear()
+                delta = await run_in_threadpool(gallery_index.changes, revision, MAX_CHANGES_PAGE)
+                if delta["reset"] or delta["revision"] != revision:
+                    event = "reset" if delta["reset"] else "changes"
+                    yield f"event: {event}\ndata: {json.dumps(_serialize_delta(delta))}\n\n"
+                    revision = delta["revision"]
+                    last_sent = time.monotonic()
+                    if delta["more"]:
+                        continue
+                elif time.monotonic() - last_sent >= SSE_KEEPALIVE_INTERVAL:
+                    yield ": keep-alive\n\n"
+                    last_sent = time.monotonic()
+                try:
+                    # Woken by index commits; the timeout also picks up files
+                    # written by the shell scripts (changes() rescans disk)
+                    await asyncio.wait_for(wake.wait(), timeout=REFRESH_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            gallery_feed.unsubscribe(wake)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @router.get("/gallery/statistics", response_model=GalleryStatistics)
-async def get_gallery_statistics():
+async def get_gallery_statistics(
+    keywords: str = None,
+    date_start: str = None,
+    date_end: str = None,
+    model: str = None
+):
     """
     FUN-GALLERY-VIEW-009 to 011: Calculate gallery statistics
+    Filtered figures use the same filters as /gallery, aggregated in SQL
     """
-    images = await load_gallery()
+    if not GALLERY_PATH.exists():
+        return GalleryStatistics(
+            total_images=0,
+            filtered_images=0,
+            total_storage=0,
+            filtered_storage=0
+        )
     
-    total_storage = sum(img.filesize for img in images)
+    totals = await run_in_threadpool(gallery_index.totals)
+    filtered = await run_in_threadpool(
+        gallery_index.totals,
+        keywords=keywords,
+        model=model,
+        start_time=_parse_date(date_start),
+        end_time=_parse_date(date_end, end_of_day=True)
+    )
     
     return GalleryStatistics(
-        total_images=len(images),
-        filtered_images=len(images),
-        total_storage=total_storage,
-        filtered_storage=total_storage
+        total_images=totals["count"],
+        filtered_images=filtered["count"],
+        total_storage=totals["size"],
+        filtered_storage=filtered["size"]
     )
 
 @router.get("/gallery/image/{image_id}")
@@ -91,20 +260,55 @@ async def get_gallery_image(image_id: str):
     """
     FUN-GALLERY-VIEW-020: Serve full-size image
     """
-    # Find image file
-    for subdir in GALLERY_PATH.iterdir():
-        if subdir.is_dir():
-            image_file = subdir / f"{image_id}.png"
-            if image_file.exists():
-                return FileResponse(
-                    image_file,
-                    media_type="image/png",
-                    filename=image_file.name
-                )
-    
-    raise HTTPException(
-        status_code=404,
-        detail=f"Image {image_id} not found"
+    image_file = await _resolve_image(image_id)
+    return FileResponse(
+        image_file,
+        media_type="image/png",
+        filename=image_file.name
+    )
+
+@router.get("/gallery/thumbnail/{image_id}")
+async def get_gallery_thumbnail(
+    image_id: str,
+    request: Request,
+    size: int = DEFAULT_THUMBNAIL_SIZE,
+    format: str = DEFAULT_THUMBNAIL_FORMAT
+):
+    """
+    FUN-GALLERY-VIEW-003: Serve cached thumbnail
+    STK-BACKEND-016: Rendered on first request (or pre-warmed) and kept on disk
+    """
+    if size not in THUMBNAIL_SIZES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid size: {size}. Use one of: {', '.join(map(str, THUMBNAIL_SIZES))}"
+        )
+    if format not in THUMBNAIL_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid format: {format}. Use one of: {', '.join(THUMBNAIL_FORMATS)}"
+        )
+    
+    image_file = await _resolve_image(image_id)
+    etag = thumbnail_service.etag(image_file, size, format)
+    headers = {"ETag": etag, "Cache-Control": THUMBNAIL_CACHE_CONTROL}
+    
+    if is_not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    
+    try:
+        thumbnail_file = await thumbnail_service.get(image_file, size, format)
+    except Exception as e:
+        log_event(logger, "thumbnail_render_failed", level=logging.ERROR, image_id=image_id, error=str(e))
+        raise HTTPException(
+            status_code=500,
+            detail=f"Could not render thumbnail for {image_id}"
+        )
+    
+    return FileResponse(
+        thumbnail_file,
+        media_type=THUMBNAIL_FORMATS[format][1],
+        headers=headers
     )
 
 @router.delete("/gallery/image/{image_id}")
@@ -112,71 +316,204 @@ async def delete_gallery_image(image_id: str):
     """
     FUN-GALLERY-VIEW-027: Delete image from storage
     """
-    # Find and delete image file and metadata
-    for subdir in GALLERY_PATH.iterdir():
-        if subdir.is_dir():
-            image_file = subdir / f"{image_id}.png"
-            metadata_file = subdir / f"{image_id}.txt"
-            
-            if image_file.exists():
-                # FUN-GALLERY-VIEW-027: Delete image and metadata
-                deleted_files = []
-                
-                if image_file.exists():
-                    image_file.unlink()
-                    deleted_files.append(str(image_file))
-                
-                if metadata_file.exists():
-                    metadata_file.unlink()
-                    deleted_files.append(str(metadata_file))
-                
-                return {
-                    "deleted": True,
-                    "deleted_files": deleted_files
-                }
-    
-    raise HTTPException(
-        status_code=404,
-        detail=f"Image {image_id} not found"
-    )
+    image_file = await _resolve_image(image_id)
+    
+    # FUN-GALLERY-VIEW-027: Delete image and metadata
+    deleted_files = await run_in_threadpool(_delete_files, image_file)
+    await run_in_threadpool(gallery_index.remove_file, image_file)
+    
+    return {
+        "deleted": True,
+        "deleted_files": deleted_files
+    }
 
-def _parse_metadata(metadata_file: Path) -> dict:
+@router.post("/gallery/delete")
+async def delete_gallery_images(ids: List[str] = Body(..., embed=True)):
     """
-    Parse metadata from .txt file
-    Expected format: key: value pairs
+    FUN-GALLERY-VIEW-027: Delete several images (and their metadata) in one call
+    Ids that are unknown or ambiguous are reported rather than failing the batch
     """
-    metadata = {}
-    try:
-        with open(metadata_file, "r") as f:
-            content = f.read()
-            
-            # Try JSON format first
-            try:
-                metadata = json.loads(content)
-                return metadata
-            except json.JSONDecodeError:
-                pass
-            
-            # Parse key: value format
-            for line in content.split("\n"):
-                if ":" in line:
-                    key, value = line.split(":", 1)
-                    key = key.strip().lower()
-                    value = value.strip()
-                    
-                    if key == "prompt":
-                        metadata["prompt"] = value
-                    elif key == "model":
-                        metadata["model"] = value
-                    elif key == "seed":
-                        try:
-                            metadata["seed"] = int(value)
-                        except ValueError:
-                            metadata["seed"] = -1
-                    elif key in ["steps", "cfg", "width", "height"]:
-                        metadata.setdefault("parameters", {})[key] = value
+    if len(ids) > MAX_BULK_IDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BULK_IDS} ids per request"
+        )
     
-    except Exception as e:
-        print(f"Error parsing metadata: {e}")
+    def delete_all():
+        deleted_ids, not_found, ambiguous = [], [], []
+        deleted_files = []
+        removed = []
+        for image_id in dict.fromkeys(ids):
+            paths = [] if "/" in image_id or ".." in image_id else gallery_index.resolve(image_id)
+            if len(paths) > 1:
+                ambiguous.append(image_id)
+            elif not paths or not paths[0].exists():
+                not_found.append(image_id)
+            else:
+                deleted_files.extend(_delete_files(paths[0]))
+                removed.append(paths[0])
+                deleted_ids.append(image_id)
+        gallery_index.remove_files(removed)
+        return {
+            "deleted": deleted_ids,
+            "not_found": not_found,
+            "ambiguous": ambiguous,
+            "deleted_files": deleted_files
+        }
+    
+    return await run_in_threadpool(delete_all)
+
+@router.get("/gallery/export")
+async def export_gallery(
+    ids: Optional[List[str]] = Query(None),
+    keywords: str = None,
+    date_start: str = None,
+    date_end: str = None,
+    model: str = None,
+    format: str = "zip"
+):
+    """
+    Download images with their metadata sidecars as a zip or tar archive
+    Selects the given ids, or everything matching the /gallery filters;
+    the archive is streamed while it is built
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid format: {format}. Use one of: {', '.join(EXPORT_FORMATS)}"
+        )
+    
+    if ids:
+        paths = []
+        for image_id in ids:
+            paths.append(await _resolve_image(image_id))
+    else:
+        rows = gallery_index.iter_rows(
+            keywords=keywords,
+            model=model,
+            start_time=_parse_date(date_start),
+            end_time=_parse_date(date_end, end_of_day=True)
+        )
+        paths = (Path(row["path"]) for row in rows)
+    
+    filename = f"gallery_export_{datetime.now():%Y%m%d_%H%M%S}.{format}"
+    return StreamingResponse(
+        stream_archive(_export_entries(paths), format),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+def _export_entries(paths: Iterable[Path]) -> Iterator[Tuple[str, Path]]:
+    """Archive names (run folder/file) for each image and its sidecar"""
+    for image_file in paths:
+        yield f"{image_file.parent.name}/{image_file.name}", image_file
+        sidecar = sidecar_for(image_file)
+        if sidecar is not None:
+            yield f"{image_file.parent.name}/{sidecar.name}", sidecar
+
+def _delete_files(image_file: Path) -> List[str]:
+    """Unlink an image and its sidecar; returns the paths removed"""
+    deleted_files = []
+    metadata_file = sidecar_for(image_file)
+    for path in (image_file, metadata_file):
+        if path is not None and path.exists():
+            path.unlink()
+            deleted_files.append(str(path))
+    return deleted_files
+
+async def _resolve_image(image_id: str) -> Path:
+    """Look up an image path by id through the gallery index"""
+    if "/" in image_id or ".." in image_id or not GALLERY_PATH.exists():
+        raise HTTPException(
+            status_code=404,
+            detail=f"Image {image_id} not found"
+        )
     
-    return metadata
+    paths = await run_in_threadpool(gallery_index.resolve, image_id)
+    if len(paths) > 1:
+        raise HTTPException(
+            status_code=409,
+            detail=(
+                f"Image id {image_id} exists in several run folders; use one of: "
+                + ", ".join(f"{path.parent.name}{QUALIFIED_ID_SEPARATOR}{image_id}" for path in paths)
+            )
+        )
+    if not paths or not paths[0].exists():
+        raise HTTPException(
+            status_code=404,
+            detail=f"Image {image_id} not found"
+        )
+    return paths[0]
+
+def _row_to_image(row: dict) -> dict:
+    """Serialize an index row in the GalleryImage shape, with API URLs"""
+    image_id = row["image_id"]
+    return {
+        "id": image_id,
+        "image_url": f"/api/gallery/image/{image_id}",
+        "thumbnail_url": f"/api/gallery/thumbnail/{image_id}?v={int(row['mtime'])}",
+        "prompt": row["prompt"],
+        "model": row["model"],
+        "seed": row["seed"],
+        "parameters": row["parameters"],
+        "timestamp": datetime.fromtimestamp(row["mtime"]).isoformat(),
+        "filesize": row["size"],
+        "metadata": row["metadata"]
+    }
+
+def _serialize_delta(delta: dict) -> dict:
+    return {
+        **delta,
+        "added": [_row_to_image(row) for row in delta["added"]],
+        "updated": [_row_to_image(row) for row in delta["updated"]]
+    }
+
+def _stream_json_array(rows: Iterator[dict], chunk_size: int = 100) -> Iterator[bytes]:
+    """Encode rows as a JSON array in chunks so the first images go out immediately"""
+    yield b"["
+    chunk = []
+    first = True
+    for row in rows:
+        chunk.append(json.dumps(_row_to_image(row)))
+        if len(chunk) >= chunk_size:
+            yield (("" if first else ",") + ",".join(chunk)).encode()
+            first = False
+            chunk = []
+    if chunk:
+        yield (("" if first else ",") + ",".join(chunk)).encode()
+    yield b"]"
+
+def _encode_cursor(row: dict, sort: str) -> str:
+    """Opaque keyset cursor: the last row's sort value and path"""
+    keyset = [row[SORT_COLUMNS[sort]], row["path"]]
+    return base64.urlsafe_b64encode(json.dumps(keyset).encode()).decode()
+
+def _decode_cursor(cursor: Optional[str]) -> Optional[tuple]:
+    if not cursor:
+        return None
+    try:
+        value, path = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid cursor"
+        )
+    return (value, path)
+
+def _parse_date(value: Optional[str], end_of_day: bool = False) -> Optional[float]:
+    """
+    Parse an ISO date/datetime filter into a timestamp
+    Bare dates used as an end bound include the whole day
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid date: {value}"
+        )
+    if end_of_day and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed.timestamp()
@@ -2,60 +2,227 @@
 Generation API Endpoints
 Traceability: FUN-GEN-REQUEST, FUN-BATCH-GEN, FUN-SEQUENCE-GEN
 """
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Request
+from fastapi.responses import Response, StreamingResponse
 from app.models.schemas import (
     GenerationRequest, GenerationResponse,
     BatchRequest, BatchProgress,
     SequenceRequest, SequencePrompts
 )
 from app.services.comfyui import comfyui_service
+from app.services.progress import job_tracker, TERMINAL_STATUSES
+from app.services.pool import comfyui_pool
+from app.services.job_store import job_store, generation_record, FINISHED_STATUSES
+from app.services.batch import run_batch, save_batch, current_image
+from app.services.output_cache import output_cache, output_url
+from app.services.workflows import PRESET_BINDINGS, workflow_registry
+from app.services.scheduler import generation_scheduler
+from app.services.result_cache import result_cache, workflow_hash
+from app.services.ingest import gallery_ingester
+from app.services.uploads import upload_store, UploadTooLarge
+from app.services.sequence import (
+    plan_sequence, frame_event, frame_workflow, sequence_engine, sequence_summary,
+    UNFINISHED_FRAME_STATUSES
+)
+from app.services.node_schema import check_workflow, WorkflowError
+from app.services.admission import admission_control, AdmissionRejected
+from app.services.structured_log import get_logger, log_event, LOG_SAMPLE_RATE
+from app.api.http_cache import IMMUTABLE_CACHE_CONTROL, cached_file_response
+import asyncio
+import json
 import uuid
-from typing import Dict
+from collections import Counter
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+# Seconds between SSE keep-alive comments
+SSE_KEEPALIVE_INTERVAL = 15
 
 router = APIRouter()
 
-# In-memory storage for generation status (production would use Redis/database)
-generation_status: Dict[str, Dict] = {}
+logger = get_logger("generation")
+
+# Copy every finished generation into the gallery in the background
+generation_scheduler.listeners.append(gallery_ingester.on_job_complete)
+
+# Seconds a job followed with cancel_on_disconnect may go unwatched before it
+# is cancelled (EventSource reconnects within a few seconds)
+ABANDONED_JOB_GRACE = 10
+
+# Running batch tasks (held so they are not garbage collected mid-run)
+batch_tasks: Dict[str, asyncio.Task] = {}
+
+# Open event streams per request id, and pending auto-cancels of abandoned jobs
+event_streams: Counter = Counter()
+abandon_tasks: Set[asyncio.Task] = set()
 
 @router.post("/generate", response_model=GenerationResponse)
-async def generate_image(request: GenerationRequest):
+async def generate_image(request: GenerationRequest, http_request: Request):
     """
     FUN-GEN-REQUEST: Submit single image generation request
     STK-BACKEND-011: /api prefix
     """
     # FUN-GEN-REQUEST-001 to 006: Validation (handled by Pydantic)
-    
-    # STK-BACKEND-029: Check ComfyUI availability
-    if not comfyui_service.is_available():
+    return await _queue_generation(request.dict(), _client_id(http_request))
+
+@router.get("/workflows", response_model=Dict)
+async def list_workflow_presets():
+    """
+    FUN-GEN-REQUEST-007: Workflow presets and the request fields each accepts
+    """
+    return workflow_registry.presets()
+
+@router.post("/workflows/{preset}/generate", response_model=GenerationResponse)
+async def generate_with_preset(preset: str, params: Dict, request: Request):
+    """
+    FUN-GEN-REQUEST: Submit a generation using any workflow preset
+    Body fields are bound onto the preset's nodes (see GET /workflows)
+    """
+    if preset not in PRESET_BINDINGS:
         raise HTTPException(
-            status_code=503,
-            detail="ComfyUI server not available. Please ensure it is running on port 8188."
+            status_code=404,
+            detail=f"Workflow preset {preset} not found"
         )
-    
+    return await _queue_generation(params, _client_id(request), preset=preset)
+
+@router.post("/uploads", response_model=Dict)
+async def upload_source_image(request: Request):
+    """
+    FUN-GEN-REQUEST: Store a source image for img2img/upscale
+    multipart/form-data with the file in field "image". The returned name
+    goes in the "image" field of /workflows/img2img|upscale/generate;
+    identical images get the same name and are stored and sent to ComfyUI once.
+    """
+    _, upload = await _receive_upload(request)
+    return upload._asdict()
+
+@router.post("/img2img", response_model=GenerationResponse)
+async def generate_img2img(request: Request):
+    """
+    FUN-GEN-REQUEST: img2img from an uploaded source image
+    multipart/form-data: "image" file plus prompt, model and optionally
+    negative_prompt, seed, steps, cfg, denoise
+    """
+    return await _queue_upload_generation(request, preset="img2img")
+
+@router.post("/upscale", response_model=GenerationResponse)
+async def generate_upscale(request: Request):
+    """
+    FUN-GEN-REQUEST: Upscale an uploaded image
+    multipart/form-data: "image" file plus optional upscale_model
+    """
+    return await _queue_upload_generation(request, preset="upscale")
+
+async def _receive_upload(request: Request):
+    """Stream the multipart body into the upload store"""
+    try:
+        return await upload_store.receive(request.headers.get("content-type", ""), request.stream())
+    except UploadTooLarge as e:
+        raise HTTPException(
+            status_code=413,
+            detail=str(e)
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
+
+async def _queue_upload_generation(request: Request, preset: str) -> GenerationResponse:
+    # Turn a client away before its upload is streamed in, not after
+    client = _client_id(request)
+    _admit(client)
+    form, upload = await _receive_upload(request)
+    try:
+        params = workflow_registry.parse_form(preset, form)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=422,
+            detail=str(e)
+        )
+    params["image"] = upload.image
+    return await _queue_generation(params, client, preset=preset)
+
+def _client_id(request: Request) -> str:
+    """Client that admission limits apply to (its address)"""
+    return request.client.host if request.client else "unknown"
+
+def _admit(client: str, units: int = 1, priority: str = "interactive"):
+    """Admission control: 429 with Retry-After while the client or queue is over its limit"""
+    try:
+        admission_control.check(client, units, priority)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=429,
+            detail=e.detail,
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=422,
+            detail=str(e)
+        )
+
+async def _queue_generation(
+    request_data: Dict,
+    client: str,
+    preset: str = "txt2img_basic"
+) -> GenerationResponse:
+    """Build, submit and start tracking one generation"""
     # FUN-GEN-REQUEST-007: Construct workflow JSON
-    workflow = comfyui_service.construct_workflow(request.dict())
+    try:
+        workflow = comfyui_service.construct_workflow(request_data, preset=preset)
+    except KeyError:
+        raise _preset_unavailable(preset)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=422,
+            detail=str(e)
+        )
+    
+    await _validate_workflow(workflow, preset)
     
-    # FUN-GEN-REQUEST-008: Submit to ComfyUI
-    result = comfyui_service.submit_generation(workflow)
+    missing = upload_store.missing(workflow)
+    if missing:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Unknown upload(s): {', '.join(missing)}. Upload via POST /api/uploads first."
+        )
     
-    print(f"[DEBUG] ComfyUI submit result: {result}")
+    # Fixed-seed workflows always render the same image: reuse earlier work
+    cache_key = None
+    if workflow_registry.is_deterministic(preset, request_data):
+        cache_key = workflow_hash(workflow)
+        images = result_cache.lookup(cache_key)
+        if images is not None:
+            return await _cached_generation(preset, images)
+        request_id = result_cache.inflight(cache_key)
+        if request_id is not None:
+            # Identical prompt already queued/running: share its request_id
+            return GenerationResponse(
+                request_id=request_id,
+                status="queued"
+            )
     
-    if not result or "prompt_id" not in result:
+    # STK-BACKEND-029: Check ComfyUI availability (from the background prober)
+    if not comfyui_pool.is_available():
         raise HTTPException(
-            status_code=500,
-            detail="Failed to submit generation request to ComfyUI"
+            status_code=503,
+            detail="ComfyUI server not available. Please ensure it is running on port 8188."
         )
     
-    # FUN-GEN-REQUEST-009: Extract prompt_id
-    request_id = result["prompt_id"]
+    # Cache hits and shared results above cost no GPU time, so are never refused
+    _admit(client)
     
-    print(f"[DEBUG] Using request_id: {request_id}")
+    # FUN-GEN-REQUEST-008: Queue for submission to ComfyUI in model-affinity order
+    # FUN-GEN-REQUEST-009: The request_id doubles as the ComfyUI prompt_id
+    request_id = generation_scheduler.enqueue(workflow, preset=preset, client=client)
+    if cache_key is not None:
+        result_cache.begin(cache_key, request_id)
     
-    # Store initial status
-    generation_status[request_id] = {
-        "status": "queued",
-        "request": request.dict()
-    }
+    log_event(logger, "generation_queued", request_id=request_id, preset=preset)
+    
+    # Store a compact record (shared with other workers when using the SQLite store)
+    await job_store.put_async(request_id, generation_record(preset, "queued"))
     
     # FUN-GEN-REQUEST-010: Return response with request_id
     return GenerationResponse(
@@ -63,23 +230,89 @@ async def generate_image(request: GenerationRequest):
         status="queued"
     )
 
+def _preset_unavailable(preset: str) -> HTTPException:
+    """Error for a KeyError from building a preset: unknown (422) or its file failed to load (503)"""
+    if preset not in PRESET_BINDINGS:
+        return HTTPException(
+            status_code=422,
+            detail=f"Unknown workflow preset: {preset}"
+        )
+    return HTTPException(
+        status_code=503,
+        detail=f"Workflow preset {preset} is unavailable: its file failed to load"
+    )
+
+async def _validate_workflow(workflow: Dict, preset: str):
+    """
+    Check a built workflow against the cached ComfyUI node schema so it is
+    refused here, in the shape of FastAPI's own 422s, not after a submit
+    """
+    errors = await check_workflow(workflow)
+    if errors:
+        raise HTTPException(
+            status_code=422,
+            detail=[_workflow_error(preset, error) for error in errors]
+        )
+
+def _workflow_error(preset: str, error: WorkflowError) -> Dict:
+    """Locate an error at the request field bound to the input, else at the node"""
+    field = workflow_registry.field_for(preset, error.node_id, error.input) if error.input else None
+    if field is not None:
+        loc = ["body", field]
+    else:
+        loc = ["workflow", error.node_id] + ([error.input] if error.input else [])
+    return {
+        "loc": loc,
+        "msg": error.message,
+        "type": "value_error.workflow",
+        "node": {"id": error.node_id, "class_type": error.class_type}
+    }
+
+async def _cached_generation(preset: str, images: List[Dict]) -> GenerationResponse:
+    """Answer a request from the result cache under a fresh, already completed request_id"""
+    request_id = str(uuid.uuid4())
+    job_tracker.complete(request_id, images)
+    await job_store.put_async(request_id, {**generation_record(preset, "completed", images), "cached": True})
+    return _job_response(request_id, job_tracker.get(request_id))
+
 @router.get("/generate/status/{request_id}", response_model=GenerationResponse)
 async def get_generation_status(request_id: str):
     """
     FUN-GEN-REQUEST-011: Poll generation status
     FUN-GEN-REQUEST-012: Update progress indicator
     """
-    # FUN-GEN-REQUEST-011: Poll ComfyUI /history endpoint
-    history = comfyui_service.get_generation_status(request_id)
+    # Served from the websocket-fed job table while the event stream is up
+    job = job_tracker.get(request_id)
+    node = comfyui_pool.node_for_job(request_id)
+    if job is not None and (
+        node is None or node.listener.connected or job["status"] in TERMINAL_STATUSES
+    ):
+        # Not yet dispatched jobs are only known to the scheduler
+        return _job_response(request_id, job)
     
-    print(f"[DEBUG] Polling status for: {request_id}")
-    print(f"[DEBUG] History response: {history}")
-    print(f"[DEBUG] Keys in history: {list(history.keys()) if history else 'None'}")
+    # Finished here or on another worker
+    record = await job_store.get_async(request_id)
+    if record is not None and record["status"] in FINISHED_STATUSES:
+        return _job_response(request_id, record)
+    
+    # FUN-GEN-REQUEST-011: Fall back to polling /history on the instance running the job
+    instance = record.get("instance") if record else None
+    service = comfyui_pool.service_for_job(request_id, instance)
+    history = await service.get_generation_status(request_id)
+    
+    log_event(
+        logger,
+        "status_history_fallback",
+        sample_rate=LOG_SAMPLE_RATE,
+        request_id=request_id,
+        instance=service.base_url,
+        found=bool(history and request_id in history)
+    )
     
     # If not in history yet, it's still processing/queued
     if not history or request_id not in history:
         # Check if we know about this request_id
-        if request_id in generation_status:
+        if record is not None:
             return GenerationResponse(
                 request_id=request_id,
                 status="processing"
@@ -100,11 +333,11 @@ async def get_generation_status(request_id: str):
             # Find first image in outputs
             for node_outputs in outputs.values():
                 if "images" in node_outputs and node_outputs["images"]:
-                    filename = node_outputs["images"][0]["filename"]
+                    image = {**node_outputs["images"][0], "instance": service.instance_id}
                     return GenerationResponse(
                         request_id=request_id,
                         status="completed",
-                        image_url=f"/api/generate/image/{filename}"
+                        image_url=output_url(image)
                     )
         
         return GenerationResponse(
@@ -128,56 +361,264 @@ async def get_generation_status(request_id: str):
         status="processing"
     )
 
+@router.delete("/generate/{request_id}", response_model=Dict)
+async def cancel_generation(request_id: str):
+    """
+    Cancel a generation: dropped if it has not reached ComfyUI yet, removed
+    from ComfyUI's queue if it is waiting there, interrupted if it is running.
+    A job shared by identical requests keeps running until all of them cancel
+    (stage "detached" for the others).
+    """
+    job = job_tracker.get(request_id)
+    if job is None and await job_store.get_async(request_id) is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Generation request {request_id} not found"
+        )
+    if job is not None and job["status"] in TERMINAL_STATUSES:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Generation request {request_id} has already finished ({job['status']})"
+        )
+    
+    stage = await _cancel_request(request_id)
+    if stage is None:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Generation request {request_id} could not be cancelled here"
+        )
+    return {"request_id": request_id, "status": "cancelled", "stage": stage}
+
+@router.get("/generate/queue", response_model=Dict)
+async def get_generation_queue():
+    """
+    Jobs held by the backend scheduler, in projected dispatch order,
+    with the estimated seconds until each one starts
+    """
+    return generation_scheduler.snapshot()
+
+@router.get("/generate/events/{request_id}")
+async def stream_generation_events(request_id: str, cancel_on_disconnect: bool = False):
+    """
+    FUN-GEN-REQUEST-012: Push progress updates as Server-Sent Events
+    Each event carries status, executing node, step progress and image_url;
+    with cancel_on_disconnect=true the job is cancelled once no stream has
+    followed it for ABANDONED_JOB_GRACE seconds
+    """
+    if job_tracker.get(request_id) is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Generation request {request_id} not found"
+        )
+    
+    async def event_stream():
+        queue = job_tracker.subscribe(request_id)
+        event_streams[request_id] += 1
+        job = job_tracker.get(request_id)
+        try:
+            yield _sse_event(request_id, job)
+            while job["status"] not in TERMINAL_STATUSES:
+                try:
+                    job = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _sse_event(request_id, job)
+        finally:
+            job_tracker.unsubscribe(request_id, queue)
+            event_streams[request_id] -= 1
+            if not event_streams[request_id]:
+                del event_streams[request_id]
+            if cancel_on_disconnect and job["status"] not in TERMINAL_STATUSES:
+                _cancel_when_abandoned(
+                    lambda: request_id in event_streams,
+                    lambda: _cancel_request(request_id)
+                )
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _cancel_request(request_id: str) -> Optional[str]:
+    """Cancel a job for one of its requesters; see cancel_generation"""
+    if not result_cache.release(request_id):
+        return "detached"
+    return await generation_scheduler.cancel(request_id)
+
+def _cancel_when_abandoned(watched: Callable[[], bool], cancel: Callable[[], Awaitable]):
+    """Run `cancel` unless a client follows the work again within the grace period"""
+    async def cancel_later():
+        await asyncio.sleep(ABANDONED_JOB_GRACE)
+        if not watched():
+            await cancel()
+    
+    task = asyncio.create_task(cancel_later())
+    abandon_tasks.add(task)
+    task.add_done_callback(abandon_tasks.discard)
+
+def _first_image_url(job: Dict) -> Optional[str]:
+    """FUN-GEN-REQUEST-014: Image URL for the job's first output"""
+    if job["images"]:
+        return output_url(job["images"][0])
+    return None
+
+def _job_response(request_id: str, job: Dict) -> GenerationResponse:
+    """Map a job table entry onto the status response"""
+    if job["status"] == "completed":
+        image_url = _first_image_url(job)
+        if image_url:
+            return GenerationResponse(
+                request_id=request_id,
+                status="completed",
+                image_url=image_url
+            )
+        return GenerationResponse(
+            request_id=request_id,
+            status="completed",
+            error_message="Image generated but filename not found"
+        )
+    
+    if job["status"] in ("failed", "cancelled"):
+        return GenerationResponse(
+            request_id=request_id,
+            status="failed",
+            error_message=job["error"]
+        )
+    
+    return GenerationResponse(
+        request_id=request_id,
+        status=job["status"]
+    )
+
+def _sse_event(request_id: str, job: Dict) -> str:
+    """Serialize a job snapshot as one SSE message"""
+    payload = {
+        "request_id": request_id,
+        "status": job["status"],
+        "node": job["node"],
+        "step": job["step"],
+        "max_steps": job["max_steps"],
+        "image_url": _first_image_url(job),
+        "error_message": job["error"],
+        "estimated_wait": generation_scheduler.estimated_wait(request_id)
+    }
+    return f"event: {job['status']}\ndata: {json.dumps(payload)}\n\n"
+
 @router.get("/generate/image/{filename}")
-async def download_generated_image(filename: str):
+async def download_generated_image(
+    filename: str,
+    request: Request,
+    instance: Optional[str] = None,
+    subfolder: str = ""
+):
     """
     FUN-GEN-REQUEST-015: Download completed image
-    STK-INTEGRATION-017: Download from ComfyUI
+    STK-INTEGRATION-017: Download from ComfyUI once, then serve from the local cache
+    `instance` names the ComfyUI instance that wrote the file (see output_url)
     """
-    from fastapi.responses import Response
+    if "/" in filename or "\\" in filename or filename.startswith("."):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Image {filename} not found"
+        )
     
-    # FUN-GEN-REQUEST-015: Download image bytes
-    image_data = comfyui_service.download_image(filename)
+    # FUN-GEN-REQUEST-015: Fetch into the content-addressed cache
+    digest = await output_cache.get(filename, instance, subfolder)
     
-    if not image_data:
+    if not digest:
         raise HTTPException(
             status_code=404,
             detail=f"Image {filename} not found"
         )
     
-    # Return image as PNG response
-    return Response(
-        content=image_data,
+    # An instance never reuses an output name, so with it the bytes are
+    # immutable; a bare filename may name another instance's file later
+    cache_control = IMMUTABLE_CACHE_CONTROL if instance else "no-cache"
+    try:
+        return _output_response(request, filename, digest, cache_control)
+    except FileNotFoundError:
+        # Evicted since the lookup (e.g. by another worker): fetch it again
+        output_cache.discard(digest)
+        digest = await output_cache.get(filename, instance, subfolder)
+        if not digest:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Image {filename} not found"
+            )
+        return _output_response(request, filename, digest, cache_control)
+
+def _output_response(request: Request, filename: str, digest: str, cache_control: str) -> Response:
+    """Serve a cached output blob; raises FileNotFoundError if it is gone"""
+    return cached_file_response(
+        request,
+        output_cache.blob_path(digest),
         media_type="image/png",
-        headers={
-            "Content-Disposition": f"inline; filename={filename}"
-        }
+        etag=f'"{digest}"',
+        cache_control=cache_control,
+        headers={"Content-Disposition": f"inline; filename={filename}"}
     )
 
 @router.post("/batch", response_model=Dict)
-async def generate_batch(request: BatchRequest):
+async def generate_batch(request: BatchRequest, http_request: Request, collapse: bool = False):
     """
     FUN-BATCH-GEN: Submit batch generation request
-    Placeholder implementation - would queue multiple generations
+    Images are submitted in the background with a bounded pipeline depth;
+    collapse=true renders several seeds per prompt via EmptyLatentImage.batch_size
+    (ignored for seed_mode=fixed)
     """
     # FUN-BATCH-GEN-004 to 005: Validation (handled by Pydantic)
     
-    if not comfyui_service.is_available():
+    if not comfyui_pool.is_available():
         raise HTTPException(
             status_code=503,
             detail="ComfyUI server not available"
         )
     
+    # Entries differ only in seed and batch size: validate the first one up front
+    request_data = request.dict()
+    try:
+        workflow = comfyui_service.construct_workflow({**request_data, "seed": 0, "batch_size": 1})
+    except KeyError:
+        raise _preset_unavailable("txt2img_basic")
+    except ValueError as e:
+        raise HTTPException(
+            status_code=422,
+            detail=str(e)
+        )
+    await _validate_workflow(workflow, "txt2img_basic")
+    
+    client = _client_id(http_request)
+    _admit(client, request.batch_count, priority="bulk")
+    
     batch_id = str(uuid.uuid4())
     
     # Store batch status
-    generation_status[batch_id] = {
+    batch = {
         "status": "queued",
         "type": "batch",
-        "request": request.dict(),
+        "request": request_data,
         "completed_images": 0,
-        "total_images": request.batch_count
+        "total_images": request.batch_count,
+        "failed_images": [],
+        "images": [
+            {"status": "pending", "prompt_id": None, "image_url": None}
+            for _ in range(request.batch_count)
+        ]
     }
+    await save_batch(batch_id, batch)
+    
+    task = asyncio.create_task(run_batch(batch_id, batch, collapse=collapse))
+    batch_tasks[batch_id] = task
+    task.add_done_callback(lambda _: batch_tasks.pop(batch_id, None))
+    admission_control.track(
+        batch_id,
+        client,
+        "bulk",
+        lambda: batch["total_images"] - batch["completed_images"] - len(batch["failed_images"]),
+        task
+    )
     
     return {
         "batch_id": batch_id,
@@ -185,6 +626,56 @@ async def generate_batch(request: BatchRequest):
         "estimated_time": request.batch_count * 5  # Rough estimate
     }
 
+@router.get("/batch/{batch_id}", response_model=BatchProgress)
+async def get_batch_progress(batch_id: str):
+    """
+    FUN-BATCH-GEN: Poll batch progress
+    Thumbnails list the completed images in batch order
+    """
+    batch = await job_store.get_async(batch_id)
+    if not batch or batch.get("type") != "batch":
+        raise HTTPException(
+            status_code=404,
+            detail=f"Batch {batch_id} not found"
+        )
+    
+    return BatchProgress(
+        batch_id=batch_id,
+        total_images=batch["total_images"],
+        completed_images=batch["completed_images"],
+        failed_images=sorted(batch["failed_images"]),
+        current_image=current_image(batch),
+        status=batch["status"],
+        thumbnails=[
+            image["image_url"] for image in batch["images"]
+            if image["image_url"]
+        ]
+    )
+
+@router.post("/batch/{batch_id}/cancel", response_model=BatchProgress)
+async def cancel_batch(batch_id: str):
+    """
+    FUN-BATCH-GEN: Cancel a running batch
+    No further images are submitted; queued ones are removed from ComfyUI's
+    queue and the one rendering is interrupted. Completed images are kept.
+    """
+    batch = await job_store.get_async(batch_id)
+    if not batch or batch.get("type") != "batch":
+        raise HTTPException(
+            status_code=404,
+            detail=f"Batch {batch_id} not found"
+        )
+    task = batch_tasks.get(batch_id)
+    if task is None:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Batch {batch_id} is not running ({batch['status']})"
+        )
+    
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    return await get_batch_progress(batch_id)
+
 @router.post("/sequence/prompts", response_model=SequencePrompts)
 async def generate_sequence_prompts(request: SequenceRequest):
     """
@@ -218,3 +709,186 @@ async def generate_sequence_prompts(request: SequenceRequest):
             "arc": request.narrative_arc
         }
     )
+
+@router.post("/sequence/render", response_model=Dict)
+async def render_sequence(request_data: Dict, request: Request):
+    """
+    FUN-SEQUENCE-GEN: Render frame prompts as one pipelined job group
+    Body: frames (list of {frame_number, prompt[, negative_prompt]}, e.g. the
+    prompts from /sequence/prompts), model, optional (new) sequence_id, lora,
+    lora_strength, negative_prompt, prefix, suffix, steps, cfg, width, height,
+    seed and seed_mode (incremental, fixed or random).
+    Follow GET /sequence/{sequence_id}/events for frames as they finish.
+    """
+    try:
+        record = plan_sequence(request_data)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=422,
+            detail=str(e)
+        )
+    
+    if not comfyui_pool.is_available():
+        raise HTTPException(
+            status_code=503,
+            detail="ComfyUI server not available"
+        )
+    
+    sequence_id = request_data.get("sequence_id") or str(uuid.uuid4())
+    if sequence_engine.is_running(sequence_id):
+        raise HTTPException(
+            status_code=409,
+            detail=f"Sequence {sequence_id} is already rendering"
+        )
+    # Never replace a stored record: its finished frames would be lost
+    if await job_store.get_async(sequence_id) is not None:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Sequence {sequence_id} already exists. Resume it via /api/sequence/{sequence_id}/resume"
+        )
+    
+    # Frames differ only in prompt and seed: validate the first one up front
+    try:
+        workflow = frame_workflow(record, record["frames"][0])
+    except KeyError:
+        raise _preset_unavailable(record["preset"])
+    except ValueError as e:
+        raise HTTPException(
+            status_code=422,
+            detail=str(e)
+        )
+    await _validate_workflow(workflow, record["preset"])
+    
+    _admit(_client_id(request), record["total_frames"], priority="bulk")
+    await job_store.put_async(sequence_id, record)
+    return _start_sequence(sequence_id, record, _client_id(request))
+
+@router.post("/sequence/{sequence_id}/resume", response_model=Dict)
+async def resume_sequence(sequence_id: str, request: Request):
+    """
+    FUN-SEQUENCE-GEN: Render the frames of a sequence that have not completed
+    Completed frames keep their images; seeds are the ones planned originally
+    """
+    record = await _get_sequence(sequence_id)
+    if sequence_engine.is_running(sequence_id):
+        raise HTTPException(
+            status_code=409,
+            detail=f"Sequence {sequence_id} is already rendering"
+        )
+    if not comfyui_pool.is_available():
+        raise HTTPException(
+            status_code=503,
+            detail="ComfyUI server not available"
+        )
+    
+    unfinished = sum(frame["status"] in UNFINISHED_FRAME_STATUSES for frame in record["frames"])
+    _admit(_client_id(request), unfinished, priority="bulk")
+    return _start_sequence(sequence_id, record, _client_id(request))
+
+@router.get("/sequence/{sequence_id}", response_model=Dict)
+async def get_sequence_progress(sequence_id: str):
+    """
+    FUN-SEQUENCE-GEN: Sequence status with every frame's status and image_url
+    """
+    record = await _get_sequence(sequence_id)
+    running = sequence_engine.is_running(sequence_id)
+    return {
+        **sequence_summary(sequence_id, record, running),
+        "running": running,
+        "frames": [frame_event(frame) for frame in record["frames"]]
+    }
+
+@router.post("/sequence/{sequence_id}/cancel", response_model=Dict)
+async def cancel_sequence(sequence_id: str):
+    """
+    FUN-SEQUENCE-GEN: Stop rendering a sequence
+    Queued frames are removed from ComfyUI's queue and the one rendering is
+    interrupted; completed frames are kept and /resume renders the rest
+    """
+    await _get_sequence(sequence_id)
+    if not await sequence_engine.cancel(sequence_id):
+        raise HTTPException(
+            status_code=409,
+            detail=f"Sequence {sequence_id} is not rendering"
+        )
+    return await get_sequence_progress(sequence_id)
+
+@router.get("/sequence/{sequence_id}/events")
+async def stream_sequence_events(sequence_id: str, cancel_on_disconnect: bool = False):
+    """
+    FUN-SEQUENCE-GEN: Frames as Server-Sent Events as soon as each is ready
+    Frames finished before connecting are replayed first; the stream ends
+    with a "complete", "failed" or "cancelled" event carrying the sequence
+    summary. With cancel_on_disconnect=true the sequence is cancelled once
+    no stream has followed it for ABANDONED_JOB_GRACE seconds.
+    """
+    record = await _get_sequence(sequence_id)
+    
+    async def event_stream():
+        queue = sequence_engine.subscribe(sequence_id)
+        try:
+            for frame in record["frames"]:
+                if frame["status"] in ("completed", "failed"):
+                    yield _sse(("frame", frame_event(frame)))
+            if not sequence_engine.is_running(sequence_id):
+                summary = sequence_summary(sequence_id, record, running=False)
+                yield _sse((summary["status"], summary))
+                return
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                # Frames replayed above may be announced again by a resume
+                yield _sse(event)
+                if event[0] != "frame":
+                    return
+        finally:
+            sequence_engine.unsubscribe(sequence_id, queue)
+            if cancel_on_disconnect and sequence_engine.is_running(sequence_id):
+                _cancel_when_abandoned(
+                    lambda: sequence_engine.watched(sequence_id),
+                    lambda: sequence_engine.cancel(sequence_id)
+                )
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _get_sequence(sequence_id: str) -> Dict:
+    record = await job_store.get_async(sequence_id)
+    if not record or record.get("type") != "sequence":
+        raise HTTPException(
+            status_code=404,
+            detail=f"Sequence {sequence_id} not found"
+        )
+    return record
+
+def _start_sequence(sequence_id: str, record: Dict, client: str) -> Dict:
+    """Start rendering and count the frames still to render against the client"""
+    task = sequence_engine.start(sequence_id, record)
+    admission_control.track(
+        sequence_id,
+        client,
+        "bulk",
+        lambda: sum(frame["status"] in ("pending", "queued") for frame in record["frames"]),
+        task
+    )
+    return _sequence_started(sequence_id, record)
+
+def _sequence_started(sequence_id: str, record: Dict) -> Dict:
+    """Response of render/resume: frame counts and where to follow progress"""
+    return {
+        "sequence_id": sequence_id,
+        "total_frames": record["total_frames"],
+        "completed_frames": record["completed_frames"],
+        "events_url": f"/api/sequence/{sequence_id}/events"
+    }
+
+def _sse(event) -> str:
+    """Serialize a (name, data) sequence event as one SSE message"""
+    name, data = event
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
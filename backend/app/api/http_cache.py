@@ -0,0 +1,157 @@
+"""
+HTTP Caching Helpers
+Conditional GET and byte-range responses shared by the API routers
+Traceability: STK-BACKEND-019, STK-BACKEND-020
+"""
+import asyncio
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
+
+# Chunk size used when streaming files to the client (bytes)
+STREAM_CHUNK_SIZE = 64 * 1024
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def http_date(timestamp: float) -> str:
+    return formatdate(timestamp, usegmt=True)
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[float] = None) -> bool:
+    """
+    Evaluate If-None-Match, falling back to If-Modified-Since
+    (If-Modified-Since is ignored whenever If-None-Match is sent)
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(last_modified) <= since
+    return False
+
+
+def parse_range(range_header: str, file_size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single "bytes=start-end" range into inclusive offsets
+    Multi-range requests are answered with the full body (returns None)
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+
+    start_text, _, end_text = spec.strip().partition("-")
+    try:
+        if start_text:
+            start = int(start_text)
+            end = int(end_text) if end_text else file_size - 1
+        else:
+            # Suffix range: last N bytes
+            length = int(end_text)
+            if length <= 0:
+                raise ValueError
+            start = max(file_size - length, 0)
+            end = file_size - 1
+    except ValueError:
+        return None
+
+    if start >= file_size or start > end:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{file_size}"}
+        )
+    return start, min(end, file_size - 1)
+
+
+def cached_file_response(
+    request: Request,
+    path: Path,
+    media_type: str,
+    etag: str,
+    cache_control: str = IMMUTABLE_CACHE_CONTROL,
+    headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """
+    Stream a file with ETag/Last-Modified validators, 304 handling and
+    single byte-range support (honouring If-Range)
+    The file is opened up front, so it may be unlinked (e.g. evicted) while
+    streaming; raises FileNotFoundError if it is already gone
+    """
+    f = open(path, "rb")
+    try:
+        return _file_response(request, f, media_type, etag, cache_control, headers)
+    except BaseException:
+        f.close()
+        raise
+
+
+def _file_response(
+    request: Request,
+    f: BinaryIO,
+    media_type: str,
+    etag: str,
+    cache_control: str,
+    headers: Optional[Dict[str, str]]
+) -> Response:
+    stat = os.fstat(f.fileno())
+    response_headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(stat.st_mtime),
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+        **(headers or {})
+    }
+
+    if is_not_modified(request, etag, stat.st_mtime):
+        f.close()
+        return Response(status_code=304, headers=response_headers)
+
+    byte_range = None
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range == etag):
+        byte_range = parse_range(range_header, stat.st_size)
+
+    if byte_range is None:
+        start, end, status_code = 0, stat.st_size - 1, 200
+    else:
+        start, end = byte_range
+        status_code = 206
+        response_headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+    response_headers["Content-Length"] = str(end - start + 1)
+
+    return StreamingResponse(
+        _iter_file(f, start, end),
+        status_code=status_code,
+        media_type=media_type,
+        headers=response_headers,
+        # In case the body iterator is never started
+        background=BackgroundTask(f.close)
+    )
+
+
+async def _iter_file(f: BinaryIO, start: int, end: int):
+    try:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await asyncio.to_thread(f.read, min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
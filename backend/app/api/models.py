@@ -2,28 +2,78 @@
 Models API Endpoints
 Traceability: FUN-MODEL-SELECT
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response
 from app.models.schemas import ModelInfo, ModelList
-from app.services.comfyui import comfyui_service
-from typing import List
+from app.services.pool import comfyui_pool
+from app.services.model_cache import StaleWhileRevalidateCache
+from app.services.node_schema import node_schema_cache
+from app.api.http_cache import is_not_modified
+import asyncio
+from typing import Dict, List, Optional, Tuple
 
 router = APIRouter()
 
+# Object types whose input enums list the installed models
+MODEL_NODE_CLASSES = ("CheckpointLoaderSimple", "LoraLoader")
+
 @router.get("/models", response_model=ModelList)
-async def get_available_models():
+async def get_available_models(request: Request):
     """
     FUN-MODEL-SELECT-001: Query ComfyUI for available models
     FUN-MODEL-SELECT-002 to 003: Extract and categorize models
+    Served from a TTL cache (refreshed in the background once stale) with ETag/304
     """
-    # FUN-MODEL-SELECT-001: Query /object_info
-    object_info = comfyui_service.get_available_models()
+    model_list, etag = await model_list_cache.get()
     
-    if not object_info:
+    if model_list is None:
         raise HTTPException(
             status_code=503,
             detail="Cannot connect to ComfyUI server"
         )
     
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if is_not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    
+    return Response(
+        content=model_list.model_dump_json(),
+        media_type="application/json",
+        headers=headers
+    )
+
+@router.delete("/models/cache")
+async def invalidate_model_cache():
+    """
+    Drop the cached model list and node schema (e.g. after installing a model)
+    """
+    model_list_cache.invalidate()
+    node_schema_cache.invalidate()
+    return {"invalidated": True}
+
+async def _load_model_list() -> Optional[Tuple[ModelList, bytes]]:
+    """
+    FUN-MODEL-SELECT-001: Query /object_info for the model loader nodes only
+    """
+    service = comfyui_pool.any_service()
+    responses = await asyncio.gather(
+        *(service.get_node_info(node_class) for node_class in MODEL_NODE_CLASSES)
+    )
+    # A partial list would be cached for the whole TTL without a category
+    if any(response is None for response in responses):
+        return None
+    
+    object_info = {}
+    for response in responses:
+        object_info.update(response)
+    
+    model_list = _build_model_list(object_info)
+    return model_list, model_list.model_dump_json().encode()
+
+def _build_model_list(object_info: Dict) -> ModelList:
+    """
+    FUN-MODEL-SELECT-002 to 009: Extract, categorize and sort models
+    """
     base_models = []
     lora_models = []
     merged_models = []
@@ -87,6 +137,8 @@ async def get_available_models():
         total_count=total
     )
 
+model_list_cache = StaleWhileRevalidateCache(_load_model_list)
+
 def _categorize_model(filename: str) -> str:
     """
     FUN-MODEL-SELECT-004: Categorize model by directory path
@@ -0,0 +1,161 @@
+"""
+Admission Control
+Bounds the generation work each client (and all clients together) may have
+outstanding, per priority class, so one burst cannot queue hundreds of jobs
+ahead of everyone else. Counts come from the scheduler's own job tables and
+the instance queue depths the pool already probes, never from extra requests.
+Traceability: FUN-GEN-REQUEST-008, FUN-BATCH-GEN, STK-BACKEND-029
+"""
+import asyncio
+import math
+import os
+from collections import Counter
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from app.services.metrics import admission_rejected_total, registry
+from app.services.pool import comfyui_pool
+from app.services.scheduler import PRIORITIES, generation_scheduler
+
+# Outstanding units admitted per priority class: (per client, all clients)
+# Interactive units are single generations; bulk units are the batch images
+# or sequence frames still to render
+ADMISSION_LIMITS = {
+    "interactive": (
+        int(os.environ.get("MAX_CLIENT_JOBS", "8")),
+        int(os.environ.get("MAX_QUEUED_JOBS", "64"))
+    ),
+    "bulk": (
+        int(os.environ.get("MAX_CLIENT_BULK_IMAGES", "500")),
+        int(os.environ.get("MAX_QUEUED_BULK_IMAGES", "2000"))
+    )
+}
+
+# Bounds of the Retry-After hint (seconds)
+MIN_RETRY_AFTER = 1
+MAX_RETRY_AFTER = 600
+
+
+class AdmissionRejected(Exception):
+    """Too much work outstanding; retry_after is the suggested wait in seconds"""
+
+    def __init__(self, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class _Group(NamedTuple):
+    """A batch or sequence, counted by the units it still has to render"""
+    client: str
+    priority: str
+    remaining: Callable[[], int]
+    task: asyncio.Task
+
+
+class AdmissionController:
+    """
+    Single generations are counted as scheduler jobs tagged with their
+    client; batches and sequences register as groups for the lifetime of
+    their task (their scheduler jobs carry no client, so nothing counts twice)
+    """
+
+    def __init__(self, limits: Dict = ADMISSION_LIMITS):
+        self.limits = limits
+        self._groups: Dict[str, _Group] = {}
+
+    def track(self, group_id: str, client: str, priority: str, remaining: Callable[[], int], task: asyncio.Task):
+        """Count a running batch/sequence against its client until its task ends"""
+        self._groups[group_id] = _Group(client, priority, remaining, task)
+        task.add_done_callback(lambda _: self._groups.pop(group_id, None))
+
+    def outstanding(self, priority: str) -> Counter:
+        """Units not yet rendered per client, for one priority class"""
+        rank = PRIORITIES.index(priority)
+        counts: Counter = Counter()
+        for job in self._jobs():
+            if job["client"] is not None and job["priority"] == rank:
+                counts[job["client"]] += 1
+        for group in self._groups.values():
+            if group.priority == priority and not group.task.done():
+                counts[group.client] += max(group.remaining(), 0)
+        return counts
+
+    def external_load(self) -> int:
+        """Prompts queued on the instances by other ComfyUI clients (last probe)"""
+        return sum(
+            max(node.queue_depth - len(node.in_flight), 0)
+            for node in comfyui_pool.healthy_nodes()
+        )
+
+    def check(self, client: str, units: int = 1, priority: str = "interactive"):
+        """
+        Admit `units` more work for `client` or raise AdmissionRejected
+        Raises ValueError if the request could never fit the per-client limit
+        """
+        client_limit, total_limit = self.limits[priority]
+        if units > client_limit:
+            raise ValueError(
+                f"Request needs {units} {_unit_name(priority)}, more than the "
+                f"{client_limit} a client may have outstanding; split it up"
+            )
+
+        counts = self.outstanding(priority)
+        total = sum(counts.values())
+        if priority == "interactive":
+            total += self.external_load()
+
+        if counts[client] + units > client_limit:
+            admission_rejected_total.inc(priority=priority, limit="client")
+            raise AdmissionRejected(
+                f"You have {counts[client]} {_unit_name(priority)} outstanding "
+                f"(limit {client_limit}); wait for some to finish",
+                self._retry_after(counts[client] + units - client_limit, priority, client)
+            )
+        if total + units > total_limit:
+            admission_rejected_total.inc(priority=priority, limit="global")
+            raise AdmissionRejected(
+                f"The generation queue is full ({total} {_unit_name(priority)} outstanding); try again later",
+                self._retry_after(total + units - total_limit, priority)
+            )
+
+    def _jobs(self) -> List[Dict]:
+        return [*generation_scheduler.pending, *generation_scheduler.in_flight.values()]
+
+    def _retry_after(self, excess: int, priority: str, client: Optional[str] = None) -> int:
+        """
+        Seconds until `excess` units should have finished: for single jobs,
+        the projected start of the excess-th one (in-flight jobs start at 0)
+        plus one job; for bulk work, the excess at the observed job rate
+        """
+        job_seconds = generation_scheduler.job_seconds
+        instances = max(len(comfyui_pool.healthy_nodes()), 1)
+        if priority == "interactive":
+            waits = generation_scheduler.estimated_waits()
+            rank = PRIORITIES.index(priority)
+            starts = sorted(
+                waits.get(job["request_id"], 0.0)
+                for job in self._jobs()
+                if job["priority"] == rank and (client is None or job["client"] == client)
+            )
+            start = starts[min(excess, len(starts)) - 1] if starts else 0.0
+            seconds = start + job_seconds / instances
+        else:
+            seconds = excess * job_seconds / instances
+        return min(max(math.ceil(seconds), MIN_RETRY_AFTER), MAX_RETRY_AFTER)
+
+
+def _unit_name(priority: str) -> str:
+    return "generations" if priority == "interactive" else "batch/sequence images"
+
+
+admission_control = AdmissionController()
+
+registry.gauge(
+    "admission_outstanding",
+    "Work counted by admission control, per priority class",
+    lambda: {
+        (priority,): sum(admission_control.outstanding(priority).values())
+        for priority in PRIORITIES
+    },
+    ("priority",)
+)
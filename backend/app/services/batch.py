@@ -0,0 +1,156 @@
+"""
+Batch Generation Engine
+Fans a batch request out into ComfyUI prompts with a bounded pipeline
+Traceability: FUN-BATCH-GEN, STK-INTEGRATION-015
+"""
+import asyncio
+import logging
+import random
+from typing import Dict, List
+
+from app.services.comfyui import comfyui_service
+from app.services.job_store import job_store
+from app.services.output_cache import output_url
+from app.services.pool import comfyui_pool
+from app.services.scheduler import generation_scheduler
+from app.services.structured_log import get_logger, log_event
+
+logger = get_logger("batch")
+
+
+# Prompts each batch keeps queued (in the scheduler or ComfyUI) so the GPU never idles
+BATCH_PIPELINE_DEPTH = 2
+
+# Largest EmptyLatentImage.batch_size used when collapsing a batch
+MAX_COLLAPSED_BATCH_SIZE = 4
+
+
+def plan_batch(request_data: Dict, collapse: bool = False) -> List[Dict]:
+    """
+    Split a batch request into prompt submissions
+    Each entry carries the image indexes (0-based) it produces and its seed;
+    fixed-seed batches are never collapsed, since the latents of one prompt
+    get distinct noise
+    """
+    count = request_data["batch_count"]
+    seed_mode = request_data.get("seed_mode", "random")
+    base_seed = request_data.get("base_seed")
+    if base_seed is None or base_seed == -1:
+        base_seed = random.randint(0, 2**32 - 1)
+
+    if collapse and seed_mode != "fixed":
+        # ComfyUI draws distinct noise per latent in a batch from one seed
+        chunks = []
+        for start in range(0, count, MAX_COLLAPSED_BATCH_SIZE):
+            size = min(MAX_COLLAPSED_BATCH_SIZE, count - start)
+            if seed_mode == "incremental":
+                seed = (base_seed + start) % 2**32
+            else:
+                seed = random.randint(0, 2**32 - 1)
+            chunks.append({
+                "indexes": list(range(start, start + size)),
+                "seed": seed,
+                "batch_size": size
+            })
+        return chunks
+
+    entries = []
+    for index in range(count):
+        if seed_mode == "incremental":
+            seed = (base_seed + index) % 2**32
+        elif seed_mode == "fixed":
+            seed = base_seed
+        else:
+            seed = random.randint(0, 2**32 - 1)
+        entries.append({"indexes": [index], "seed": seed, "batch_size": 1})
+    return entries
+
+
+async def run_batch(batch_id: str, batch: Dict, collapse: bool = False, depth: int = BATCH_PIPELINE_DEPTH):
+    """
+    Submit a batch with at most `depth` prompts outstanding in ComfyUI
+    Updates the batch status dict in place and saves it as each image completes;
+    cancelling the task cancels the batch's remaining prompts
+    """
+    request_data = batch["request"]
+    slots = asyncio.Semaphore(depth)
+    batch["status"] = "generating"
+    await save_batch(batch_id, batch)
+
+    async def run_entry(entry: Dict):
+        try:
+            job = await submit_and_wait(entry)
+        except Exception as e:
+            log_event(logger, "batch_entry_failed", level=logging.ERROR, batch_id=batch_id, error=str(e))
+            job = None
+        finally:
+            slots.release()
+
+        if job is None or job["status"] != "completed":
+            _mark_failed(batch, entry["indexes"])
+            await save_batch(batch_id, batch)
+            return
+
+        # Collapsed prompts return one output image per latent, in order
+        for index, image in zip(entry["indexes"], job["images"]):
+            batch["images"][index]["status"] = "completed"
+            batch["images"][index]["image_url"] = output_url(image)
+            batch["completed_images"] += 1
+        _mark_failed(batch, entry["indexes"][len(job["images"]):])
+        await save_batch(batch_id, batch)
+
+    async def submit_and_wait(entry: Dict):
+        workflow = comfyui_service.construct_workflow({
+            **request_data,
+            "seed": entry["seed"],
+            "batch_size": entry["batch_size"]
+        })
+        prompt_id = generation_scheduler.enqueue(workflow, priority="bulk", group=batch_id)
+        for index in entry["indexes"]:
+            batch["images"][index]["prompt_id"] = prompt_id
+            batch["images"][index]["status"] = "queued"
+        await save_batch(batch_id, batch)
+        return await comfyui_pool.wait_for_job(prompt_id)
+
+    tasks = []
+    try:
+        for entry in plan_batch(request_data, collapse=collapse):
+            await slots.acquire()
+            tasks.append(asyncio.create_task(run_entry(entry)))
+        await asyncio.gather(*tasks, return_exceptions=True)
+    except asyncio.CancelledError:
+        # Batch cancelled: submit nothing more and stop what ComfyUI still holds
+        for task in tasks:
+            task.cancel()
+        await generation_scheduler.cancel_group(batch_id)
+        for image in batch["images"]:
+            if image["status"] in ("pending", "queued"):
+                image["status"] = "cancelled"
+        batch["status"] = "cancelled"
+        await save_batch(batch_id, batch)
+        raise
+
+    if batch["completed_images"] == 0:
+        batch["status"] = "failed"
+    else:
+        batch["status"] = "complete"
+    await save_batch(batch_id, batch)
+
+
+async def save_batch(batch_id: str, batch: Dict):
+    """Store the batch's progress record (without the request payload)"""
+    await job_store.put_async(batch_id, {key: value for key, value in batch.items() if key != "request"})
+
+
+def _mark_failed(batch: Dict, indexes: List[int]):
+    for index in indexes:
+        batch["images"][index]["status"] = "failed"
+        batch["failed_images"].append(index + 1)
+
+
+def current_image(batch: Dict):
+    """1-based number of the first image still in flight"""
+    for index, image in enumerate(batch["images"]):
+        if image["status"] in ("pending", "queued"):
+            return index + 1
+    return None
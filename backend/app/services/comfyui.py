@@ -3,118 +3,384 @@ ComfyUI Integration Service
 Handles communication with ComfyUI server
 Traceability: STK-INTEGRATION-014 to STK-INTEGRATION-019, FUN-GEN-REQUEST
 """
-import requests
-import json
+import httpx
+import aiofiles
+import aiofiles.os
+import hashlib
+import logging
 import os
-import random
-from typing import Dict, Optional
+import time
+import uuid
+from contextlib import contextmanager
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from app.services.metrics import comfyui_call_seconds
+from app.services.workflows import workflow_registry
+from app.services.structured_log import get_logger, log_event
+
+logger = get_logger("comfyui")
+
 
 COMFYUI_BASE_URL = "http://localhost:8188"
-WORKFLOW_DIR = os.path.join(os.path.dirname(__file__), "../../..", "workflows/presets")
 
-class ComfyUIService:
-    """Service for interacting with ComfyUI API"""
+# Async client pool settings (overridable via environment)
+COMFYUI_MAX_CONNECTIONS = int(os.environ.get("COMFYUI_MAX_CONNECTIONS", "100"))
+COMFYUI_MAX_KEEPALIVE = int(os.environ.get("COMFYUI_MAX_KEEPALIVE", "20"))
+COMFYUI_CONNECT_TIMEOUT = float(os.environ.get("COMFYUI_CONNECT_TIMEOUT", "2"))
+COMFYUI_POOL_TIMEOUT = float(os.environ.get("COMFYUI_POOL_TIMEOUT", "10"))
+
+# Chunk size for streamed image downloads and uploads (bytes)
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+def construct_workflow(request_data: Dict, preset: str = "txt2img_basic") -> Dict:
+    """
+    FUN-GEN-REQUEST-007: Construct workflow JSON with parameters
+    Built from the in-memory preset via its declarative bindings
+    """
+    params = dict(request_data)
+    
+    # Frontend sends resolution as {"width": ..., "height": ...}
+    resolution = params.pop("resolution", None) or {}
+    params.setdefault("width", resolution.get("width"))
+    params.setdefault("height", resolution.get("height"))
+    
+    return workflow_registry.build(preset, params)
+
+
+class AsyncComfyUIService:
+    """
+    Async ComfyUI client for use inside FastAPI routes
+    Keeps a pool of keep-alive connections so status polling and downloads
+    never block the event loop or pay a TCP handshake per call
+    """
+    
+    def __init__(
+        self,
+        base_url: str = COMFYUI_BASE_URL,
+        max_connections: int = COMFYUI_MAX_CONNECTIONS,
+        max_keepalive: int = COMFYUI_MAX_KEEPALIVE,
+        connect_timeout: float = COMFYUI_CONNECT_TIMEOUT,
+        pool_timeout: float = COMFYUI_POOL_TIMEOUT
+    ):
+        self.base_url = base_url.rstrip("/")
+        # Short stable name for the instance in output URLs and cache keys:
+        # every instance numbers its output files from 1
+        self.instance_id = hashlib.sha256(self.base_url.encode()).hexdigest()[:12]
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive
+        )
+        self.connect_timeout = connect_timeout
+        self.pool_timeout = pool_timeout
+        self._client: Optional[httpx.AsyncClient] = None
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Lazily create the pooled client on first use"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=self.limits,
+                timeout=httpx.Timeout(10, connect=self.connect_timeout, pool=self.pool_timeout)
+            )
+        return self._client
+    
+    def _timeout(self, read: float) -> httpx.Timeout:
+        """Per-call timeout keeping the pool-wide connect/pool limits"""
+        return httpx.Timeout(read, connect=self.connect_timeout, pool=self.pool_timeout)
+    
+    @contextmanager
+    def _timed(self, call: str):
+        """Record one call's round trip (outcome "error" if it raised)"""
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            yield
+            outcome = "ok"
+        finally:
+            comfyui_call_seconds.observe(
+                time.perf_counter() - started,
+                instance=self.base_url,
+                call=call,
+                outcome=outcome
+            )
+    
+    def construct_workflow(self, request_data: Dict, preset: str = "txt2img_basic") -> Dict:
+        """FUN-GEN-REQUEST-007: see construct_workflow()"""
+        return construct_workflow(request_data, preset)
     
-    def __init__(self):
-        self.base_url = COMFYUI_BASE_URL
+    async def close(self):
+        """Close pooled connections (called on app shutdown)"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
     
-    def is_available(self) -> bool:
+    async def is_available(self) -> bool:
         """Check if ComfyUI server is running"""
         try:
-            response = requests.get(f"{self.base_url}/system_stats", timeout=2)
+            with self._timed("system_stats"):
+                response = await self.client.get("/system_stats", timeout=self._timeout(2))
             return response.status_code == 200
-        except requests.RequestException:
+        except httpx.HTTPError:
             return False
     
-    def submit_generation(self, workflow: Dict) -> Optional[Dict]:
+    async def submit_generation(
+        self,
+        workflow: Dict,
+        client_id: Optional[str] = None,
+        prompt_id: Optional[str] = None
+    ) -> Optional[Dict]:
         """
         STK-INTEGRATION-015: Submit generation request to ComfyUI
         FUN-GEN-REQUEST-008: POST to /prompt endpoint
+        client_id routes the prompt's websocket events to that listener;
+        prompt_id lets the backend choose the id before submission
         """
+        payload = {"prompt": workflow}
+        if client_id:
+            payload["client_id"] = client_id
+        if prompt_id:
+            payload["prompt_id"] = prompt_id
         try:
-            response = requests.post(
-                f"{self.base_url}/prompt",
-                json={"prompt": workflow},
-                timeout=10
-            )
-            response.raise_for_status()
+            with self._timed("prompt"):
+                response = await self.client.post(
+                    "/prompt",
+                    json=payload,
+                    timeout=self._timeout(10)
+                )
+                response.raise_for_status()
             return response.json()
-        except requests.RequestException as e:
-            print(f"Error submitting to ComfyUI: {e}")
+        except (httpx.HTTPError, ValueError) as e:
+            log_event(
+                logger, "comfyui_call_failed", level=logging.ERROR,
+                instance=self.base_url, call="prompt", error=str(e)
+            )
             return None
     
-    def get_generation_status(self, prompt_id: str) -> Optional[Dict]:
+    async def get_generation_status(self, prompt_id: str) -> Optional[Dict]:
         """
         STK-INTEGRATION-016: Poll ComfyUI for generation status
         FUN-GEN-REQUEST-011: Poll /history/{prompt_id}
         """
         try:
-            response = requests.get(
-                f"{self.base_url}/history/{prompt_id}",
-                timeout=5
-            )
-            response.raise_for_status()
+            with self._timed("history"):
+                response = await self.client.get(
+                    f"/history/{prompt_id}",
+                    timeout=self._timeout(5)
+                )
+                response.raise_for_status()
             return response.json()
-        except requests.RequestException as e:
-            print(f"Error checking status: {e}")
+        except (httpx.HTTPError, ValueError) as e:
+            log_event(
+                logger, "comfyui_call_failed", level=logging.ERROR,
+                instance=self.base_url, call="history", error=str(e)
+            )
             return None
     
-    def download_image(self, filename: str) -> Optional[bytes]:
+    async def download_image(self, filename: str) -> Optional[bytes]:
         """
         STK-INTEGRATION-017: Download generated image
         FUN-GEN-REQUEST-015: Download via /view endpoint
         """
         try:
-            response = requests.get(
-                f"{self.base_url}/view",
-                params={"filename": filename},
-                timeout=30
-            )
-            response.raise_for_status()
+            with self._timed("view"):
+                response = await self.client.get(
+                    "/view",
+                    params={"filename": filename},
+                    timeout=self._timeout(30)
+                )
+                response.raise_for_status()
             return response.content
-        except requests.RequestException as e:
-            print(f"Error downloading image: {e}")
+        except httpx.HTTPError as e:
+            log_event(
+                logger, "comfyui_call_failed", level=logging.ERROR,
+                instance=self.base_url, call="view", error=str(e)
+            )
             return None
     
-    def get_available_models(self) -> Optional[Dict]:
+    async def download_image_to(self, filename: str, destination: str, subfolder: str = "") -> Optional[str]:
+        """
+        STK-INTEGRATION-017: Stream a generated image to a local file
+        Returns the SHA-256 hex digest of the content, or None on failure
+        """
+        digest = hashlib.sha256()
+        try:
+            with self._timed("view"):
+                async with self.client.stream(
+                    "GET",
+                    "/view",
+                    params={"filename": filename, "subfolder": subfolder, "type": "output"},
+                    timeout=self._timeout(30)
+                ) as response:
+                    response.raise_for_status()
+                    async with aiofiles.open(destination, "wb") as f:
+                        async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                            digest.update(chunk)
+                            await f.write(chunk)
+            return digest.hexdigest()
+        except (httpx.HTTPError, OSError) as e:
+            log_event(
+                logger, "comfyui_call_failed", level=logging.ERROR,
+                instance=self.base_url, call="view", error=str(e)
+            )
+            return None
+
+    async def upload_image(self, source: str, name: str, content_type: str) -> bool:
+        """
+        Stream a local file to /upload/image as input image `name`
+        The multipart body is read from disk chunk by chunk without blocking
+        the event loop, so the file is never held in memory whole
+        """
+        boundary = uuid.uuid4().hex
+        head, tail = _multipart_frame(boundary, name, content_type)
+        try:
+            size = (await aiofiles.os.stat(source)).st_size
+            with self._timed("upload"):
+                response = await self.client.post(
+                    "/upload/image",
+                    content=_multipart_body(source, head, tail),
+                    headers={
+                        "Content-Type": f"multipart/form-data; boundary={boundary}",
+                        "Content-Length": str(len(head) + size + len(tail))
+                    },
+                    timeout=self._timeout(60)
+                )
+                response.raise_for_status()
+            return True
+        except (httpx.HTTPError, OSError) as e:
+            log_event(
+                logger, "comfyui_call_failed", level=logging.ERROR,
+                instance=self.base_url, call="upload", error=str(e)
+            )
+            return False
+
+    async def get_available_models(self) -> Optional[Dict]:
         """
         STK-INTEGRATION-018: Query available models
         FUN-MODEL-SELECT-001: Query /object_info endpoint
         """
         try:
-            response = requests.get(
-                f"{self.base_url}/object_info",
-                timeout=5
+            with self._timed("object_info"):
+                response = await self.client.get(
+                    "/object_info",
+                    timeout=self._timeout(5)
+                )
+                response.raise_for_status()
+            return response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            log_event(
+                logger, "comfyui_call_failed", level=logging.ERROR,
+                instance=self.base_url, call="object_info", error=str(e)
             )
-            response.raise_for_status()
+            return None
+
+    async def get_queue(self) -> Optional[Dict]:
+        """
+        Query /queue for running and pending prompts
+        """
+        try:
+            with self._timed("queue"):
+                response = await self.client.get(
+                    "/queue",
+                    timeout=self._timeout(2)
+                )
+                response.raise_for_status()
             return response.json()
-        except requests.RequestException as e:
-            print(f"Error fetching models: {e}")
+        except (httpx.HTTPError, ValueError) as e:
+            log_event(
+                logger, "comfyui_call_failed", level=logging.ERROR,
+                instance=self.base_url, call="queue", error=str(e)
+            )
             return None
     
-    def construct_workflow(self, request_data: Dict) -> Dict:
-        """
-        FUN-GEN-REQUEST-007: Construct workflow JSON with parameters
-        """
-        # Load workflow template
-        workflow_path = os.path.join(WORKFLOW_DIR, "txt2img_basic.json")
-        with open(workflow_path, 'r') as f:
-            workflow = json.load(f)
-        
-        # Update node parameters
-        workflow["1"]["inputs"]["ckpt_name"] = request_data['model']
-        workflow["2"]["inputs"]["text"] = request_data['prompt']
-        workflow["3"]["inputs"]["text"] = request_data.get('negative_prompt', 'blurry, low quality')
-        
-        # Handle seed: -1 means random, otherwise use provided seed
-        seed = request_data.get('seed', -1)
-        if seed == -1:
-            seed = random.randint(0, 2**32 - 1)
-        workflow["5"]["inputs"]["seed"] = seed
-        
-        workflow["5"]["inputs"]["steps"] = request_data.get('steps', 20)
-        workflow["5"]["inputs"]["cfg"] = request_data.get('cfg', 7.0)
-        
-        return workflow
-
-comfyui_service = ComfyUIService()
+    async def get_node_info(self, node_class: str) -> Optional[Dict]:
+        """
+        FUN-MODEL-SELECT-001: Query /object_info/{node_class}
+        A few KB for one node instead of the full multi-MB node catalogue
+        """
+        try:
+            with self._timed("object_info_node"):
+                response = await self.client.get(
+                    f"/object_info/{node_class}",
+                    timeout=self._timeout(5)
+                )
+                response.raise_for_status()
+            return response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            log_event(
+                logger, "comfyui_call_failed", level=logging.ERROR,
+                instance=self.base_url, call="object_info_node", error=str(e)
+            )
+            return None
+
+    async def delete_queued(self, prompt_ids: List[str]) -> bool:
+        """
+        Remove prompts from the pending queue (POST /queue {"delete": [...]})
+        Prompts already running are unaffected; see interrupt()
+        """
+        try:
+            with self._timed("queue_delete"):
+                response = await self.client.post(
+                    "/queue",
+                    json={"delete": prompt_ids},
+                    timeout=self._timeout(5)
+                )
+                response.raise_for_status()
+            return True
+        except httpx.HTTPError as e:
+            log_event(
+                logger, "comfyui_call_failed", level=logging.ERROR,
+                instance=self.base_url, call="queue_delete", error=str(e)
+            )
+            return False
+
+    async def interrupt(self, prompt_id: Optional[str] = None) -> bool:
+        """
+        Stop the running prompt (POST /interrupt); ComfyUI versions that
+        accept a prompt_id only interrupt if that prompt is the one running
+        """
+        try:
+            with self._timed("interrupt"):
+                response = await self.client.post(
+                    "/interrupt",
+                    json={"prompt_id": prompt_id} if prompt_id else None,
+                    timeout=self._timeout(5)
+                )
+                response.raise_for_status()
+            return True
+        except httpx.HTTPError as e:
+            log_event(
+                logger, "comfyui_call_failed", level=logging.ERROR,
+                instance=self.base_url, call="interrupt", error=str(e)
+            )
+            return False
+
+
+def _multipart_frame(boundary: str, name: str, content_type: str) -> Tuple[bytes, bytes]:
+    """Bytes before and after the file content of an /upload/image form"""
+    fields = "".join(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"\r\n\r\n{value}\r\n'
+        for field, value in (("type", "input"), ("overwrite", "true"))
+    )
+    head = (
+        f'{fields}--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="image"; filename="{name}"\r\n'
+        f'Content-Type: {content_type}\r\n\r\n'
+    )
+    return head.encode(), f"\r\n--{boundary}--\r\n".encode()
+
+
+async def _multipart_body(source: str, head: bytes, tail: bytes) -> AsyncIterator[bytes]:
+    """File content between the form frame, read without blocking the event loop"""
+    yield head
+    async with aiofiles.open(source, "rb") as f:
+        while True:
+            chunk = await f.read(DOWNLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    yield tail
+
+
+# Async service used by the API routes
+comfyui_service = AsyncComfyUIService()
@@ -0,0 +1,48 @@
+"""
+Gallery Change Feed
+Wakes change-stream listeners whenever the gallery index commits a change,
+so clients receive deltas (from GalleryIndex.changes) instead of refetching
+the whole gallery
+Traceability: FUN-GALLERY-VIEW-001, FUN-GALLERY-VIEW-028
+"""
+import asyncio
+import threading
+from typing import Dict
+
+from app.services.gallery_index import gallery_index
+
+
+class GalleryFeed:
+    """
+    One event per listening stream; index commits may happen on worker
+    threads (refreshes, ingest), so events are set through the loop
+    """
+
+    def __init__(self):
+        self._listeners: Dict[asyncio.Event, asyncio.AbstractEventLoop] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self) -> asyncio.Event:
+        event = asyncio.Event()
+        with self._lock:
+            self._listeners[event] = asyncio.get_running_loop()
+        return event
+
+    def unsubscribe(self, event: asyncio.Event):
+        with self._lock:
+            self._listeners.pop(event, None)
+
+    def on_commit(self):
+        """Index commit listener (any thread)"""
+        with self._lock:
+            listeners = list(self._listeners.items())
+        for event, loop in listeners:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # Loop already closed (shutdown)
+                pass
+
+
+gallery_feed = GalleryFeed()
+gallery_index.commit_listeners.append(gallery_feed.on_commit)
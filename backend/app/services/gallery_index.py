@@ -0,0 +1,733 @@
+"""
+Gallery Index Service
+SQLite index of gallery images so listing and filtering never rescan disk
+Traceability: FUN-GALLERY-VIEW-001, FUN-GALLERY-VIEW-002, FUN-GALLERY-VIEW-006
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.services.metrics import gallery_dirs_scanned_total, gallery_refresh_seconds
+from app.services.structured_log import get_logger, log_event
+
+logger = get_logger("gallery_index")
+
+
+GALLERY_PATH = Path.home() / "images" / "outputs"
+INDEX_FILENAME = ".gallery_index.db"
+
+# Directory mtimes are re-checked at most this often (seconds)
+REFRESH_INTERVAL = 2.0
+
+# Every known run folder is re-statted this often (seconds): a PNG or sidecar
+# rewritten in place changes the file's mtime but not its folder's
+FULL_RESCAN_INTERVAL = 60.0
+
+# Separates run folder and file stem in public image ids: stems repeat across
+# runs (generate.sh names every run's files image_NNN), so ids always carry the folder
+QUALIFIED_ID_SEPARATOR = "~"
+
+# Gallery sort options mapped to indexed columns
+SORT_COLUMNS = {
+    "time": "mtime",
+    "filesize": "size",
+    "seed": "seed",
+    "model": "model"
+}
+
+# Search ordering options
+SEARCH_ORDERS = ("relevance", "time")
+
+# Numeric columns search results can be filtered on
+SEARCH_RANGE_COLUMNS = ("seed", "steps", "cfg")
+
+# Column weights for relevance ranking (prompt, negative prompt, model)
+SEARCH_WEIGHTS = (10.0, 1.0, 5.0)
+
+# Removed-image entries kept in the change feed; clients further behind reload
+MAX_TOMBSTONES = 10000
+
+# Bumped whenever the schema or the id format changes; the index is rebuilt
+# from disk on mismatch and the change feed reset (clients reload)
+SCHEMA_VERSION = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    rowid_ INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    id TEXT NOT NULL,
+    dir TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    meta_mtime REAL,
+    prompt TEXT NOT NULL DEFAULT '',
+    negative_prompt TEXT NOT NULL DEFAULT '',
+    model TEXT NOT NULL DEFAULT 'unknown',
+    seed INTEGER NOT NULL DEFAULT -1,
+    steps INTEGER,
+    cfg REAL,
+    parameters TEXT NOT NULL DEFAULT '{}',
+    metadata TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS idx_images_sort_mtime ON images (mtime, path);
+CREATE INDEX IF NOT EXISTS idx_images_sort_size ON images (size, path);
+CREATE INDEX IF NOT EXISTS idx_images_sort_seed ON images (seed, path);
+CREATE INDEX IF NOT EXISTS idx_images_sort_model ON images (model, path);
+CREATE INDEX IF NOT EXISTS idx_images_id ON images (id);
+CREATE INDEX IF NOT EXISTS idx_images_dir ON images (dir);
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS images_fts USING fts5(
+    prompt, negative_prompt, model,
+    content='images', content_rowid='rowid_'
+);
+CREATE TRIGGER IF NOT EXISTS images_fts_insert AFTER INSERT ON images BEGIN
+    INSERT INTO images_fts (rowid, prompt, negative_prompt, model)
+    VALUES (new.rowid_, new.prompt, new.negative_prompt, new.model);
+END;
+CREATE TRIGGER IF NOT EXISTS images_fts_delete AFTER DELETE ON images BEGIN
+    INSERT INTO images_fts (images_fts, rowid, prompt, negative_prompt, model)
+    VALUES ('delete', old.rowid_, old.prompt, old.negative_prompt, old.model);
+END;
+CREATE TRIGGER IF NOT EXISTS images_fts_update AFTER UPDATE ON images BEGIN
+    INSERT INTO images_fts (images_fts, rowid, prompt, negative_prompt, model)
+    VALUES ('delete', old.rowid_, old.prompt, old.negative_prompt, old.model);
+    INSERT INTO images_fts (rowid, prompt, negative_prompt, model)
+    VALUES (new.rowid_, new.prompt, new.negative_prompt, new.model);
+END;
+CREATE TABLE IF NOT EXISTS changes (
+    path TEXT PRIMARY KEY,
+    image_id TEXT NOT NULL,
+    event TEXT NOT NULL,
+    revision INTEGER NOT NULL,
+    added_revision INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_changes_revision ON changes (revision);
+CREATE INDEX IF NOT EXISTS idx_changes_event ON changes (event, revision);
+CREATE TABLE IF NOT EXISTS feed_state (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO feed_state (key, value) VALUES ('revision', 0), ('floor', 0);
+"""
+
+# Objects of earlier schema versions, dropped before a rebuild (the change
+# feed is kept so revisions stay monotonic; it is reset separately)
+LEGACY_SCHEMA_DROP = """
+DROP TABLE IF EXISTS images_fts;
+DROP TABLE IF EXISTS images;
+DROP TABLE IF EXISTS dirs;
+"""
+
+
+def sidecar_for(image_file: Path) -> Optional[Path]:
+    """
+    Metadata file of an image: the canonical JSON sidecar written by the
+    backend, else a legacy .txt (generate.sh pairs image_NNN.png with prompt_NNN.txt)
+    """
+    candidates = [image_file.with_suffix(".json"), image_file.with_suffix(".txt")]
+    if image_file.stem == "image" or image_file.stem.startswith("image_"):
+        candidates.append(image_file.with_name(f"prompt{image_file.stem[len('image'):]}.txt"))
+    for candidate in candidates:
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def parse_metadata(metadata_file: Path) -> dict:
+    """
+    Parse metadata from a sidecar file
+    .json sidecars are canonical; .txt may hold JSON or key: value pairs
+    """
+    metadata = {}
+    if metadata_file.suffix == ".json":
+        try:
+            with open(metadata_file, "r") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            log_event(logger, "metadata_parse_failed", level=logging.WARNING, error=str(e))
+            return metadata
+
+    try:
+        with open(metadata_file, "r") as f:
+            content = f.read()
+
+            # Try JSON format first
+            try:
+                metadata = json.loads(content)
+                return metadata
+            except json.JSONDecodeError:
+                pass
+
+            # Parse key: value format
+            for line in content.split("\n"):
+                if ":" in line:
+                    key, value = line.split(":", 1)
+                    key = key.strip().lower()
+                    value = value.strip()
+
+                    if key == "prompt":
+                        metadata["prompt"] = value
+                    elif key == "negative":
+                        metadata["negative_prompt"] = value
+                    elif key == "model":
+                        metadata["model"] = value
+                    elif key == "seed":
+                        try:
+                            metadata["seed"] = int(value)
+                        except ValueError:
+                            metadata["seed"] = -1
+                    elif key in ["steps", "cfg", "width", "height"]:
+                        metadata.setdefault("parameters", {})[key] = value
+
+    except Exception as e:
+        log_event(logger, "metadata_parse_failed", level=logging.WARNING, error=str(e))
+
+    return metadata
+
+
+class GalleryIndex:
+    """
+    Incrementally maintained index of gallery PNGs and their sidecar metadata
+    Only run folders whose mtime changed since the last refresh are rescanned,
+    plus every folder once per full rescan interval to catch in-place edits
+    """
+
+    def __init__(
+        self,
+        gallery_path: Path = GALLERY_PATH,
+        refresh_interval: float = REFRESH_INTERVAL,
+        full_rescan_interval: float = FULL_RESCAN_INTERVAL
+    ):
+        self.gallery_path = gallery_path
+        self.refresh_interval = refresh_interval
+        self.full_rescan_interval = full_rescan_interval
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+        self._last_refresh = 0.0
+        self._last_full_scan = 0.0
+        # id -> path cache in front of the index, cleared whenever rows change
+        self._paths: Dict[str, str] = {}
+        # Called with ("added" | "updated" | "removed", image path) on every change
+        self.listeners: List[Callable[[str, Path], None]] = []
+        # Called (from any thread) after a transaction that advanced the revision commits
+        self.commit_listeners: List[Callable[[], None]] = []
+        self._changed = False
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.gallery_path.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(
+                str(self.gallery_path / INDEX_FILENAME),
+                check_same_thread=False
+            )
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            rebuild = self._conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION
+            if rebuild:
+                self._conn.executescript(LEGACY_SCHEMA_DROP)
+                self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self._conn.executescript(SCHEMA)
+            if rebuild:
+                self._reset_feed()
+        return self._conn
+
+    def _reset_feed(self):
+        """Start the change feed over (after a rebuild): every client must reload"""
+        with self._conn:
+            self._conn.execute("DELETE FROM changes")
+            self._conn.execute("UPDATE feed_state SET value = value + 1 WHERE key = 'revision'")
+            self._conn.execute(
+                "UPDATE feed_state SET value = (SELECT value FROM feed_state WHERE key = 'revision') "
+                "WHERE key = 'floor'"
+            )
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction; commit listeners hear about it once it has committed"""
+        with self._lock:
+            self._changed = False
+            try:
+                with self.conn:
+                    yield
+                    if self._changed:
+                        self._prune_tombstones()
+            except BaseException:
+                self._changed = False
+                raise
+            changed, self._changed = self._changed, False
+        if changed:
+            for listener in self.commit_listeners:
+                try:
+                    listener()
+                except Exception as e:
+                    log_event(logger, "commit_listener_failed", level=logging.ERROR, error=str(e))
+
+    def ensure_fresh(self, force: bool = False):
+        """Rescan changed run folders if the refresh interval has elapsed"""
+        if not force and time.monotonic() - self._last_refresh < self.refresh_interval:
+            return
+        with self._lock:
+            if not force and time.monotonic() - self._last_refresh < self.refresh_interval:
+                return
+            full = time.monotonic() - self._last_full_scan >= self.full_rescan_interval
+            self.refresh(full=full)
+            self._last_refresh = time.monotonic()
+            if full:
+                self._last_full_scan = self._last_refresh
+
+    def refresh(self, full: bool = False):
+        """
+        Sync the index with disk, touching only folders whose mtime changed;
+        full re-stats the files of every folder (only changed files are re-read)
+        """
+        if not self.gallery_path.exists():
+            return
+        with self._transaction(), gallery_refresh_seconds.time():
+            known = {
+                row["path"]: row["mtime"]
+                for row in self.conn.execute("SELECT path, mtime FROM dirs")
+            }
+            seen = set()
+            with os.scandir(self.gallery_path) as entries:
+                for entry in entries:
+                    if not entry.is_dir() or entry.name.startswith("."):
+                        continue
+                    seen.add(entry.path)
+                    mtime = entry.stat().st_mtime
+                    if full or known.get(entry.path) != mtime:
+                        self._paths.clear()
+                        self._scan_dir(entry.path)
+                        gallery_dirs_scanned_total.inc()
+                        self.conn.execute(
+                            "INSERT OR REPLACE INTO dirs (path, mtime) VALUES (?, ?)",
+                            (entry.path, mtime)
+                        )
+
+            for removed in set(known) - seen:
+                self._paths.clear()
+                for row in self.conn.execute("SELECT path FROM images WHERE dir = ?", (removed,)).fetchall():
+                    self._notify("removed", Path(row["path"]))
+                self.conn.execute("DELETE FROM images WHERE dir = ?", (removed,))
+                self.conn.execute("DELETE FROM dirs WHERE path = ?", (removed,))
+
+    def _scan_dir(self, dir_path: str):
+        indexed = {
+            row["path"]: (row["mtime"], row["size"], row["meta_mtime"])
+            for row in self.conn.execute(
+                "SELECT path, mtime, size, meta_mtime FROM images WHERE dir = ?", (dir_path,)
+            )
+        }
+        present = set()
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".png") or not entry.is_file():
+                    continue
+                present.add(entry.path)
+                stat = entry.stat()
+                meta_mtime = _sidecar_mtime(Path(entry.path))
+                if indexed.get(entry.path) != (stat.st_mtime, stat.st_size, meta_mtime):
+                    self._upsert(Path(entry.path), stat.st_mtime, stat.st_size, meta_mtime)
+                    self._notify("updated" if entry.path in indexed else "added", Path(entry.path))
+
+        for missing in set(indexed) - present:
+            self.conn.execute("DELETE FROM images WHERE path = ?", (missing,))
+            self._notify("removed", Path(missing))
+
+    def _upsert(self, image_file: Path, mtime: float, size: int, meta_mtime: Optional[float]):
+        sidecar = sidecar_for(image_file) if meta_mtime is not None else None
+        metadata = parse_metadata(sidecar) if sidecar is not None else {}
+        parameters = metadata.get("parameters", {})
+        # Upsert in place (not REPLACE) so the row keeps its rowid and the
+        # update trigger keeps the full-text index in step
+        self.conn.execute(
+            """INSERT INTO images
+               (path, id, dir, mtime, size, meta_mtime, prompt, negative_prompt,
+                model, seed, steps, cfg, parameters, metadata)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT (path) DO UPDATE SET
+                   mtime = excluded.mtime, size = excluded.size,
+                   meta_mtime = excluded.meta_mtime, prompt = excluded.prompt,
+                   negative_prompt = excluded.negative_prompt, model = excluded.model,
+                   seed = excluded.seed, steps = excluded.steps, cfg = excluded.cfg,
+                   parameters = excluded.parameters, metadata = excluded.metadata""",
+            (
+                str(image_file), image_file.stem, str(image_file.parent),
+                mtime, size, meta_mtime,
+                metadata.get("prompt", ""),
+                metadata.get("negative_prompt", ""),
+                metadata.get("model", "unknown"),
+                _int_or_default(metadata.get("seed", -1)),
+                _int_or_default(parameters.get("steps"), None),
+                _float_or_none(parameters.get("cfg")),
+                json.dumps(parameters),
+                json.dumps(metadata)
+            )
+        )
+
+    def add_file(self, image_file: Path):
+        """Index a single image right away (generation-completion hook)"""
+        stat = image_file.stat()
+        with self._transaction():
+            self._paths.clear()
+            self._upsert(image_file, stat.st_mtime, stat.st_size, _sidecar_mtime(image_file))
+            self._notify("added", image_file)
+
+    def remove_file(self, image_file: Path):
+        """Drop a deleted image from the index"""
+        self.remove_files([image_file])
+
+    def remove_files(self, image_files: List[Path]):
+        """Drop several deleted images in one transaction"""
+        with self._transaction():
+            self._paths.clear()
+            for image_file in image_files:
+                deleted = self.conn.execute("DELETE FROM images WHERE path = ?", (str(image_file),)).rowcount
+                if deleted:
+                    self._notify("removed", image_file)
+
+    def _notify(self, event: str, image_file: Path):
+        self._record_change(event, image_file)
+        for listener in self.listeners:
+            try:
+                listener(event, image_file)
+            except Exception as e:
+                log_event(
+                    logger, "index_listener_failed", level=logging.ERROR,
+                    path=str(image_file), error=str(e)
+                )
+
+    def _record_change(self, event: str, image_file: Path):
+        """
+        Log a change under the next revision, one row per path (a newer
+        change replaces the older), inside the caller's transaction
+        """
+        self.conn.execute("UPDATE feed_state SET value = value + 1 WHERE key = 'revision'")
+        revision = self.conn.execute("SELECT value FROM feed_state WHERE key = 'revision'").fetchone()[0]
+        image_id = public_id(str(image_file.parent), image_file.stem)
+        self.conn.execute(
+            """INSERT INTO changes (path, image_id, event, revision, added_revision)
+               VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT (path) DO UPDATE SET
+                   image_id = excluded.image_id, event = excluded.event,
+                   revision = excluded.revision,
+                   added_revision = CASE WHEN excluded.event = 'updated'
+                       THEN changes.added_revision ELSE excluded.added_revision END""",
+            (str(image_file), image_id, event, revision, revision)
+        )
+        self._changed = True
+
+    def _prune_tombstones(self):
+        """Forget the oldest removals past MAX_TOMBSTONES; clients behind them reload"""
+        excess = self.conn.execute(
+            "SELECT COUNT(*) FROM changes WHERE event = 'removed'"
+        ).fetchone()[0] - MAX_TOMBSTONES
+        if excess <= 0:
+            return
+        floor = self.conn.execute(
+            "SELECT MAX(revision) FROM (SELECT revision FROM changes WHERE event = 'removed' "
+            "ORDER BY revision LIMIT ?)", (excess,)
+        ).fetchone()[0]
+        self.conn.execute("DELETE FROM changes WHERE event = 'removed' AND revision <= ?", (floor,))
+        self.conn.execute("UPDATE feed_state SET value = ? WHERE key = 'floor'", (floor,))
+
+    def revision(self) -> int:
+        """Current change-feed revision (after picking up changes on disk)"""
+        self.ensure_fresh()
+        with self._lock:
+            return self.conn.execute("SELECT value FROM feed_state WHERE key = 'revision'").fetchone()[0]
+
+    def changes(self, since: int, limit: int = 1000) -> Dict:
+        """
+        Gallery delta after revision `since`: rows added or updated (each at
+        its latest state) and ids removed, oldest change first, at most `limit`
+        `reset` is set when `since` is too old (or from another index) to
+        answer incrementally; the client then reloads the full gallery
+        """
+        self.ensure_fresh()
+        conn = self._reader()
+        try:
+            # One read transaction: the revision and the rows come from the same snapshot
+            conn.execute("BEGIN")
+            state = dict(conn.execute("SELECT key, value FROM feed_state").fetchall())
+            delta = {"revision": state["revision"], "reset": False, "more": False,
+                     "added": [], "updated": [], "removed": []}
+            if since < state["floor"] or since > state["revision"]:
+                delta["reset"] = True
+                return delta
+            rows = conn.execute(
+                """SELECT changes.event, changes.image_id AS removed_id,
+                          changes.revision AS change_revision, changes.added_revision,
+                          images.*
+                   FROM changes LEFT JOIN images ON images.path = changes.path
+                   WHERE changes.revision > ?
+                   ORDER BY changes.revision LIMIT ?""",
+                (since, limit + 1)
+            ).fetchall()
+        finally:
+            conn.close()
+
+        if len(rows) > limit:
+            rows = rows[:limit]
+            delta["more"] = True
+            delta["revision"] = rows[-1]["change_revision"]
+        for row in rows:
+            if row["event"] == "removed" or row["path"] is None:
+                delta["removed"].append(row["removed_id"])
+                continue
+            record = _row_to_dict(row)
+            for key in ("event", "removed_id", "change_revision", "added_revision"):
+                record.pop(key)
+            delta["added" if row["added_revision"] > since else "updated"].append(record)
+        return delta
+
+    def resolve(self, image_id: str) -> List[Path]:
+        """
+        Paths matching an image id, via the in-memory cache or the id index
+        Bare stems (ids before they carried the folder) are still accepted;
+        more than one path means such a stem repeats across run folders
+        """
+        cached = self._paths.get(image_id)
+        if cached is not None and os.path.exists(cached):
+            return [Path(cached)]
+
+        self.ensure_fresh()
+        with self._lock:
+            if QUALIFIED_ID_SEPARATOR in image_id:
+                folder, stem = image_id.split(QUALIFIED_ID_SEPARATOR, 1)
+                rows = self.conn.execute(
+                    "SELECT path FROM images WHERE dir = ? AND id = ?",
+                    (str(self.gallery_path / folder), stem)
+                ).fetchall()
+            else:
+                rows = self.conn.execute(
+                    "SELECT path FROM images WHERE id = ?", (image_id,)
+                ).fetchall()
+            paths = [row["path"] for row in rows]
+            if len(paths) == 1:
+                self._paths[image_id] = paths[0]
+        return [Path(path) for path in paths]
+
+    def iter_rows(
+        self,
+        keywords: Optional[str] = None,
+        model: Optional[str] = None,
+        start_time: Optional[float] = None,
+        end_time: Optional[float] = None,
+        sort: str = "time",
+        descending: bool = True,
+        after: Optional[Tuple] = None,
+        limit: Optional[int] = None,
+        batch_size: int = 500
+    ) -> Iterator[Dict]:
+        """
+        Yield filtered rows in sort order, fetching in batches
+        `after` is the (sort value, path) keyset of the last row already seen
+        Uses its own read connection so slow consumers never hold the index lock
+        """
+        self.ensure_fresh()
+        column = SORT_COLUMNS[sort]
+        direction = "DESC" if descending else "ASC"
+        where, params = _filters(keywords, model, start_time, end_time)
+        if after is not None:
+            keyset = f"({column}, path) {'<' if descending else '>'} (?, ?)"
+            where = f"{where} AND {keyset}" if where else f"WHERE {keyset}"
+            params.extend(after)
+        sql = (
+            "SELECT images.* "
+            f"FROM images {where} ORDER BY {column} {direction}, path {direction}"
+        )
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        conn = self._reader()
+        try:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield _row_to_dict(row)
+        finally:
+            conn.close()
+
+    def _reader(self) -> sqlite3.Connection:
+        """Separate read-only connection (WAL allows readers alongside the writer)"""
+        self.conn  # make sure the database and schema exist
+        conn = sqlite3.connect(
+            f"file:{self.gallery_path / INDEX_FILENAME}?mode=ro",
+            uri=True,
+            check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def search(
+        self,
+        query: Optional[str] = None,
+        model: Optional[str] = None,
+        ranges: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None,
+        order: str = "relevance",
+        limit: int = 100,
+        offset: int = 0
+    ) -> List[Dict]:
+        """
+        Full-text search over prompt, negative prompt and model (FTS5), with an
+        exact model filter and inclusive (min, max) ranges on seed/steps/cfg
+        Raises ValueError for queries FTS5 cannot parse
+        """
+        self.ensure_fresh()
+        match = fts_query(query) if query else None
+        clauses = []
+        params: List = []
+        if match:
+            clauses.append("images_fts MATCH ?")
+            params.append(match)
+        if model:
+            clauses.append("images.model = ?")
+            params.append(model)
+        for column, (low, high) in (ranges or {}).items():
+            if column not in SEARCH_RANGE_COLUMNS:
+                raise ValueError(f"Cannot filter on {column}")
+            if low is not None:
+                clauses.append(f"images.{column} >= ?")
+                params.append(low)
+            if high is not None:
+                clauses.append(f"images.{column} <= ?")
+                params.append(high)
+
+        source = "images"
+        if match:
+            source = "images_fts JOIN images ON images.rowid_ = images_fts.rowid"
+        if match and order == "relevance":
+            weights = ", ".join(str(weight) for weight in SEARCH_WEIGHTS)
+            order_by = f"bm25(images_fts, {weights}), images.mtime DESC"
+        else:
+            order_by = "images.mtime DESC, images.path DESC"
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = (
+            "SELECT images.* "
+            f"FROM {source} {where} ORDER BY {order_by} LIMIT ? OFFSET ?"
+        )
+        params.extend([limit, offset])
+
+        conn = self._reader()
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        except sqlite3.OperationalError as e:
+            raise ValueError(f"Invalid search query: {e}")
+        finally:
+            conn.close()
+        return [_row_to_dict(row) for row in rows]
+
+    def totals(
+        self,
+        keywords: Optional[str] = None,
+        model: Optional[str] = None,
+        start_time: Optional[float] = None,
+        end_time: Optional[float] = None
+    ) -> Dict:
+        """Image count and total bytes for the filtered set"""
+        self.ensure_fresh()
+        where, params = _filters(keywords, model, start_time, end_time)
+        with self._lock:
+            row = self.conn.execute(
+                f"SELECT COUNT(*) AS count, COALESCE(SUM(size), 0) AS size FROM images {where}",
+                params
+            ).fetchone()
+        return {"count": row["count"], "size": row["size"]}
+
+
+def _filters(keywords, model, start_time, end_time):
+    clauses = []
+    params: List = []
+    if keywords:
+        clauses.append("instr(lower(prompt), ?) > 0")
+        params.append(keywords.lower())
+    if model:
+        clauses.append("instr(model, ?) > 0")
+        params.append(model)
+    if start_time is not None:
+        clauses.append("mtime >= ?")
+        params.append(start_time)
+    if end_time is not None:
+        clauses.append("mtime < ?")
+        params.append(end_time)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return where, params
+
+
+def _row_to_dict(row: sqlite3.Row) -> Dict:
+    record = dict(row)
+    record["parameters"] = json.loads(record["parameters"])
+    record["metadata"] = json.loads(record["metadata"])
+    record["image_id"] = image_id_for(record)
+    return record
+
+
+def image_id_for(record: Dict) -> str:
+    """Public id of an index row"""
+    return public_id(record["dir"], record["id"])
+
+
+def public_id(dir_path: str, stem: str) -> str:
+    """Run folder and file stem: stable however many runs reuse the stem"""
+    return f"{Path(dir_path).name}{QUALIFIED_ID_SEPARATOR}{stem}"
+
+
+def _sidecar_mtime(image_file: Path) -> Optional[float]:
+    sidecar = sidecar_for(image_file)
+    try:
+        return sidecar.stat().st_mtime if sidecar is not None else None
+    except OSError:
+        return None
+
+
+def _int_or_default(value, default: Optional[int] = -1) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _float_or_none(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def fts_query(text: str) -> Optional[str]:
+    """
+    Turn user search text into a safe FTS5 query: "quoted phrases" stay
+    phrases, other words become terms (a trailing * keeps prefix matching),
+    and all of them must match
+    """
+    parts = []
+    for index, chunk in enumerate(text.split('"')):
+        if index % 2:
+            words = chunk.split()
+            if words:
+                parts.append('"' + " ".join(word.replace('"', "") for word in words) + '"')
+            continue
+        for word in chunk.split():
+            prefix = word.endswith("*")
+            word = word.rstrip("*")
+            if word:
+                parts.append(f'"{word}"' + ("*" if prefix else ""))
+    return " ".join(parts) or None
+
+
+gallery_index = GalleryIndex()
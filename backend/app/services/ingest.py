@@ -0,0 +1,144 @@
+"""
+Gallery Ingest Service
+Copies finished generations into the gallery with a canonical JSON sidecar,
+then indexes them and warms their thumbnails, off the request path
+Traceability: FUN-GALLERY-VIEW-001, FUN-GALLERY-VIEW-002, FUN-GEN-REQUEST-015
+"""
+import asyncio
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from app.services.gallery_index import GALLERY_PATH, gallery_index
+from app.services.output_cache import output_cache
+from app.services.thumbnails import thumbnail_service
+from app.services.workflows import workflow_registry
+from app.services.structured_log import get_logger, log_event
+
+logger = get_logger("ingest")
+
+
+# Set GALLERY_INGEST=0 to leave the gallery to the shell scripts
+GALLERY_INGEST = os.environ.get("GALLERY_INGEST", "1") != "0"
+
+# Run folder (under the gallery) that API generations land in, per day
+INGEST_DIR_FORMAT = "api_%Y%m%d"
+
+# Fields stored at the top level of the sidecar; the rest go under "parameters"
+TOP_LEVEL_FIELDS = ("prompt", "negative_prompt", "model", "seed")
+
+
+def build_metadata(job: Dict, image: Dict, index: int) -> Dict:
+    """Canonical sidecar content for one output image"""
+    fields = workflow_registry.describe(job["preset"], job["workflow"])
+    metadata = {field: fields.pop(field) for field in TOP_LEVEL_FIELDS if field in fields}
+    metadata.update({
+        "parameters": fields,
+        "preset": job["preset"],
+        "request_id": job["request_id"],
+        # Position within a collapsed batch (all latents share the seed above)
+        "batch_index": index,
+        "source": {
+            "instance": job["node"].name if job.get("node") else None,
+            "filename": image["filename"]
+        },
+        "created_at": datetime.now().isoformat(timespec="seconds")
+    })
+    return metadata
+
+
+class GalleryIngester:
+    """Background queue of completed jobs to copy into the gallery"""
+
+    def __init__(self, gallery_path: Path = GALLERY_PATH, enabled: bool = GALLERY_INGEST):
+        self.gallery_path = gallery_path
+        self.enabled = enabled
+        self._queue: "asyncio.Queue[Tuple[Dict, Dict]]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.enabled and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def on_job_complete(self, job: Dict, result: Dict):
+        """Scheduler listener: queue the job's outputs (never blocks)"""
+        if self.enabled and result["images"]:
+            self._queue.put_nowait((job, result))
+
+    async def _run(self):
+        while True:
+            job, result = await self._queue.get()
+            try:
+                await self.ingest(job, result)
+            except Exception as e:
+                log_event(
+                    logger, "ingest_failed", level=logging.ERROR,
+                    request_id=job["request_id"], error=str(e)
+                )
+
+    async def ingest(self, job: Dict, result: Dict):
+        run_dir = self.gallery_path / time.strftime(INGEST_DIR_FORMAT)
+        for index, image in enumerate(result["images"]):
+            stem = f"{job['request_id'][:8]}_{index:03d}"
+            metadata = build_metadata(job, image, index)
+            # A blob evicted before it is copied (cache pressure, another worker) is fetched once more
+            for attempt in range(2):
+                # Streams from the instance that produced it (or reuses the cached blob)
+                digest = await output_cache.get(
+                    image["filename"], image.get("instance"), image.get("subfolder", "")
+                )
+                if digest is None:
+                    log_event(
+                        logger, "ingest_download_failed", level=logging.ERROR, filename=image["filename"]
+                    )
+                    break
+                try:
+                    await asyncio.to_thread(
+                        self._write, run_dir, stem, output_cache.blob_path(digest), metadata
+                    )
+                    break
+                except FileNotFoundError:
+                    output_cache.discard(digest)
+                    log_event(
+                        logger, "ingest_blob_missing", level=logging.WARNING,
+                        filename=image["filename"], retrying=attempt == 0
+                    )
+
+    def _write(self, run_dir: Path, stem: str, blob: Path, metadata: Dict):
+        """
+        Write sidecar then image atomically, index the image and queue its thumbnail
+        Raises FileNotFoundError, before anything is published, if the blob is gone
+        """
+        run_dir.mkdir(parents=True, exist_ok=True)
+        image_file = run_dir / f"{stem}.png"
+        sidecar = image_file.with_suffix(".json")
+
+        # Copied first so a missing blob leaves no sidecar behind
+        temp_image = run_dir / f".{stem}.png.tmp"
+        shutil.copyfile(blob, temp_image)
+
+        temp_sidecar = run_dir / f".{stem}.json.tmp"
+        with open(temp_sidecar, "w") as f:
+            json.dump(metadata, f, indent=2)
+        os.replace(temp_sidecar, sidecar)
+        os.replace(temp_image, image_file)
+
+        gallery_index.add_file(image_file)
+        thumbnail_service.prewarm(image_file)
+
+
+gallery_ingester = GalleryIngester()
@@ -0,0 +1,299 @@
+"""
+Job Store Service
+Compact generation/batch records behind a pluggable store: a bounded
+in-memory LRU for single-worker runs, SQLite (WAL) shared across workers
+Traceability: FUN-GEN-REQUEST-010, FUN-GEN-REQUEST-011, FUN-BATCH-GEN
+"""
+import asyncio
+import copy
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+from app.services.structured_log import get_logger, log_event
+
+logger = get_logger("job_store")
+
+
+# "memory" (default) or "sqlite"; use sqlite when running several workers
+JOB_STORE = os.environ.get("JOB_STORE", "memory")
+JOB_STORE_PATH = Path(os.environ.get(
+    "JOB_STORE_PATH",
+    str(Path.home() / ".cache" / "image-gen-backend" / "jobs.db")
+))
+
+# Finished jobs are purged this long after their last update (seconds)
+JOB_TTL = float(os.environ.get("JOB_TTL", str(24 * 3600)))
+JOB_PURGE_INTERVAL = float(os.environ.get("JOB_PURGE_INTERVAL", "300"))
+
+# Upper bound on stored records; oldest finished ones go first
+MAX_JOB_RECORDS = int(os.environ.get("MAX_JOB_RECORDS", "10000"))
+
+# Statuses after which a record only changes by being purged
+FINISHED_STATUSES = {"completed", "complete", "failed", "cancelled"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    finished INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs (finished, updated_at);
+"""
+
+
+def generation_record(preset: str, status: str, images: Optional[List[Dict]] = None) -> Dict:
+    """Compact record of one generation (status endpoint fallback, other workers)"""
+    return {
+        "type": "generation",
+        "status": status,
+        "preset": preset,
+        "created_at": time.time(),
+        "images": images or [],
+        "error": None
+    }
+
+
+class JobStore(ABC):
+    """
+    Interface shared by the store backends
+    Records are small JSON-serializable dicts carrying at least "status";
+    callers get copies, so a change is stored only through put/update.
+    Async code uses the *_async variants, which keep blocking backends off
+    the event loop
+    """
+
+    # Set when calls may wait on disk or on other workers' locks
+    blocking = False
+
+    def __init__(self, ttl: float = JOB_TTL, max_records: int = MAX_JOB_RECORDS):
+        self.ttl = ttl
+        self.max_records = max_records
+        self._task: Optional[asyncio.Task] = None
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    def put(self, job_id: str, record: Dict):
+        ...
+
+    @abstractmethod
+    def update(self, job_id: str, **fields) -> Optional[Dict]:
+        """Merge fields into an existing record; unknown ids are ignored"""
+
+    @abstractmethod
+    def purge(self) -> int:
+        """Drop expired finished records; returns how many were removed"""
+
+    def close(self):
+        pass
+
+    async def get_async(self, job_id: str) -> Optional[Dict]:
+        if self.blocking:
+            return await asyncio.to_thread(self.get, job_id)
+        return self.get(job_id)
+
+    async def put_async(self, job_id: str, record: Dict):
+        if self.blocking:
+            # Copy on the loop: the caller may keep mutating the record meanwhile
+            await asyncio.to_thread(self.put, job_id, copy.deepcopy(record))
+        else:
+            self.put(job_id, record)
+
+    async def update_async(self, job_id: str, **fields) -> Optional[Dict]:
+        if self.blocking:
+            return await asyncio.to_thread(lambda: self.update(job_id, **copy.deepcopy(fields)))
+        return self.update(job_id, **fields)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._purge_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.close()
+
+    async def _purge_loop(self):
+        while True:
+            await asyncio.sleep(JOB_PURGE_INTERVAL)
+            try:
+                if self.blocking:
+                    await asyncio.to_thread(self.purge)
+                else:
+                    self.purge()
+            except Exception as e:
+                log_event(logger, "purge_failed", level=logging.ERROR, error=str(e))
+
+
+class MemoryJobStore(JobStore):
+    """LRU-bounded dict of records, local to this process"""
+
+    def __init__(self, ttl: float = JOB_TTL, max_records: int = MAX_JOB_RECORDS):
+        super().__init__(ttl, max_records)
+        self._records: "OrderedDict[str, Dict]" = OrderedDict()
+        self._updated: Dict[str, float] = {}
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        record = self._records.get(job_id)
+        if record is None:
+            return None
+        self._records.move_to_end(job_id)
+        return copy.deepcopy(record)
+
+    def put(self, job_id: str, record: Dict):
+        self._records[job_id] = copy.deepcopy(record)
+        self._records.move_to_end(job_id)
+        self._updated[job_id] = time.time()
+        self._evict()
+
+    def update(self, job_id: str, **fields) -> Optional[Dict]:
+        record = self._records.get(job_id)
+        if record is None:
+            return None
+        record.update(copy.deepcopy(fields))
+        self._records.move_to_end(job_id)
+        self._updated[job_id] = time.time()
+        return copy.deepcopy(record)
+
+    def purge(self) -> int:
+        cutoff = time.time() - self.ttl
+        expired = [
+            job_id for job_id, record in self._records.items()
+            if record.get("status") in FINISHED_STATUSES and self._updated[job_id] < cutoff
+        ]
+        for job_id in expired:
+            self._delete(job_id)
+        return len(expired)
+
+    def _evict(self):
+        # Least recently used first, sparing unfinished jobs while possible
+        excess = len(self._records) - self.max_records
+        if excess <= 0:
+            return
+        for job_id in list(self._records):
+            if excess <= 0:
+                return
+            if self._records[job_id].get("status") in FINISHED_STATUSES:
+                self._delete(job_id)
+                excess -= 1
+        while excess > 0:
+            self._delete(next(iter(self._records)))
+            excess -= 1
+
+    def _delete(self, job_id: str):
+        del self._records[job_id]
+        del self._updated[job_id]
+
+
+class SQLiteJobStore(JobStore):
+    """Records in a WAL-mode SQLite file, visible to every worker on the host"""
+
+    blocking = True
+
+    def __init__(self, path: Path = JOB_STORE_PATH, ttl: float = JOB_TTL, max_records: int = MAX_JOB_RECORDS):
+        super().__init__(ttl, max_records)
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(
+                str(self.path),
+                check_same_thread=False,
+                isolation_level=None,
+                timeout=5
+            )
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self.conn.execute("SELECT record FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, job_id: str, record: Dict):
+        with self._lock:
+            self._write(job_id, record)
+
+    def update(self, job_id: str, **fields) -> Optional[Dict]:
+        with self._lock:
+            # Read-modify-write under a write lock so workers don't lose updates
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute("SELECT record FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                if row is None:
+                    self.conn.execute("COMMIT")
+                    return None
+                record = json.loads(row[0])
+                record.update(fields)
+                self._write(job_id, record)
+                self.conn.execute("COMMIT")
+                return record
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def purge(self) -> int:
+        with self._lock:
+            removed = self.conn.execute(
+                "DELETE FROM jobs WHERE finished = 1 AND updated_at < ?",
+                (time.time() - self.ttl,)
+            ).rowcount
+            # Keep the table bounded even within the TTL
+            removed += self.conn.execute(
+                """
+                DELETE FROM jobs WHERE id IN (
+                    SELECT id FROM jobs WHERE finished = 1
+                    ORDER BY updated_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_records,)
+            ).rowcount
+        return removed
+
+    def _write(self, job_id: str, record: Dict):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO jobs (id, finished, updated_at, record) VALUES (?, ?, ?, ?)",
+            (
+                job_id,
+                int(record.get("status") in FINISHED_STATUSES),
+                time.time(),
+                json.dumps(record, separators=(",", ":"))
+            )
+        )
+
+
+def create_job_store(kind: str = JOB_STORE) -> JobStore:
+    if kind == "sqlite":
+        return SQLiteJobStore()
+    if kind != "memory":
+        log_event(logger, "unknown_job_store", level=logging.WARNING, kind=kind, using="memory")
+    return MemoryJobStore()
+
+
+job_store = create_job_store()
@@ -0,0 +1,221 @@
+"""
+Metrics Service
+Counters, gauges and latency histograms exposed in the Prometheus text format
+Traceability: STK-BACKEND-030
+"""
+import bisect
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.services.structured_log import get_logger, log_event
+
+logger = get_logger("metrics")
+
+
+# Latency buckets (seconds) shared by the request/ComfyUI/job histograms
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metric(ABC):
+    """Base for one named metric family with a fixed set of label names"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = labels
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def _format_labels(self, values: LabelValues, extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.label_names, values))
+        if extra is not None:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        """Exposition lines for every label combination"""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{self._format_labels(key)} {value}" for key, value in items]
+
+
+class Gauge(Metric):
+    """Gauge read from a callback at scrape time (label values -> number)"""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        read: Callable[[], Dict[LabelValues, float]],
+        labels: Tuple[str, ...] = ()
+    ):
+        super().__init__(name, documentation, labels)
+        self.read = read
+
+    def samples(self) -> List[str]:
+        try:
+            values = self.read()
+        except Exception as e:
+            log_event(logger, "gauge_read_failed", level=logging.ERROR, gauge=self.name, error=str(e))
+            return []
+        return [f"{self.name}{self._format_labels(key)} {value}" for key, value in values.items()]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> (per-bucket counts, sum, count)
+        self._series: Dict[LabelValues, List] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with-block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(series[0]), series[1], series[2]) for key, series in self._series.items()]
+        lines = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{self._format_labels(key, ('le', repr(float(bound))))} {cumulative}")
+            lines.append(f"{self.name}_bucket{self._format_labels(key, ('le', '+Inf'))} {count}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: Tuple[str, ...] = (), **kwargs) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, **kwargs))
+
+    def gauge(self, name: str, documentation: str, read: Callable, labels: Tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, read, labels))
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self.metrics.values()) + "\n"
+
+
+registry = Registry()
+
+# Shared metric families (service-specific gauges register themselves)
+http_request_seconds = registry.histogram(
+    "http_request_duration_seconds",
+    "API request latency until response headers, by route template",
+    ("method", "route", "status")
+)
+comfyui_call_seconds = registry.histogram(
+    "comfyui_call_duration_seconds",
+    "ComfyUI HTTP round-trip time per call",
+    ("instance", "call", "outcome")
+)
+job_queue_wait_seconds = registry.histogram(
+    "generation_queue_wait_seconds",
+    "Time a job waited in the backend scheduler before submission"
+)
+job_execution_seconds = registry.histogram(
+    "generation_execution_seconds",
+    "Time from submission (or the previous completion on the instance) to completion"
+)
+jobs_total = registry.counter(
+    "generation_jobs_total",
+    "Jobs finished, by final status",
+    ("status",)
+)
+cache_requests_total = registry.counter(
+    "cache_requests_total",
+    "Cache lookups by cache and result (hit, miss, coalesced)",
+    ("cache", "result")
+)
+admission_rejected_total = registry.counter(
+    "admission_rejected_total",
+    "Generation requests turned away with 429, by priority class and limit hit",
+    ("priority", "limit")
+)
+gallery_refresh_seconds = registry.histogram(
+    "gallery_refresh_duration_seconds",
+    "Gallery index refresh (scan of changed run folders) duration"
+)
+gallery_dirs_scanned_total = registry.counter(
+    "gallery_dirs_scanned_total",
+    "Run folders rescanned by gallery index refreshes"
+)
@@ -0,0 +1,87 @@
+"""
+Model List Cache
+TTL cache with stale-while-revalidate for the processed model list
+Traceability: FUN-MODEL-SELECT-001, FUN-MODEL-SELECT-009
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+from app.services.metrics import cache_requests_total
+from app.services.structured_log import get_logger, log_event
+
+logger = get_logger("model_cache")
+
+
+# Served without revalidation for this long (seconds)
+MODEL_CACHE_TTL = float(os.environ.get("MODEL_CACHE_TTL", "60"))
+
+# Past the TTL, stale data is still served (and refreshed in the background) up to this age
+MODEL_CACHE_MAX_STALE = float(os.environ.get("MODEL_CACHE_MAX_STALE", "3600"))
+
+
+class StaleWhileRevalidateCache:
+    """
+    Single-value cache around an async loader
+    The loader returns a (value, serialized bytes) pair or None on failure;
+    the ETag is a hash of the serialized form, so it only changes with the content
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], Awaitable[Optional[Tuple[Any, bytes]]]],
+        ttl: float = MODEL_CACHE_TTL,
+        max_stale: float = MODEL_CACHE_MAX_STALE,
+        name: str = "model_list"
+    ):
+        self.loader = loader
+        self.name = name
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.value: Any = None
+        self.etag: Optional[str] = None
+        self.fetched_at = 0.0
+        self._refresh: Optional[asyncio.Task] = None
+
+    def invalidate(self):
+        """Force a reload on the next request (the old ETag is kept for change detection)"""
+        self.value = None
+        self.fetched_at = 0.0
+
+    async def get(self) -> Tuple[Any, Optional[str]]:
+        """(value, etag); value is None only if nothing could be loaded"""
+        age = time.monotonic() - self.fetched_at
+        if self.value is not None and age < self.ttl:
+            cache_requests_total.inc(cache=self.name, result="hit")
+            return self.value, self.etag
+        if self.value is not None and age < self.max_stale:
+            cache_requests_total.inc(cache=self.name, result="stale")
+            self._start_refresh()
+            return self.value, self.etag
+        cache_requests_total.inc(cache=self.name, result="miss")
+
+        await asyncio.shield(self._start_refresh())
+        if time.monotonic() - self.fetched_at >= self.max_stale:
+            return None, None
+        return self.value, self.etag
+
+    def _start_refresh(self) -> asyncio.Task:
+        """Single-flight refresh shared by all concurrent callers"""
+        if self._refresh is None or self._refresh.done():
+            self._refresh = asyncio.create_task(self._load())
+        return self._refresh
+
+    async def _load(self):
+        loaded = await self.loader()
+        if loaded is None:
+            return
+        value, serialized = loaded
+        etag = '"' + hashlib.sha1(serialized).hexdigest() + '"'
+        if self.etag is not None and etag != self.etag:
+            log_event(logger, "cached_value_changed", cache=self.name, etag=etag)
+        self.value = value
+        self.etag = etag
+        self.fetched_at = time.monotonic()
@@ -0,0 +1,205 @@
+"""
+Node Schema Service
+Keeps the /object_info schema of the node classes the presets use and checks
+built workflows against it locally (node types, required inputs, enums,
+numeric ranges, links), so bad requests fail in microseconds with a precise
+error instead of after a round trip to ComfyUI
+Traceability: FUN-GEN-REQUEST-007, FUN-MODEL-SELECT-001, STK-INTEGRATION-015
+"""
+import asyncio
+import json
+import os
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from app.services.model_cache import StaleWhileRevalidateCache
+from app.services.pool import comfyui_pool
+from app.services.workflows import workflow_registry
+
+# Served without revalidation for this long (seconds); node schemas change rarely
+NODE_SCHEMA_TTL = float(os.environ.get("NODE_SCHEMA_TTL", "300"))
+
+# A workflow failing on a possibly outdated schema (e.g. a model installed
+# since the last fetch) reloads it first, at most this often (seconds)
+SCHEMA_RECHECK_INTERVAL = 10.0
+
+
+class WorkflowError(NamedTuple):
+    node_id: str
+    class_type: str
+    input: Optional[str]
+    message: str
+    # May be the schema that is outdated rather than the request (enum, node type)
+    schema_dependent: bool = False
+
+
+async def _load_node_schema() -> Optional[Tuple[Dict, bytes]]:
+    """
+    FUN-MODEL-SELECT-001: /object_info/{class} for each class the presets use
+    Maps class -> schema, or None for classes ComfyUI does not know; classes
+    whose request failed are left out (and go unchecked)
+    """
+    classes = sorted(workflow_registry.node_classes())
+    service = comfyui_pool.any_service()
+    responses = await asyncio.gather(*(service.get_node_info(node_class) for node_class in classes))
+    if not any(response is not None for response in responses):
+        return None
+
+    schema = {}
+    for node_class, response in zip(classes, responses):
+        if response is not None:
+            schema[node_class] = response.get(node_class)
+    return schema, json.dumps(schema, sort_keys=True).encode()
+
+
+node_schema_cache = StaleWhileRevalidateCache(_load_node_schema, ttl=NODE_SCHEMA_TTL, name="node_schema")
+
+
+async def check_workflow(workflow: Dict) -> List[WorkflowError]:
+    """
+    Errors of a workflow against the cached schema ([] if it is valid, or
+    if no schema could be loaded: ComfyUI then validates on submit)
+    """
+    if node_schema_cache.value is None and not comfyui_pool.is_available():
+        # Nothing cached and no instance to ask: don't wait on a doomed fetch
+        return []
+    schema, _ = await node_schema_cache.get()
+    if schema is None:
+        return []
+    errors = validate_workflow(workflow, schema)
+    unchecked = any(node.get("class_type") not in schema for node in workflow.values())
+    stale = unchecked or any(error.schema_dependent for error in errors)
+    if stale and time.monotonic() - node_schema_cache.fetched_at >= SCHEMA_RECHECK_INTERVAL:
+        node_schema_cache.invalidate()
+        schema, _ = await node_schema_cache.get()
+        if schema is None:
+            return []
+        errors = validate_workflow(workflow, schema)
+    return errors
+
+
+def validate_workflow(workflow: Dict, schema: Dict[str, Optional[Dict]]) -> List[WorkflowError]:
+    """Check every node whose class is in `schema`; classes missing from it are skipped"""
+    errors: List[WorkflowError] = []
+    has_output = False
+    reports_outputs = False
+    for node_id, node in workflow.items():
+        class_type = node.get("class_type")
+        if class_type not in schema:
+            continue
+        info = schema[class_type]
+        if info is None:
+            errors.append(WorkflowError(
+                node_id, class_type, None, f"Unknown node type {class_type}", schema_dependent=True
+            ))
+            continue
+        if "output_node" in info:
+            reports_outputs = True
+            has_output = has_output or bool(info["output_node"])
+
+        inputs = node.get("inputs", {})
+        declared = info.get("input", {})
+        for required, specs in ((True, declared.get("required", {})), (False, declared.get("optional", {}))):
+            for name, spec in specs.items():
+                if name not in inputs:
+                    if required:
+                        errors.append(WorkflowError(node_id, class_type, name, "Required input is missing"))
+                    continue
+                message = _check_input(workflow, schema, inputs[name], spec)
+                if message is not None:
+                    errors.append(WorkflowError(
+                        node_id, class_type, name, message,
+                        schema_dependent=_combo_options(spec) is not None
+                    ))
+
+    if reports_outputs and not has_output and not errors:
+        errors.append(WorkflowError("", "", None, "Workflow has no output node"))
+    return errors
+
+
+def _check_input(workflow: Dict, schema: Dict, value, spec: List) -> Optional[str]:
+    """Error message for one input value against its [type, options] spec, or None"""
+    expected = spec[0]
+    options = spec[1] if len(spec) > 1 and isinstance(spec[1], dict) else {}
+
+    if _is_link(value):
+        return _check_link(workflow, schema, value, expected)
+
+    choices = _combo_options(spec)
+    if choices is not None:
+        # Upload targets list the instance's input folder, which uploads reach only at dispatch
+        if options.get("image_upload"):
+            return None if isinstance(value, str) else f"Expected a file name, got {value!r}"
+        if value not in choices:
+            shown = ", ".join(map(str, choices[:10])) + (", ..." if len(choices) > 10 else "")
+            return f"{value!r} is not one of the available values ({shown})"
+        return None
+    if expected == "INT":
+        if isinstance(value, bool) or not isinstance(value, int):
+            return f"Expected an integer, got {value!r}"
+        return _check_range(value, options)
+    if expected == "FLOAT":
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return f"Expected a number, got {value!r}"
+        return _check_range(value, options)
+    if expected == "STRING":
+        return None if isinstance(value, str) else f"Expected a string, got {value!r}"
+    if expected == "BOOLEAN":
+        return None if isinstance(value, bool) else f"Expected true or false, got {value!r}"
+    # Custom nodes declare their own widget types: left for ComfyUI to check
+    return None
+
+
+def _combo_options(spec: List) -> Optional[List]:
+    """
+    Allowed values of an enum input: the legacy [[values], options] form or
+    the ["COMBO", {"options": [values]}] form; None for other inputs and
+    for combos whose values are not listed (e.g. fetched by the frontend)
+    """
+    if isinstance(spec[0], list):
+        return spec[0]
+    if spec[0] == "COMBO":
+        options = spec[1] if len(spec) > 1 and isinstance(spec[1], dict) else {}
+        if isinstance(options.get("options"), list):
+            return options["options"]
+    return None
+
+
+def _check_range(value, options: Dict) -> Optional[str]:
+    minimum = options.get("min")
+    maximum = options.get("max")
+    if minimum is not None and value < minimum:
+        return f"{value} is below the minimum of {minimum}"
+    if maximum is not None and value > maximum:
+        return f"{value} is above the maximum of {maximum}"
+    return None
+
+
+def _is_link(value) -> bool:
+    return (
+        isinstance(value, list) and len(value) == 2
+        and isinstance(value[0], str) and isinstance(value[1], int)
+    )
+
+
+def _check_link(workflow: Dict, schema: Dict, link: List, expected) -> Optional[str]:
+    """Link integrity: the source node exists, has that output, of a compatible type"""
+    source_id, index = link
+    source = workflow.get(source_id)
+    if source is None:
+        return f"Linked node {source_id} does not exist"
+    info = schema.get(source.get("class_type"))
+    if info is None:
+        # Source class unknown here (reported on its own node) or unchecked
+        return None
+    outputs = info.get("output", [])
+    if not 0 <= index < len(outputs):
+        return f"Node {source_id} ({source['class_type']}) has no output {index}"
+    output_type = outputs[index]
+    if isinstance(expected, list) or expected == "COMBO":
+        # Combo inputs converted to links take whatever list output feeds them
+        return None
+    # "*" matches anything; "A,B" accepts either type
+    if "*" in (expected, output_type) or set(str(expected).split(",")) & set(str(output_type).split(",")):
+        return None
+    return f"Expected a {expected} link, node {source_id} ({source['class_type']}) output {index} is {output_type}"
@@ -0,0 +1,206 @@
+"""
+Output Cache Service
+Content-addressed local cache of images downloaded from ComfyUI
+Traceability: FUN-GEN-REQUEST-015, STK-INTEGRATION-017
+"""
+import asyncio
+import os
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import urlencode
+
+from app.services.metrics import cache_requests_total, registry
+from app.services.pool import comfyui_pool
+
+OUTPUT_CACHE_DIR = Path(os.environ.get(
+    "OUTPUT_CACHE_DIR",
+    str(Path.home() / ".cache" / "image-gen-backend" / "outputs")
+))
+
+# Total size bound for cached blobs; least recently used are evicted first
+OUTPUT_CACHE_MAX_BYTES = int(os.environ.get("OUTPUT_CACHE_MAX_BYTES", str(2 * 1024**3)))
+
+# Output -> digest map kept next to the blobs (one "name<TAB>digest" line
+# per download), so cached outputs are still found after a restart
+NAMES_FILE = "names.tsv"
+
+# Stale map lines tolerated beyond twice the live entries before a rewrite
+NAMES_COMPACT_SLACK = 1000
+
+
+def output_name(filename: str, instance: Optional[str] = None, subfolder: str = "") -> str:
+    """
+    Cache key of a ComfyUI output: instances number their files independently,
+    so a filename is only unique together with its instance and subfolder
+    """
+    if instance is None and not subfolder:
+        return filename
+    return f"{instance or ''}:{subfolder}/{filename}"
+
+
+def output_url(image: Dict) -> str:
+    """FUN-GEN-REQUEST-014: Download URL of an output image entry"""
+    query = {key: image[key] for key in ("instance", "subfolder") if image.get(key)}
+    url = f"/api/generate/image/{image['filename']}"
+    return f"{url}?{urlencode(query)}" if query else url
+
+
+class OutputCache:
+    """
+    Blobs are stored as {sha256}.png so identical outputs are kept once;
+    ComfyUI outputs map onto digests in memory and in an append-only file
+    """
+
+    def __init__(self, cache_dir: Path = OUTPUT_CACHE_DIR, max_bytes: int = OUTPUT_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._names: Dict[str, str] = {}
+        self._blobs: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self._loaded = False
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Lines in the names file, live or not
+        self._name_lines = 0
+
+    def _load(self):
+        """Account for blobs left by a previous run, oldest first"""
+        if self._loaded:
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        blobs = sorted(self.cache_dir.glob("*.png"), key=lambda path: path.stat().st_atime)
+        for blob in blobs:
+            size = blob.stat().st_size
+            self._blobs[blob.stem] = size
+            self._total_bytes += size
+        self._load_names()
+        self._loaded = True
+
+    def _load_names(self):
+        """Output map of earlier runs; entries of evicted blobs are skipped"""
+        try:
+            with open(self.cache_dir / NAMES_FILE) as f:
+                for line in f:
+                    name, _, digest = line.rstrip("\n").partition("\t")
+                    self._name_lines += 1
+                    if digest in self._blobs:
+                        self._names[name] = digest
+        except FileNotFoundError:
+            pass
+        self._compact_names()
+
+    def _remember(self, name: str, digest: str):
+        self._names[name] = digest
+        if "\t" in name or "\n" in name:
+            return
+        # Appends are atomic for lines this short, so workers may share the file
+        with open(self.cache_dir / NAMES_FILE, "a") as f:
+            f.write(f"{name}\t{digest}\n")
+        self._name_lines += 1
+        self._compact_names()
+
+    def _compact_names(self):
+        """
+        Rewrite the names file once it is mostly stale lines (a line another
+        worker appends during the rewrite is lost: that name is re-downloaded)
+        """
+        if self._name_lines <= 2 * len(self._names) + NAMES_COMPACT_SLACK:
+            return
+        temp_path = self.cache_dir / f".{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "w") as f:
+            f.writelines(f"{name}\t{digest}\n" for name, digest in self._names.items())
+        os.replace(temp_path, self.cache_dir / NAMES_FILE)
+        self._name_lines = len(self._names)
+
+    def blob_path(self, digest: str) -> Path:
+        return self.cache_dir / f"{digest}.png"
+
+    async def get(self, filename: str, instance: Optional[str] = None, subfolder: str = "") -> Optional[str]:
+        """
+        Digest of a ComfyUI output, downloading it on a miss from the
+        instance that wrote it; concurrent misses share one download
+        """
+        self._load()
+        name = output_name(filename, instance, subfolder)
+        digest = self._names.get(name)
+        if digest is not None and digest in self._blobs:
+            self._blobs.move_to_end(digest)
+            cache_requests_total.inc(cache="output", result="hit")
+            return digest
+
+        inflight = self._inflight.get(name)
+        if inflight is not None:
+            cache_requests_total.inc(cache="output", result="coalesced")
+            return await asyncio.shield(inflight)
+        cache_requests_total.inc(cache="output", result="miss")
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[name] = future
+        try:
+            digest = await self._download(name, filename, instance, subfolder)
+            future.set_result(digest)
+            return digest
+        except Exception as e:
+            future.set_exception(e)
+            # Mark it retrieved: with no coalesced waiter asyncio would log it
+            future.exception()
+            raise
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        finally:
+            del self._inflight[name]
+
+    async def _download(
+        self, name: str, filename: str, instance: Optional[str], subfolder: str
+    ) -> Optional[str]:
+        temp_path = self.cache_dir / f".{uuid.uuid4().hex}.tmp"
+        digest = None
+        for service in comfyui_pool.services_for_output(instance):
+            digest = await service.download_image_to(filename, str(temp_path), subfolder)
+            if digest is not None:
+                break
+        if digest is None:
+            temp_path.unlink(missing_ok=True)
+            return None
+
+        blob = self.blob_path(digest)
+        if digest in self._blobs:
+            # Same bytes already cached under another name
+            temp_path.unlink(missing_ok=True)
+            self._blobs.move_to_end(digest)
+        else:
+            os.replace(temp_path, blob)
+            size = blob.stat().st_size
+            self._blobs[digest] = size
+            self._total_bytes += size
+            self._evict(keep=digest)
+
+        self._remember(name, digest)
+        return digest
+
+    def discard(self, digest: str):
+        """Forget a blob that is gone from disk (e.g. evicted by another worker)"""
+        size = self._blobs.pop(digest, None)
+        if size is not None:
+            self._total_bytes -= size
+        for name in [name for name, value in self._names.items() if value == digest]:
+            del self._names[name]
+
+    def _evict(self, keep: str):
+        while self._total_bytes > self.max_bytes and len(self._blobs) > 1:
+            digest = next(iter(self._blobs))
+            if digest == keep:
+                break
+            self.discard(digest)
+            self.blob_path(digest).unlink(missing_ok=True)
+
+
+output_cache = OutputCache()
+
+registry.gauge(
+    "output_cache_bytes",
+    "Bytes of ComfyUI outputs held in the local cache",
+    lambda: {(): output_cache._total_bytes}
+)
@@ -0,0 +1,184 @@
+"""
+ComfyUI Pool Service
+Spreads generations over several ComfyUI instances, tracks their health with a
+background prober and pins each job to the instance that ran it
+Traceability: STK-INTEGRATION-014 to STK-INTEGRATION-017, STK-BACKEND-029
+"""
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.services.comfyui import AsyncComfyUIService, COMFYUI_BASE_URL, comfyui_service
+from app.services.progress import (
+    ComfyUIProgressListener, job_tracker, progress_listener, wait_for_job
+)
+from app.services.structured_log import get_logger, log_event
+
+logger = get_logger("pool")
+
+
+# Comma-separated ComfyUI base URLs; the first one reuses the default service
+COMFYUI_URLS = [
+    url.strip().rstrip("/")
+    for url in os.environ.get("COMFYUI_URLS", COMFYUI_BASE_URL).split(",")
+    if url.strip()
+]
+
+# Seconds between health/queue probes of each instance
+COMFYUI_PROBE_INTERVAL = float(os.environ.get("COMFYUI_PROBE_INTERVAL", "5"))
+
+# Job -> instance pins kept for status routing
+MAX_PINNED_JOBS = 5000
+
+
+class ComfyUINode:
+    """One ComfyUI instance with its client, event stream and load state"""
+
+    def __init__(self, service: AsyncComfyUIService, listener: ComfyUIProgressListener):
+        self.service = service
+        self.listener = listener
+        self.name = service.base_url
+        self.healthy = False
+        # Prompts running or pending on the instance, from all clients
+        self.queue_depth = 0
+        # (checkpoint, LoRA) of the last prompt dispatched here
+        self.current_key: Optional[Tuple] = None
+        # Our prompts dispatched here and not yet finished
+        self.in_flight: Set[str] = set()
+
+    @property
+    def load(self) -> Tuple[int, int]:
+        return len(self.in_flight), self.queue_depth
+
+    def describe(self) -> Dict:
+        return {
+            "url": self.name,
+            "healthy": self.healthy,
+            "connected": self.listener.connected,
+            "queue_depth": self.queue_depth,
+            "in_flight": len(self.in_flight),
+            "model": self.current_key[0] if self.current_key else None
+        }
+
+
+class ComfyUIPool:
+    """
+    STK-BACKEND-029: Availability comes from the last probe, so request
+    handlers never wait on a health check
+    """
+
+    def __init__(self, urls: List[str] = COMFYUI_URLS, probe_interval: float = COMFYUI_PROBE_INTERVAL):
+        self.probe_interval = probe_interval
+        self.nodes: List[ComfyUINode] = []
+        for url in urls or [COMFYUI_BASE_URL]:
+            if url == comfyui_service.base_url and not self.nodes:
+                self.nodes.append(ComfyUINode(comfyui_service, progress_listener))
+            else:
+                service = AsyncComfyUIService(url)
+                self.nodes.append(ComfyUINode(service, ComfyUIProgressListener(job_tracker, service)))
+        self._pins: "OrderedDict[str, ComfyUINode]" = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Probe every instance once, then keep event streams and probes running"""
+        await self.probe_all()
+        for node in self.nodes:
+            node.listener.start()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._probe_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for node in self.nodes:
+            await node.listener.stop()
+            await node.service.close()
+
+    async def probe(self, node: ComfyUINode) -> bool:
+        """Refresh one instance's health and queue depth from /queue"""
+        queue = await node.service.get_queue()
+        node.healthy = queue is not None
+        if queue is not None:
+            node.queue_depth = len(queue.get("queue_running", [])) + len(queue.get("queue_pending", []))
+        return node.healthy
+
+    async def probe_all(self):
+        await asyncio.gather(*(self.probe(node) for node in self.nodes))
+
+    async def _probe_loop(self):
+        while True:
+            await asyncio.sleep(self.probe_interval)
+            try:
+                await self.probe_all()
+            except Exception as e:
+                log_event(logger, "comfyui_probe_failed", level=logging.ERROR, error=str(e))
+
+    def is_available(self) -> bool:
+        """True when at least one instance answered its last probe"""
+        return any(node.healthy for node in self.nodes)
+
+    def healthy_nodes(self) -> List[ComfyUINode]:
+        return [node for node in self.nodes if node.healthy]
+
+    def free_nodes(self, depth: int) -> List[ComfyUINode]:
+        """Healthy instances with room for another prompt, least loaded first"""
+        return sorted(
+            (node for node in self.healthy_nodes() if len(node.in_flight) < depth),
+            key=lambda node: node.load
+        )
+
+    def loaded_keys(self) -> Set[Tuple]:
+        """Model keys currently loaded on some healthy instance"""
+        return {node.current_key for node in self.healthy_nodes() if node.current_key is not None}
+
+    def any_service(self) -> AsyncComfyUIService:
+        """Client for instance-independent queries (e.g. the model list)"""
+        healthy = self.healthy_nodes()
+        return (healthy[0] if healthy else self.nodes[0]).service
+
+    def pin(self, request_id: str, node: ComfyUINode):
+        """Record which instance a job was dispatched to"""
+        self._pins[request_id] = node
+        self._pins.move_to_end(request_id)
+        while len(self._pins) > MAX_PINNED_JOBS:
+            self._pins.popitem(last=False)
+
+    def node_for_job(self, request_id: str) -> Optional[ComfyUINode]:
+        return self._pins.get(request_id)
+
+    def listener_for_job(self, request_id: str) -> Optional[ComfyUIProgressListener]:
+        node = self._pins.get(request_id)
+        return node.listener if node is not None else None
+
+    def service_for_job(self, request_id: str, instance: Optional[str] = None) -> AsyncComfyUIService:
+        """Pinned instance, else the one named in the job record (another worker's job)"""
+        node = self._pins.get(request_id)
+        if node is None and instance is not None:
+            node = next((node for node in self.nodes if node.name == instance), None)
+        return node.service if node is not None else self.any_service()
+
+    def services_for_output(self, instance: Optional[str] = None) -> List[AsyncComfyUIService]:
+        """
+        Instances to try when downloading an output: the one that wrote it,
+        else (outputs recorded without an instance id) every healthy one
+        """
+        if instance is not None:
+            return [node.service for node in self.nodes if node.service.instance_id == instance]
+        return [node.service for node in (self.healthy_nodes() or self.nodes)]
+
+    async def wait_for_job(self, request_id: str) -> Dict:
+        """wait_for_job against whichever instance the job is pinned to"""
+        return await wait_for_job(request_id, locate=self.listener_for_job)
+
+    def snapshot(self) -> List[Dict]:
+        return [node.describe() for node in self.nodes]
+
+
+comfyui_pool = ComfyUIPool()
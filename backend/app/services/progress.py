@@ -0,0 +1,352 @@
+"""
+ComfyUI Progress Tracking Service
+Holds one long-lived connection to ComfyUI's /ws event stream and keeps an
+in-process job state table so status requests never hit /history
+Traceability: FUN-GEN-REQUEST-011 to FUN-GEN-REQUEST-014, STK-INTEGRATION-016
+"""
+import asyncio
+import json
+import logging
+import os
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Set
+
+import websockets
+
+from app.services.comfyui import AsyncComfyUIService, comfyui_service
+from app.services.structured_log import get_logger, log_event
+
+logger = get_logger("progress")
+
+
+# Reconnect backoff bounds (seconds)
+RECONNECT_MIN_DELAY = 0.5
+RECONNECT_MAX_DELAY = 10.0
+
+# Keep at most this many finished jobs in the state table
+MAX_FINISHED_JOBS = 1000
+
+# Per-subscriber event buffer (oldest progress events are dropped first)
+SUBSCRIBER_QUEUE_SIZE = 100
+
+TERMINAL_STATUSES = {"completed", "failed", "cancelled"}
+
+# Fail a waited-on job once the instance running it has been unreachable this long (seconds)
+JOB_LOST_TIMEOUT = float(os.environ.get("JOB_LOST_TIMEOUT", "120"))
+
+
+class JobTracker:
+    """
+    In-process job state table fed by ComfyUI websocket events
+    States: queued -> processing (node / step progress) -> completed | failed | cancelled
+    """
+
+    def __init__(self, max_finished: int = MAX_FINISHED_JOBS):
+        self.max_finished = max_finished
+        self.jobs: "OrderedDict[str, Dict]" = OrderedDict()
+        self.queue_remaining: Optional[int] = None
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+    def track(self, prompt_id: str) -> Dict:
+        """Register a freshly submitted job (events may already have arrived)"""
+        return self._ensure(prompt_id)
+
+    def fail(self, prompt_id: str, error: str):
+        """Mark a job failed before ComfyUI ever saw it (e.g. submission error)"""
+        self._update(prompt_id, status="failed", error=error)
+
+    def cancel(self, prompt_id: str, error: str = "Generation cancelled"):
+        """Mark a job cancelled that ComfyUI will send no further events for"""
+        self._update(prompt_id, status="cancelled", error=error)
+
+    def complete(self, prompt_id: str, images: List[Dict]):
+        """Mark a job completed with known outputs (e.g. a result cache hit)"""
+        job = self._ensure(prompt_id)
+        job["images"] = list(images)
+        self._complete(prompt_id)
+
+    def get(self, prompt_id: str) -> Optional[Dict]:
+        return self.jobs.get(prompt_id)
+
+    def pending_ids(self) -> List[str]:
+        """Jobs not yet in a terminal state"""
+        return [
+            prompt_id for prompt_id, job in self.jobs.items()
+            if job["status"] not in TERMINAL_STATUSES
+        ]
+
+    def subscribe(self, prompt_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.setdefault(prompt_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, prompt_id: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(prompt_id)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[prompt_id]
+
+    def handle_event(self, message: Dict, instance: Optional[str] = None):
+        """
+        Apply a single ComfyUI websocket message to the state table
+        Output images are tagged with the id of the `instance` that sent it
+        """
+        event_type = message.get("type")
+        data = message.get("data") or {}
+
+        if event_type == "status":
+            exec_info = data.get("status", {}).get("exec_info", {})
+            self.queue_remaining = exec_info.get("queue_remaining")
+            return
+
+        prompt_id = data.get("prompt_id")
+        if not prompt_id:
+            return
+
+        if event_type == "execution_start":
+            self._update(prompt_id, status="processing")
+        elif event_type == "executing":
+            # node is None once the whole prompt has finished executing
+            if data.get("node") is None:
+                self._complete(prompt_id)
+            else:
+                self._update(prompt_id, status="processing", node=data["node"])
+        elif event_type == "progress":
+            self._update(
+                prompt_id,
+                status="processing",
+                node=data.get("node"),
+                step=data.get("value"),
+                max_steps=data.get("max")
+            )
+        elif event_type == "executed":
+            images = _tag_images((data.get("output") or {}).get("images") or [], instance)
+            if images:
+                job = self._ensure(prompt_id)
+                job["images"].extend(images)
+                self._publish(prompt_id)
+        elif event_type == "execution_success":
+            self._complete(prompt_id)
+        elif event_type == "execution_error":
+            self._update(
+                prompt_id,
+                status="failed",
+                error=data.get("exception_message") or "Generation failed"
+            )
+        elif event_type == "execution_interrupted":
+            self._update(prompt_id, status="cancelled", error="Generation interrupted")
+
+    def apply_history(self, prompt_id: str, history_entry: Dict, instance: Optional[str] = None):
+        """Reconcile a job from a /history entry (used after reconnects)"""
+        status = history_entry.get("status", {})
+        images = []
+        for node_outputs in history_entry.get("outputs", {}).values():
+            images.extend(_tag_images(node_outputs.get("images") or [], instance))
+
+        if status.get("status_str") == "error":
+            self._update(prompt_id, status="failed", error="Generation failed")
+        elif status.get("completed"):
+            job = self._ensure(prompt_id)
+            job["images"] = images
+            self._complete(prompt_id)
+
+    def _ensure(self, prompt_id: str) -> Dict:
+        job = self.jobs.get(prompt_id)
+        if job is None:
+            job = {
+                "status": "queued",
+                "node": None,
+                "step": None,
+                "max_steps": None,
+                "images": [],
+                "error": None
+            }
+            self.jobs[prompt_id] = job
+            self._evict()
+        return job
+
+    def _update(self, prompt_id: str, **fields):
+        job = self._ensure(prompt_id)
+        if job["status"] in TERMINAL_STATUSES:
+            return
+        job.update(fields)
+        self._publish(prompt_id)
+
+    def _complete(self, prompt_id: str):
+        job = self._ensure(prompt_id)
+        if job["status"] in TERMINAL_STATUSES:
+            return
+        job["status"] = "completed"
+        job["node"] = None
+        self._publish(prompt_id)
+
+    def _publish(self, prompt_id: str):
+        snapshot = dict(self.jobs[prompt_id])
+        snapshot["images"] = list(snapshot["images"])
+        for queue in self._subscribers.get(prompt_id, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(snapshot)
+
+    def _evict(self):
+        """Drop the oldest finished jobs once the table is over its bound"""
+        finished = len(self.jobs) - len(self.pending_ids())
+        if finished <= self.max_finished:
+            return
+        for prompt_id in list(self.jobs):
+            if finished <= self.max_finished:
+                break
+            if self.jobs[prompt_id]["status"] in TERMINAL_STATUSES and prompt_id not in self._subscribers:
+                del self.jobs[prompt_id]
+                finished -= 1
+
+
+def _tag_images(images: List[Dict], instance: Optional[str]) -> List[Dict]:
+    """Output image entries with the id of the instance holding the files"""
+    if instance is None:
+        return list(images)
+    return [{**image, "instance": instance} for image in images]
+
+
+class ComfyUIProgressListener:
+    """Background task consuming ComfyUI's /ws stream with automatic reconnect"""
+
+    def __init__(self, tracker: JobTracker, service: AsyncComfyUIService = comfyui_service):
+        self.tracker = tracker
+        self.service = service
+        self.ws_url = service.base_url.replace("http", "ws", 1) + "/ws"
+        # Prompts must be submitted with this client_id to receive their events
+        self.client_id = str(uuid.uuid4())
+        self.connected = False
+        # Successful connects so far: a change means the stream was re-established
+        self.connects = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        delay = RECONNECT_MIN_DELAY
+        while True:
+            try:
+                async with websockets.connect(
+                    f"{self.ws_url}?clientId={self.client_id}",
+                    max_size=None
+                ) as ws:
+                    self.connected = True
+                    self.connects += 1
+                    delay = RECONNECT_MIN_DELAY
+                    # Catch up on jobs that finished while we were disconnected
+                    await self._reconcile()
+                    async for message in ws:
+                        # Binary frames are latent previews - not needed here
+                        if isinstance(message, bytes):
+                            continue
+                        try:
+                            self.tracker.handle_event(json.loads(message), self.service.instance_id)
+                        except (ValueError, AttributeError) as e:
+                            log_event(logger, "comfyui_event_malformed", level=logging.WARNING, error=str(e))
+            except asyncio.CancelledError:
+                raise
+            except (OSError, websockets.WebSocketException) as e:
+                log_event(
+                    logger, "comfyui_event_stream_unavailable", level=logging.WARNING,
+                    instance=self.service.base_url, error=str(e)
+                )
+            finally:
+                self.connected = False
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    async def _reconcile(self):
+        for prompt_id in self.tracker.pending_ids():
+            history = await self.service.get_generation_status(prompt_id)
+            if history and prompt_id in history:
+                self.tracker.apply_history(prompt_id, history[prompt_id], self.service.instance_id)
+
+
+job_tracker = JobTracker()
+progress_listener = ComfyUIProgressListener(job_tracker)
+
+
+async def wait_for_job(
+    prompt_id: str,
+    locate: Callable[[str], Optional[ComfyUIProgressListener]] = lambda _: progress_listener,
+    poll_interval: float = 2.0,
+    lost_timeout: float = JOB_LOST_TIMEOUT
+) -> Dict:
+    """
+    Wait until a job reaches a terminal state
+    Driven by websocket events; polls /history on the server running the job
+    (as resolved by `locate`) only while that server's stream is down.
+    The job is failed if that server stays unreachable for `lost_timeout`
+    seconds, or comes back (e.g. restarted) without knowing the job
+    """
+    loop = asyncio.get_running_loop()
+    queue = job_tracker.subscribe(prompt_id)
+    unreachable_since = None
+    connects = None
+    try:
+        job = job_tracker.track(prompt_id)
+        while job["status"] not in TERMINAL_STATUSES:
+            try:
+                job = await asyncio.wait_for(queue.get(), timeout=poll_interval)
+                continue
+            except asyncio.TimeoutError:
+                pass
+            listener = locate(prompt_id)
+            if listener is not None and not listener.connected:
+                history = await listener.service.get_generation_status(prompt_id)
+                if history is not None:
+                    unreachable_since = None
+                    if prompt_id in history:
+                        job_tracker.apply_history(prompt_id, history[prompt_id], listener.service.instance_id)
+                elif unreachable_since is None:
+                    unreachable_since = loop.time()
+                elif loop.time() - unreachable_since >= lost_timeout:
+                    job_tracker.fail(
+                        prompt_id,
+                        f"ComfyUI instance {listener.service.base_url} unreachable for {lost_timeout:.0f}s"
+                    )
+            elif listener is not None:
+                unreachable_since = None
+                if connects is not None and listener.connects != connects:
+                    if not await _job_known(listener, prompt_id):
+                        job_tracker.fail(
+                            prompt_id,
+                            f"Generation lost: ComfyUI instance {listener.service.base_url} restarted"
+                        )
+            if listener is not None:
+                connects = listener.connects
+            job = job_tracker.get(prompt_id) or job_tracker.track(prompt_id)
+        return job
+    finally:
+        job_tracker.unsubscribe(prompt_id, queue)
+
+
+async def _job_known(listener: ComfyUIProgressListener, prompt_id: str) -> bool:
+    """
+    Whether the instance still has the job queued, running or in its history
+    (the queue is read first: a job that finishes in between is in the history)
+    Unanswered queries count as known, so a flaky instance fails no jobs here
+    """
+    queue = await listener.service.get_queue()
+    if queue is None:
+        return True
+    if any(item[1] == prompt_id for item in queue.get("queue_running", []) + queue.get("queue_pending", [])):
+        return True
+    history = await listener.service.get_generation_status(prompt_id)
+    return history is None or prompt_id in history
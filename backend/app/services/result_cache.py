@@ -0,0 +1,90 @@
+"""
+Result Cache Service
+Deduplicates deterministic generations: identical workflow graphs share one
+in-flight ComfyUI prompt, and finished ones are answered from cached outputs
+Traceability: FUN-GEN-REQUEST-008, FUN-GEN-REQUEST-014, STK-INTEGRATION-015
+"""
+import asyncio
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set
+
+from app.services.metrics import cache_requests_total
+from app.services.pool import comfyui_pool
+
+# Finished workflows remembered (least recently used are dropped first)
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", "2000"))
+
+
+def workflow_hash(workflow: Dict) -> str:
+    """SHA-256 of the canonical JSON form of a workflow graph"""
+    canonical = json.dumps(workflow, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ResultCache:
+    """Workflow hash -> in-flight request id, and -> output images once completed"""
+
+    def __init__(self, max_entries: int = RESULT_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._results: "OrderedDict[str, List[Dict]]" = OrderedDict()
+        self._inflight: Dict[str, str] = {}
+        # Requests sharing each in-flight job (see release)
+        self._holders: Dict[str, int] = {}
+        self._watchers: Set[asyncio.Task] = set()
+
+    def lookup(self, key: str) -> Optional[List[Dict]]:
+        """Output images of a completed identical workflow"""
+        images = self._results.get(key)
+        if images is not None:
+            self._results.move_to_end(key)
+            cache_requests_total.inc(cache="result", result="hit")
+        return images
+
+    def inflight(self, key: str) -> Optional[str]:
+        """Request id of an identical workflow still queued or running (the caller joins it)"""
+        request_id = self._inflight.get(key)
+        if request_id is not None:
+            self._holders[request_id] = self._holders.get(request_id, 1) + 1
+            cache_requests_total.inc(cache="result", result="coalesced")
+        else:
+            cache_requests_total.inc(cache="result", result="miss")
+        return request_id
+
+    def begin(self, key: str, request_id: str):
+        """Register a submitted workflow; its result is cached when it completes"""
+        self._inflight[key] = request_id
+        self._holders[request_id] = 1
+        task = asyncio.create_task(self._settle(key, request_id))
+        self._watchers.add(task)
+        task.add_done_callback(self._watchers.discard)
+
+    def release(self, request_id: str) -> bool:
+        """
+        One requester of a job gives it up; True if nobody else shares it
+        (so it may be cancelled), False while other requests still wait on it
+        """
+        holders = self._holders.get(request_id, 1) - 1
+        if holders > 0:
+            self._holders[request_id] = holders
+            return False
+        self._holders.pop(request_id, None)
+        return True
+
+    async def _settle(self, key: str, request_id: str):
+        try:
+            job = await comfyui_pool.wait_for_job(request_id)
+            if job["status"] == "completed" and job["images"]:
+                self._results[key] = list(job["images"])
+                self._results.move_to_end(key)
+                while len(self._results) > self.max_entries:
+                    self._results.popitem(last=False)
+        finally:
+            if self._inflight.get(key) == request_id:
+                del self._inflight[key]
+            self._holders.pop(request_id, None)
+
+
+result_cache = ResultCache()
@@ -0,0 +1,403 @@
+"""
+Generation Scheduler
+Holds pending generations in the backend and feeds each ComfyUI instance a
+shallow queue, routing jobs by queue depth and by the checkpoint/LoRA each
+instance has loaded so GPUs reload models as rarely as possible
+Traceability: FUN-GEN-REQUEST-008, FUN-BATCH-GEN, STK-INTEGRATION-015
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.services.pool import ComfyUINode, comfyui_pool
+from app.services.job_store import job_store
+from app.services.metrics import (
+    job_execution_seconds, job_queue_wait_seconds, jobs_total, registry
+)
+from app.services.progress import job_tracker
+from app.services.uploads import upload_store
+from app.services.structured_log import get_logger, log_event
+
+logger = get_logger("scheduler")
+
+
+# Prompts handed to each ComfyUI instance at once; the rest wait here where they can be reordered
+COMFYUI_QUEUE_DEPTH = int(os.environ.get("COMFYUI_QUEUE_DEPTH", "2"))
+
+# A job waiting longer than this is dispatched next regardless of model affinity
+MAX_AFFINITY_WAIT = float(os.environ.get("MAX_AFFINITY_WAIT", "120"))
+
+# Initial per-job estimates (seconds) until real timings are observed
+DEFAULT_JOB_SECONDS = 10.0
+MODEL_SWAP_SECONDS = float(os.environ.get("MODEL_SWAP_SECONDS", "15"))
+
+# Weight of the newest sample in the moving average of job duration
+DURATION_SMOOTHING = 0.2
+
+# Projected waits are reused until the queue changes or this many seconds pass
+# (aging past MAX_AFFINITY_WAIT and instance health shift them on their own)
+WAIT_PROJECTION_TTL = 1.0
+
+# Dispatch classes, most urgent first: single images overtake batch and sequence work
+PRIORITIES = ("interactive", "bulk")
+
+
+def model_key(workflow: Dict) -> Tuple[Optional[str], Optional[str]]:
+    """(checkpoint, LoRA) a workflow loads; jobs with the same key share a loaded model"""
+    checkpoint = None
+    lora = None
+    for node in workflow.values():
+        if node.get("class_type") == "CheckpointLoaderSimple":
+            checkpoint = node["inputs"].get("ckpt_name")
+        elif node.get("class_type") == "LoraLoader":
+            lora = node["inputs"].get("lora_name")
+    return checkpoint, lora
+
+
+class GenerationScheduler:
+    """
+    Model-affinity scheduler: while the oldest pending job is younger than
+    MAX_AFFINITY_WAIT, a free instance takes jobs of the most urgent priority
+    waiting, preferring the model it has loaded and otherwise models no other
+    instance has loaded; past that, dispatch is FIFO (so bulk work never starves)
+    """
+
+    def __init__(self, depth: int = COMFYUI_QUEUE_DEPTH, max_wait: float = MAX_AFFINITY_WAIT):
+        self.depth = depth
+        self.max_wait = max_wait
+        self.pending: List[Dict] = []
+        self.in_flight: Dict[str, Dict] = {}
+        self.current_key: Optional[Tuple] = None
+        self.job_seconds = DEFAULT_JOB_SECONDS
+        # Per instance, so completions elsewhere don't shorten the samples
+        self._last_completion: Dict[str, float] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._watchers: Dict[str, asyncio.Task] = {}
+        # Job between the pending list and in_flight while it is submitted
+        self._dispatching: Optional[Dict] = None
+        # Called with (job, result) whenever a dispatched job completes
+        self.listeners: List[Callable[[Dict, Dict], None]] = []
+        # estimated_waits() result and when it was computed; None once stale
+        self._waits: Optional[Dict[str, float]] = None
+        self._waits_at = 0.0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        tasks = [task for task in [self._task, *self._watchers.values()] if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._watchers.clear()
+
+    def enqueue(
+        self,
+        workflow: Dict,
+        preset: str = "txt2img_basic",
+        priority: str = "interactive",
+        client: Optional[str] = None,
+        group: Optional[str] = None
+    ) -> str:
+        """
+        Hold a workflow for dispatch; returns the request id (used as ComfyUI prompt_id)
+        `client` is set for jobs admission control counts one by one;
+        `group` is the batch a job belongs to (see cancel_group)
+        """
+        request_id = str(uuid.uuid4())
+        self.pending.append({
+            "request_id": request_id,
+            "workflow": workflow,
+            "preset": preset,
+            "key": model_key(workflow),
+            "priority": PRIORITIES.index(priority),
+            "client": client,
+            "group": group,
+            "enqueued_at": time.monotonic()
+        })
+        self._waits = None
+        job_tracker.track(request_id)
+        self.start()
+        self._wakeup.set()
+        return request_id
+
+    async def cancel(self, request_id: str) -> Optional[str]:
+        """
+        Stop a job wherever it is: "pending" if it was still held here,
+        "queued" if it was removed from its instance's queue, "interrupted"
+        if it was the prompt running there; None if it is not ours to cancel
+        (unknown, finished, or on another worker)
+        """
+        job = next((job for job in self.pending if job["request_id"] == request_id), None)
+        if job is not None:
+            self.pending.remove(job)
+            self._waits = None
+            job_tracker.cancel(request_id)
+            jobs_total.inc(status="cancelled")
+            await job_store.update_async(request_id, status="cancelled", error="Generation cancelled")
+            return "pending"
+        if self._dispatching is not None and self._dispatching["request_id"] == request_id:
+            # Being submitted right now: cancelled as soon as that settles
+            self._dispatching["cancel"] = True
+            return "pending"
+
+        job = self.in_flight.get(request_id)
+        if job is None:
+            return None
+        service = job["node"].service
+        # Delete first: a prompt that starts meanwhile is then seen running below
+        if not await service.delete_queued([request_id]):
+            return None
+        queue = await service.get_queue()
+        if queue is None:
+            return None
+        if any(item[1] == request_id for item in queue.get("queue_running", [])):
+            # ComfyUI reports execution_interrupted; the watcher settles the job
+            return "interrupted" if await service.interrupt(request_id) else None
+        # Deleted prompts produce no events; the watcher sees this instead
+        job_tracker.cancel(request_id)
+        return "queued" if job_tracker.get(request_id)["status"] == "cancelled" else None
+
+    async def cancel_group(self, group: str) -> int:
+        """Cancel every job of a batch; returns how many were stopped"""
+        jobs = [*self.pending, *self.in_flight.values()]
+        if self._dispatching is not None:
+            jobs.append(self._dispatching)
+        request_ids = [job["request_id"] for job in jobs if job["group"] == group]
+        stages = await asyncio.gather(*(self.cancel(request_id) for request_id in request_ids))
+        return sum(stage is not None for stage in stages)
+
+    def estimated_waits(self) -> Dict[str, float]:
+        """
+        Seconds until each pending job should start: jobs ahead of it in
+        projected dispatch order plus a load penalty per checkpoint swap,
+        shared across the healthy instances
+        The projection is cached (treat it as read-only) until the queue
+        changes or WAIT_PROJECTION_TTL passes
+        """
+        now = time.monotonic()
+        if self._waits is None or now - self._waits_at >= WAIT_PROJECTION_TTL:
+            self._waits = self._project_waits()
+            self._waits_at = now
+        return self._waits
+
+    def estimated_wait(self, request_id: str) -> Optional[float]:
+        """Seconds until one pending job should start; None once it left the queue"""
+        return self.estimated_waits().get(request_id)
+
+    def _project_waits(self) -> Dict[str, float]:
+        order = self._projected_order()
+        waits = {}
+        instances = max(len(comfyui_pool.healthy_nodes()), 1)
+        elapsed = len(self.in_flight) * self.job_seconds
+        key = self.current_key
+        for job in order:
+            if job["key"] != key:
+                elapsed += MODEL_SWAP_SECONDS
+                key = job["key"]
+            waits[job["request_id"]] = round(elapsed / instances, 1)
+            elapsed += self.job_seconds
+        return waits
+
+    def snapshot(self) -> Dict:
+        """Queue overview for the API"""
+        waits = self.estimated_waits()
+        return {
+            "in_flight": list(self.in_flight),
+            "pending": [
+                {
+                    "request_id": job["request_id"],
+                    "model": job["key"][0],
+                    "lora": job["key"][1],
+                    "priority": PRIORITIES[job["priority"]],
+                    "position": position + 1,
+                    "estimated_wait": waits[job["request_id"]]
+                }
+                for position, job in enumerate(self._projected_order())
+            ],
+            "average_job_seconds": round(self.job_seconds, 1),
+            "instances": comfyui_pool.snapshot()
+        }
+
+    def _projected_order(self) -> List[Dict]:
+        """Dispatch order if nothing new arrived"""
+        remaining = list(self.pending)
+        key = self.current_key
+        now = time.monotonic()
+        order = []
+        while remaining:
+            job = self._pick(remaining, key, now)
+            remaining.remove(job)
+            order.append(job)
+            key = job["key"]
+        return order
+
+    def _pick(self, candidates: List[Dict], key: Optional[Tuple], now: float) -> Dict:
+        oldest = candidates[0]
+        if now - oldest["enqueued_at"] >= self.max_wait:
+            return oldest
+        urgent = _most_urgent(candidates)
+        for job in urgent:
+            if job["key"] == key:
+                return job
+        return urgent[0]
+
+    def _route(self, nodes: List[ComfyUINode], now: float) -> Tuple[ComfyUINode, Dict]:
+        """Choose the next (instance, job) pair among free instances"""
+        oldest = self.pending[0]
+        if now - oldest["enqueued_at"] >= self.max_wait:
+            node = next((node for node in nodes if node.current_key == oldest["key"]), nodes[0])
+            return node, oldest
+        urgent = _most_urgent(self.pending)
+        for node in nodes:
+            for job in urgent:
+                if job["key"] == node.current_key:
+                    return node, job
+        # No free instance has a waiting model loaded: prefer a model that
+        # is not loaded elsewhere, leaving those jobs to their instance
+        loaded = comfyui_pool.loaded_keys()
+        for job in urgent:
+            if job["key"] not in loaded:
+                return nodes[0], job
+        return nodes[0], urgent[0]
+
+    async def _run(self):
+        while True:
+            try:
+                # Also re-check periodically: instances may have become healthy
+                await asyncio.wait_for(self._wakeup.wait(), timeout=comfyui_pool.probe_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self.pending:
+                nodes = comfyui_pool.free_nodes(self.depth)
+                if not nodes:
+                    break
+                node, job = self._route(nodes, time.monotonic())
+                self.pending.remove(job)
+                self._waits = None
+                self._dispatching = job
+                try:
+                    await self._dispatch(node, job)
+                except Exception as e:
+                    # Never let one job stop the loop; a job not yet in flight fails
+                    log_event(
+                        logger, "dispatch_failed", level=logging.ERROR,
+                        request_id=job["request_id"], error=str(e)
+                    )
+                    if job["request_id"] not in self.in_flight:
+                        await self._fail(job["request_id"], f"Failed to submit generation request: {e}")
+                finally:
+                    self._dispatching = None
+                if job.get("cancel"):
+                    await self.cancel(job["request_id"])
+
+    async def _dispatch(self, node: ComfyUINode, job: Dict):
+        request_id = job["request_id"]
+        result = None
+        try:
+            # img2img/upscale sources go to the chosen instance's input folder first
+            if await upload_store.push_inputs(node, job["workflow"]):
+                result = await node.service.submit_generation(
+                    job["workflow"],
+                    client_id=node.listener.client_id,
+                    prompt_id=request_id
+                )
+        except FileNotFoundError as e:
+            await self._fail(request_id, str(e))
+            return
+        if not result or result.get("prompt_id") != request_id:
+            if not await comfyui_pool.probe(node):
+                # Instance went away: hold the job for another one
+                self.pending.insert(0, job)
+                self._waits = None
+                return
+            await self._fail(request_id, "Failed to submit generation request to ComfyUI")
+            return
+
+        comfyui_pool.pin(request_id, node)
+        # Lets other workers poll the right instance for this job
+        await job_store.update_async(request_id, instance=node.name)
+        node.current_key = job["key"]
+        node.in_flight.add(request_id)
+        self.current_key = job["key"]
+        job["submitted_at"] = time.monotonic()
+        job_queue_wait_seconds.observe(job["submitted_at"] - job["enqueued_at"])
+        job["node"] = node
+        self.in_flight[request_id] = job
+        self._waits = None
+        self._watchers[request_id] = asyncio.create_task(self._watch(job))
+
+    async def _fail(self, request_id: str, error: str):
+        job_tracker.fail(request_id, error)
+        jobs_total.inc(status="failed")
+        await job_store.update_async(request_id, status="failed", error=error)
+
+    async def _watch(self, job: Dict):
+        request_id = job["request_id"]
+        node = job["node"]
+        try:
+            result = await comfyui_pool.wait_for_job(request_id)
+            jobs_total.inc(status=result["status"])
+            await job_store.update_async(
+                request_id,
+                status=result["status"],
+                images=result["images"],
+                error=result["error"]
+            )
+            if result["status"] == "completed":
+                for listener in self.listeners:
+                    try:
+                        listener(job, result)
+                    except Exception as e:
+                        log_event(logger, "completion_listener_failed", level=logging.ERROR, error=str(e))
+                # Time since the previous completion approximates execution time,
+                # excluding the wait behind other in-flight prompts
+                now = time.monotonic()
+                duration = now - max(job["submitted_at"], self._last_completion.get(node.name, 0.0))
+                self._last_completion[node.name] = now
+                self.job_seconds += DURATION_SMOOTHING * (duration - self.job_seconds)
+                job_execution_seconds.observe(duration)
+        finally:
+            node.in_flight.discard(request_id)
+            self.in_flight.pop(request_id, None)
+            self._watchers.pop(request_id, None)
+            self._waits = None
+            self._wakeup.set()
+
+
+def _most_urgent(jobs: List[Dict]) -> List[Dict]:
+    """Jobs of the most urgent priority present, in arrival order"""
+    rank = min(job["priority"] for job in jobs)
+    return [job for job in jobs if job["priority"] == rank]
+
+
+generation_scheduler = GenerationScheduler()
+
+registry.gauge(
+    "generation_jobs",
+    "Jobs held by the backend scheduler (pending) or submitted to ComfyUI (in_flight)",
+    lambda: {
+        ("pending",): len(generation_scheduler.pending),
+        ("in_flight",): len(generation_scheduler.in_flight)
+    },
+    ("state",)
+)
+registry.gauge(
+    "comfyui_instance_healthy",
+    "1 if the instance answered its last probe",
+    lambda: {(node.name,): int(node.healthy) for node in comfyui_pool.nodes},
+    ("instance",)
+)
+registry.gauge(
+    "comfyui_instance_queue_depth",
+    "Prompts running or pending on the instance at its last probe",
+    lambda: {(node.name,): node.queue_depth for node in comfyui_pool.nodes},
+    ("instance",)
+)
@@ -0,0 +1,333 @@
+"""
+Sequence Rendering Engine
+Renders a story's frame prompts as one pipelined job group: frames share
+model, size and seed strategy, are queued a few ahead in frame order so the
+GPU never waits on downloads, and are announced as each one is ready.
+Completed frames are kept in the sequence record, so resuming re-renders
+only the rest.
+Traceability: FUN-SEQUENCE-GEN, STK-INTEGRATION-015
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import Dict, List, Optional, Set
+
+from app.services.job_store import job_store, generation_record
+from app.services.output_cache import output_cache, output_url
+from app.services.pool import comfyui_pool
+from app.services.result_cache import result_cache, workflow_hash
+from app.services.scheduler import generation_scheduler
+from app.services.workflows import workflow_registry
+from app.services.structured_log import get_logger, log_event
+
+logger = get_logger("sequence")
+
+
+# Frames each sequence keeps queued ahead of the one rendering
+SEQUENCE_PIPELINE_DEPTH = 3
+
+MAX_SEQUENCE_FRAMES = 500
+
+SEED_MODES = ("incremental", "fixed", "random")
+
+# Request fields shared by every frame of a sequence
+SHARED_FIELDS = (
+    "model", "lora", "lora_strength", "negative_prompt", "steps", "cfg", "width", "height"
+)
+
+# Frame statuses that still need rendering on resume
+UNFINISHED_FRAME_STATUSES = ("pending", "queued", "failed", "cancelled")
+
+
+def plan_sequence(request_data: Dict) -> Dict:
+    """
+    Sequence record for a render request: shared parameters plus one entry
+    per frame with its final prompt and seed (fixed now, so resumes match)
+    Raises ValueError for invalid requests
+    """
+    frames = request_data.get("frames") or []
+    if not isinstance(frames, list):
+        raise ValueError("frames must be a list of frame prompts")
+    if not frames:
+        raise ValueError("frames must list at least one frame prompt")
+    if len(frames) > MAX_SEQUENCE_FRAMES:
+        raise ValueError(f"At most {MAX_SEQUENCE_FRAMES} frames per sequence")
+    if not request_data.get("model"):
+        raise ValueError("Missing required field: model")
+
+    seed_mode = request_data.get("seed_mode", "incremental")
+    if seed_mode not in SEED_MODES:
+        raise ValueError(f"Invalid seed_mode: {seed_mode}. Use one of: {', '.join(SEED_MODES)}")
+    base_seed = request_data.get("seed")
+    if base_seed is not None and not _is_int(base_seed):
+        raise ValueError(f"seed must be an integer, got {base_seed!r}")
+    if base_seed is None or base_seed == -1:
+        base_seed = random.randint(0, 2**32 - 1)
+
+    prefix = request_data.get("prefix") or ""
+    suffix = request_data.get("suffix") or ""
+    planned = []
+    for index, frame in enumerate(frames):
+        prompt = frame.get("prompt") if isinstance(frame, dict) else frame
+        if not prompt:
+            raise ValueError(f"Frame {index + 1} has no prompt")
+        if not isinstance(prompt, str):
+            raise ValueError(f"Frame {index + 1} prompt must be a string")
+        frame_number = frame.get("frame_number", index + 1) if isinstance(frame, dict) else index + 1
+        if not _is_int(frame_number):
+            raise ValueError(f"Frame {index + 1} frame_number must be an integer, got {frame_number!r}")
+        if seed_mode == "incremental":
+            seed = (base_seed + index) % 2**32
+        elif seed_mode == "fixed":
+            seed = base_seed
+        else:
+            seed = random.randint(0, 2**32 - 1)
+        planned.append({
+            "frame_number": frame_number,
+            "prompt": ", ".join(part for part in (prefix, prompt, suffix) if part),
+            "negative_prompt": frame.get("negative_prompt") if isinstance(frame, dict) else None,
+            "seed": seed,
+            "status": "pending",
+            "request_id": None,
+            "image_url": None,
+            "error": None
+        })
+
+    numbers = [frame["frame_number"] for frame in planned]
+    if len(set(numbers)) != len(numbers):
+        raise ValueError("frame_number values must be unique")
+
+    return {
+        "type": "sequence",
+        "status": "queued",
+        "preset": "txt2img_lora" if request_data.get("lora") else "txt2img_basic",
+        "params": {
+            field: request_data[field] for field in SHARED_FIELDS if request_data.get(field) is not None
+        },
+        "seed_mode": seed_mode,
+        "total_frames": len(planned),
+        "completed_frames": 0,
+        "frames": sorted(planned, key=lambda frame: frame["frame_number"]),
+        "created_at": time.time()
+    }
+
+
+def _is_int(value) -> bool:
+    # bool is an int subclass, but true/false is not a seed or frame number
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def frame_workflow(record: Dict, frame: Dict) -> Dict:
+    """Workflow rendering one frame of a planned sequence"""
+    params = {**record["params"], "prompt": frame["prompt"], "seed": frame["seed"]}
+    if frame.get("negative_prompt"):
+        params["negative_prompt"] = frame["negative_prompt"]
+    return workflow_registry.build(record["preset"], params)
+
+
+def frame_event(frame: Dict) -> Dict:
+    """Public view of one frame (as streamed to clients)"""
+    return {key: frame[key] for key in ("frame_number", "status", "request_id", "seed", "image_url", "error")}
+
+
+class SequenceEngine:
+    """Runs sequences in the background and fans frame updates out to listeners"""
+
+    def __init__(self, depth: int = SEQUENCE_PIPELINE_DEPTH):
+        self.depth = depth
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+    def is_running(self, sequence_id: str) -> bool:
+        task = self._tasks.get(sequence_id)
+        return task is not None and not task.done()
+
+    def start(self, sequence_id: str, record: Dict) -> asyncio.Task:
+        """Render every frame not yet completed (a fresh run or a resume)"""
+        if self.is_running(sequence_id):
+            return self._tasks[sequence_id]
+        task = asyncio.create_task(self.run(sequence_id, record))
+        self._tasks[sequence_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(sequence_id, None))
+        return task
+
+    async def cancel(self, sequence_id: str) -> bool:
+        """Stop a running sequence (its record is kept, so it can be resumed)"""
+        task = self._tasks.get(sequence_id)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return True
+
+    def watched(self, sequence_id: str) -> bool:
+        """Whether any client is following the sequence's events"""
+        return bool(self._subscribers.get(sequence_id))
+
+    def subscribe(self, sequence_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(sequence_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, sequence_id: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(sequence_id)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[sequence_id]
+
+    def _publish(self, sequence_id: str, event: str, data: Dict):
+        for queue in self._subscribers.get(sequence_id, ()):
+            queue.put_nowait((event, data))
+
+    async def run(self, sequence_id: str, record: Dict):
+        """
+        Queue frames in order with at most `depth` outstanding; a slot frees
+        when ComfyUI finishes a frame, before its download, so the next frame
+        is already queued while the finished one is fetched and announced
+        """
+        slots = asyncio.Semaphore(self.depth)
+        record["status"] = "generating"
+        await self._recover(record)
+        await job_store.put_async(sequence_id, record)
+
+        async def finish(frame: Dict, request_id: Optional[str], images: Optional[List[Dict]]):
+            try:
+                if images is None:
+                    job = await comfyui_pool.wait_for_job(request_id)
+                    images = job["images"] if job["status"] == "completed" else []
+                    frame["error"] = job["error"]
+            except Exception as e:
+                log_event(
+                    logger, "frame_render_failed", level=logging.ERROR,
+                    sequence_id=sequence_id, frame=frame["frame_number"], error=str(e)
+                )
+                images = []
+                frame["error"] = str(e)
+            finally:
+                # ComfyUI is done with this frame: let the next one queue
+                slots.release()
+
+            # Fetch into the local cache so the announced URL serves instantly
+            digest = None
+            if images:
+                try:
+                    digest = await output_cache.get(
+                        images[0]["filename"], images[0].get("instance"), images[0].get("subfolder", "")
+                    )
+                except Exception as e:
+                    log_event(
+                        logger, "frame_download_failed", level=logging.ERROR,
+                        sequence_id=sequence_id, frame=frame["frame_number"], error=str(e)
+                    )
+            if digest is not None:
+                frame["status"] = "completed"
+                frame["image_url"] = output_url(images[0])
+                frame["error"] = None
+                record["completed_frames"] += 1
+            else:
+                frame["status"] = "failed"
+                frame["error"] = frame["error"] or "Frame produced no image"
+            await job_store.put_async(sequence_id, record)
+            self._publish(sequence_id, "frame", frame_event(frame))
+
+        tasks = []
+        try:
+            for frame in record["frames"]:
+                if frame["status"] not in UNFINISHED_FRAME_STATUSES:
+                    continue
+                await slots.acquire()
+                try:
+                    request_id, images = await self._submit(record, frame)
+                except Exception as e:
+                    slots.release()
+                    log_event(
+                        logger, "frame_submit_failed", level=logging.ERROR,
+                        sequence_id=sequence_id, frame=frame["frame_number"], error=str(e)
+                    )
+                    frame["status"] = "failed"
+                    frame["error"] = str(e)
+                    self._publish(sequence_id, "frame", frame_event(frame))
+                    continue
+                frame.update(status="queued", request_id=request_id, error=None)
+                await job_store.put_async(sequence_id, record)
+                self._publish(sequence_id, "frame", frame_event(frame))
+                tasks.append(asyncio.create_task(finish(frame, request_id, images)))
+            await asyncio.gather(*tasks, return_exceptions=True)
+        except asyncio.CancelledError:
+            # Stop the frames ComfyUI still holds, unless an identical request
+            # shares the job (result cache); a resume renders them later
+            for task in tasks:
+                task.cancel()
+            queued = [frame for frame in record["frames"] if frame["status"] == "queued"]
+            await asyncio.gather(*(
+                generation_scheduler.cancel(frame["request_id"])
+                for frame in queued
+                if frame["request_id"] and result_cache.release(frame["request_id"])
+            ))
+            for frame in record["frames"]:
+                if frame["status"] in ("pending", "queued"):
+                    frame["status"] = "cancelled"
+            record["status"] = "cancelled"
+            await job_store.put_async(sequence_id, record)
+            self._publish(sequence_id, "cancelled", sequence_summary(sequence_id, record))
+            raise
+
+        record["status"] = "complete" if record["completed_frames"] == record["total_frames"] else "failed"
+        await job_store.put_async(sequence_id, record)
+        self._publish(sequence_id, record["status"], sequence_summary(sequence_id, record))
+
+    async def _submit(self, record: Dict, frame: Dict):
+        """
+        Queue one frame; returns (request_id, images) where images is set
+        when an identical frame was rendered before (result cache)
+        """
+        workflow = frame_workflow(record, frame)
+        key = workflow_hash(workflow)
+        images = result_cache.lookup(key)
+        if images is not None:
+            return None, images
+        request_id = result_cache.inflight(key)
+        if request_id is not None:
+            return request_id, None
+
+        request_id = generation_scheduler.enqueue(workflow, preset=record["preset"], priority="bulk")
+        result_cache.begin(key, request_id)
+        await job_store.put_async(
+            request_id,
+            {**generation_record(record["preset"], "queued"), "sequence": True}
+        )
+        return request_id, None
+
+    @staticmethod
+    async def _recover(record: Dict):
+        """
+        On resume, adopt frames whose generation finished after the previous
+        run stopped watching (e.g. a restart with the SQLite job store)
+        """
+        for frame in record["frames"]:
+            if frame["status"] != "queued" or not frame["request_id"]:
+                continue
+            job = await job_store.get_async(frame["request_id"])
+            if job and job.get("status") == "completed" and job.get("images"):
+                frame["status"] = "completed"
+                frame["image_url"] = output_url(job["images"][0])
+                record["completed_frames"] += 1
+
+
+def sequence_summary(sequence_id: str, record: Dict, running: bool = True) -> Dict:
+    """Counts and failed frames; a stale unfinished record reads "interrupted" (resume it)"""
+    status = record["status"]
+    if not running and status not in ("complete", "failed", "cancelled"):
+        status = "interrupted"
+    return {
+        "sequence_id": sequence_id,
+        "status": status,
+        "total_frames": record["total_frames"],
+        "completed_frames": record["completed_frames"],
+        "failed_frames": [frame["frame_number"] for frame in record["frames"] if frame["status"] == "failed"]
+    }
+
+
+sequence_engine = SequenceEngine()
@@ -0,0 +1,74 @@
+"""
+Structured Logging
+One JSON object per log line, with optional sampling for high-volume events
+Traceability: STK-BACKEND-030
+"""
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+
+# "json" (default) or "text" for local development
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")
+
+# Fraction of high-volume events (status polls, request timings) that are logged
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", "0.01"))
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+                  + f".{int(record.msecs):03d}Z",
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+            **getattr(record, "fields", {})
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        fields = " ".join(f"{key}={value}" for key, value in getattr(record, "fields", {}).items())
+        return f"{record.levelname} {record.name} {record.getMessage()} {fields}".rstrip()
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT):
+    """Route the app's loggers to stdout in the chosen format (called once at startup)"""
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    logger = logging.getLogger("app")
+    logger.handlers[:] = [handler]
+    logger.setLevel(level)
+    logger.propagate = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"app.{name}")
+
+
+def log_event(
+    logger: logging.Logger,
+    event: str,
+    level: int = logging.INFO,
+    sample_rate: float = 1.0,
+    **fields
+):
+    """
+    Log an event with structured fields; with sample_rate < 1 only that
+    fraction is emitted (the rate is recorded so counts can be scaled back)
+    """
+    if not logger.isEnabledFor(level):
+        return
+    if sample_rate < 1.0:
+        if random.random() >= sample_rate:
+            return
+        fields["sample_rate"] = sample_rate
+    logger.log(level, event, extra={"fields": fields})
@@ -0,0 +1,163 @@
+"""
+Thumbnail Service
+Renders gallery thumbnails with Pillow in a process pool and caches them on disk
+Traceability: FUN-GALLERY-VIEW-003, STK-BACKEND-016, STK-BACKEND-017
+"""
+import asyncio
+import glob
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional
+
+from PIL import Image
+
+from app.services.gallery_index import GALLERY_PATH
+from app.services.metrics import cache_requests_total
+from app.services.structured_log import get_logger, log_event
+
+logger = get_logger("thumbnails")
+
+
+# Under the gallery root, one folder per run folder; refreshes skip dot folders,
+# so writing tiles never makes a run folder look changed
+THUMBNAIL_DIR = ".thumbnails"
+
+# STK-BACKEND-016: 300px max dimension by default
+DEFAULT_THUMBNAIL_SIZE = 300
+THUMBNAIL_SIZES = (150, 300, 600)
+
+THUMBNAIL_FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg")
+}
+DEFAULT_THUMBNAIL_FORMAT = "webp"
+
+THUMBNAIL_WORKERS = int(os.environ.get("THUMBNAIL_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+
+def _render_thumbnail(source: str, destination: str, size: int, pil_format: str):
+    """Process-pool worker: write one thumbnail atomically"""
+    with Image.open(source) as image:
+        image.thumbnail((size, size))
+        if pil_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        temp_path = f"{destination}.{os.getpid()}.tmp"
+        image.save(temp_path, pil_format, quality=80)
+    os.replace(temp_path, destination)
+
+
+class ThumbnailService:
+    """
+    STK-BACKEND-017: Thumbnails live in the gallery's .thumbnails/{run folder}/,
+    keyed by stem, size and source mtime so edits never serve a stale tile
+    """
+
+    def __init__(self, gallery_path: Path = GALLERY_PATH, workers: int = THUMBNAIL_WORKERS):
+        self.gallery_path = gallery_path
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def thumbnail_dir(self, image_file: Path) -> Path:
+        return self.gallery_path / THUMBNAIL_DIR / image_file.parent.name
+
+    def cache_path(self, image_file: Path, size: int, fmt: str) -> Path:
+        mtime_ns = image_file.stat().st_mtime_ns
+        return self.thumbnail_dir(image_file) / f"{image_file.stem}_{size}_{mtime_ns}.{fmt}"
+
+    def etag(self, image_file: Path, size: int, fmt: str) -> str:
+        """Strong validator derived from source path, mtime, size and format"""
+        stat = image_file.stat()
+        key = f"{image_file}:{stat.st_mtime_ns}:{stat.st_size}:{size}:{fmt}"
+        return '"' + hashlib.sha1(key.encode()).hexdigest() + '"'
+
+    async def get(self, image_file: Path, size: int = DEFAULT_THUMBNAIL_SIZE, fmt: str = DEFAULT_THUMBNAIL_FORMAT) -> Path:
+        """Cached thumbnail path, rendering it off the event loop on a miss"""
+        future = self._submit(image_file, size, fmt)
+        return await asyncio.wrap_future(future)
+
+    def prewarm(self, image_file: Path):
+        """Queue the default thumbnail for a newly ingested image (fire and forget)"""
+        try:
+            self._submit(image_file, DEFAULT_THUMBNAIL_SIZE, DEFAULT_THUMBNAIL_FORMAT)
+        except OSError as e:
+            log_event(
+                logger, "thumbnail_queue_failed", level=logging.ERROR,
+                path=str(image_file), error=str(e)
+            )
+
+    def on_gallery_change(self, event: str, image_file: Path):
+        """
+        Gallery index listener: drop tiles of deleted images
+        New images are not warmed here: a first index build or rescan would
+        queue a render for every image in the gallery
+        """
+        if event != "removed":
+            return
+        thumbnail_dir = self.thumbnail_dir(image_file)
+        if thumbnail_dir.exists():
+            for fmt in THUMBNAIL_FORMATS:
+                for size in THUMBNAIL_SIZES:
+                    _remove_stale(thumbnail_dir, image_file.stem, size, fmt)
+
+    def _submit(self, image_file: Path, size: int, fmt: str) -> Future:
+        destination = self.cache_path(image_file, size, fmt)
+        key = str(destination)
+
+        with self._lock:
+            future = self._pending.get(key)
+            if future is not None:
+                cache_requests_total.inc(cache="thumbnail", result="coalesced")
+                return future
+
+            future = Future()
+            if destination.exists():
+                cache_requests_total.inc(cache="thumbnail", result="hit")
+                future.set_result(destination)
+                return future
+            cache_requests_total.inc(cache="thumbnail", result="miss")
+
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            _remove_stale(destination.parent, image_file.stem, size, fmt)
+            render = self.pool.submit(_render_thumbnail, str(image_file), key, size, THUMBNAIL_FORMATS[fmt][0])
+            self._pending[key] = future
+
+        def done(render_future: Future):
+            with self._lock:
+                self._pending.pop(key, None)
+            error = render_future.exception()
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(destination)
+
+        render.add_done_callback(done)
+        return future
+
+
+def _remove_stale(thumbnail_dir: Path, stem: str, size: int, fmt: str):
+    """Drop thumbnails rendered from an older version of the same image"""
+    for stale in thumbnail_dir.glob(f"{glob.escape(stem)}_{size}_*.{fmt}"):
+        try:
+            stale.unlink()
+        except OSError:
+            pass
+
+
+thumbnail_service = ThumbnailService()
@@ -0,0 +1,315 @@
+"""
+Upload Service
+Receives source images for img2img/upscale as streamed multipart bodies,
+stores them content-addressed (identical uploads are kept once) and pushes
+each to a ComfyUI instance's input folder once, right before a job needs it
+Traceability: FUN-GEN-REQUEST-007, STK-INTEGRATION-015
+"""
+import asyncio
+import hashlib
+import os
+import re
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional, Set, Tuple
+
+import aiofiles
+from PIL import Image, UnidentifiedImageError
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+from app.services.metrics import cache_requests_total, registry
+
+UPLOAD_DIR = Path(os.environ.get(
+    "UPLOAD_DIR",
+    str(Path.home() / ".cache" / "image-gen-backend" / "uploads")
+))
+
+# Largest accepted source image, and the total kept before least recently used are evicted
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", str(50 * 1024**2)))
+UPLOAD_CACHE_MAX_BYTES = int(os.environ.get("UPLOAD_CACHE_MAX_BYTES", str(1024**3)))
+
+# Text form fields sent alongside the image are small
+MAX_FORM_FIELD_BYTES = 64 * 1024
+
+# Pillow format -> (file extension, content type)
+UPLOAD_FORMATS = {
+    "PNG": ("png", "image/png"),
+    "JPEG": ("jpg", "image/jpeg"),
+    "WEBP": ("webp", "image/webp")
+}
+
+# Stored name: sha256 of the content plus the detected format's extension
+UPLOAD_NAME = re.compile(r"^[0-9a-f]{64}\.(png|jpg|webp)$")
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class StoredUpload(NamedTuple):
+    image: str          # name to put in the workflow's "image" field
+    sha256: str
+    size: int
+    deduplicated: bool  # identical content had been uploaded before
+
+
+class _FormStream:
+    """python-multipart callbacks: text fields to a dict, file bytes to a pending list"""
+
+    def __init__(self, file_field: str):
+        self.file_field = file_field
+        self.fields: Dict[str, str] = {}
+        self.file_parts = 0
+        self.pending: List[bytes] = []
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._name: Optional[str] = None
+        self._is_file = False
+        self._value = bytearray()
+
+    def callbacks(self) -> Dict:
+        return {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end
+        }
+
+    def drain(self) -> List[bytes]:
+        pending, self.pending = self.pending, []
+        return pending
+
+    def _on_part_begin(self):
+        self._headers = {}
+        self._value = bytearray()
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._name = options.get(b"name", b"").decode("utf-8", "replace")
+        self._is_file = b"filename" in options and self._name == self.file_field
+        if self._is_file:
+            self.file_parts += 1
+            if self.file_parts > 1:
+                raise ValueError(f"Only one {self.file_field} file may be uploaded")
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._is_file:
+            self.pending.append(data[start:end])
+            return
+        self._value += data[start:end]
+        if len(self._value) > MAX_FORM_FIELD_BYTES:
+            raise ValueError(f"Form field {self._name} is too large")
+
+    def _on_part_end(self):
+        if not self._is_file and self._name:
+            self.fields[self._name] = self._value.decode("utf-8", "replace")
+
+
+class UploadStore:
+    """
+    Uploads are stored as {sha256}.{ext} so repeated img2img on one source
+    is received, stored and pushed to each instance once
+    """
+
+    def __init__(
+        self,
+        upload_dir: Path = UPLOAD_DIR,
+        max_bytes: int = UPLOAD_MAX_BYTES,
+        cache_max_bytes: int = UPLOAD_CACHE_MAX_BYTES
+    ):
+        self.upload_dir = upload_dir
+        self.max_bytes = max_bytes
+        self.cache_max_bytes = cache_max_bytes
+        self._files: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self._loaded = False
+        # (instance name, upload name) pairs already in that instance's input folder
+        self._pushed: Set[Tuple[str, str]] = set()
+        # Instance name -> its listener's connect count when those pushes were made
+        self._push_connects: Dict[str, int] = {}
+
+    def _load(self):
+        """Account for uploads left by a previous run, oldest first"""
+        if self._loaded:
+            return
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
+        files = sorted(
+            (path for path in self.upload_dir.iterdir() if UPLOAD_NAME.match(path.name)),
+            key=lambda path: path.stat().st_atime
+        )
+        for path in files:
+            size = path.stat().st_size
+            self._files[path.name] = size
+            self._total_bytes += size
+        self._loaded = True
+
+    def path(self, name: str) -> Optional[Path]:
+        """Local file of a stored upload (None for names that are not uploads)"""
+        self._load()
+        if name not in self._files and not self._adopt(name):
+            return None
+        return self.upload_dir / name
+
+    def _adopt(self, name: str) -> bool:
+        """Account for an upload another worker stored after this one loaded the folder"""
+        if not UPLOAD_NAME.match(name):
+            return False
+        try:
+            size = (self.upload_dir / name).stat().st_size
+        except FileNotFoundError:
+            return False
+        self._files[name] = size
+        self._total_bytes += size
+        self._evict(keep=name)
+        return True
+
+    async def receive(
+        self,
+        content_type: str,
+        body: AsyncIterator[bytes],
+        file_field: str = "image"
+    ) -> Tuple[Dict[str, str], StoredUpload]:
+        """
+        Parse a multipart/form-data body chunk by chunk: the file part is
+        hashed and written to disk as it arrives, text parts are returned
+        Raises UploadTooLarge, or ValueError for malformed bodies and non-images
+        """
+        self._load()
+        media_type, options = parse_options_header(content_type)
+        boundary = options.get(b"boundary")
+        if media_type != b"multipart/form-data" or not boundary:
+            raise ValueError("Expected a multipart/form-data body")
+
+        form = _FormStream(file_field)
+        parser = MultipartParser(boundary, form.callbacks())
+        temp_path = self.upload_dir / f".{uuid.uuid4().hex}.tmp"
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            async with aiofiles.open(temp_path, "wb") as f:
+                async for chunk in body:
+                    parser.write(chunk)
+                    for data in form.drain():
+                        size += len(data)
+                        if size > self.max_bytes:
+                            raise UploadTooLarge(
+                                f"Image exceeds the {self.max_bytes // 1024**2} MB upload limit"
+                            )
+                        digest.update(data)
+                        await f.write(data)
+                parser.finalize()
+            if not form.file_parts or size == 0:
+                raise ValueError(f"Missing {file_field} file")
+            upload = await self._store(temp_path, digest.hexdigest(), size)
+            return form.fields, upload
+        finally:
+            temp_path.unlink(missing_ok=True)
+
+    async def _store(self, temp_path: Path, digest: str, size: int) -> StoredUpload:
+        extension = await asyncio.to_thread(_image_extension, temp_path)
+        name = f"{digest}.{extension}"
+        if name in self._files:
+            cache_requests_total.inc(cache="upload", result="hit")
+            self._files.move_to_end(name)
+            return StoredUpload(name, digest, size, True)
+
+        cache_requests_total.inc(cache="upload", result="miss")
+        os.replace(temp_path, self.upload_dir / name)
+        self._files[name] = size
+        self._total_bytes += size
+        self._evict(keep=name)
+        return StoredUpload(name, digest, size, False)
+
+    def _evict(self, keep: str):
+        while self._total_bytes > self.cache_max_bytes and len(self._files) > 1:
+            name, size = next(iter(self._files.items()))
+            if name == keep:
+                break
+            del self._files[name]
+            self._total_bytes -= size
+            (self.upload_dir / name).unlink(missing_ok=True)
+            self._pushed = {pushed for pushed in self._pushed if pushed[1] != name}
+
+    def inputs(self, workflow: Dict) -> List[str]:
+        """Upload-style names a workflow's LoadImage nodes read"""
+        return [
+            node["inputs"]["image"]
+            for node in workflow.values()
+            if node.get("class_type") == "LoadImage"
+            and isinstance(node["inputs"].get("image"), str)
+            and UPLOAD_NAME.match(node["inputs"]["image"])
+        ]
+
+    def missing(self, workflow: Dict) -> List[str]:
+        """Uploads a workflow references that are not (or no longer) stored"""
+        return [name for name in self.inputs(workflow) if self.path(name) is None]
+
+    async def push_inputs(self, node, workflow: Dict) -> bool:
+        """
+        Make sure the instance has every upload the workflow reads, streaming
+        each from disk the first time; False if an upload failed
+        Raises FileNotFoundError if an upload was evicted meanwhile
+        """
+        names = self.inputs(workflow)
+        if names and self._push_connects.get(node.name) != node.listener.connects:
+            # Reconnected: the instance may have restarted with an emptied input folder
+            self._pushed = {pushed for pushed in self._pushed if pushed[0] != node.name}
+            self._push_connects[node.name] = node.listener.connects
+        for name in names:
+            path = self.path(name)
+            if path is None:
+                raise FileNotFoundError(f"Source image {name} is no longer available")
+            self._files.move_to_end(name)
+            if (node.name, name) in self._pushed:
+                continue
+            content_type = next(
+                mime for extension, mime in UPLOAD_FORMATS.values() if name.endswith(f".{extension}")
+            )
+            if not await node.service.upload_image(str(path), name, content_type):
+                return False
+            self._pushed.add((node.name, name))
+        return True
+
+
+def _image_extension(path: Path) -> str:
+    """Extension for a supported image format; ValueError otherwise"""
+    try:
+        with Image.open(path) as image:
+            image_format = image.format
+            image.verify()
+    except (UnidentifiedImageError, OSError, SyntaxError):
+        raise ValueError("Not a valid image file")
+    if image_format not in UPLOAD_FORMATS:
+        raise ValueError(
+            f"Unsupported image format {image_format}. Use PNG, JPEG or WebP."
+        )
+    return UPLOAD_FORMATS[image_format][0]
+
+
+upload_store = UploadStore()
+
+registry.gauge(
+    "upload_store_bytes",
+    "Bytes of uploaded source images held locally",
+    lambda: {(): upload_store._total_bytes}
+)
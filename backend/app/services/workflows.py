@@ -0,0 +1,241 @@
+"""
+Workflow Template Service
+Loads workflow presets once, reloads them on file change, and binds request
+fields onto node inputs through a declarative map
+Traceability: FUN-GEN-REQUEST-007, FUN-CONFIG-MGMT
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+from app.services.structured_log import get_logger, log_event
+
+logger = get_logger("workflows")
+
+
+WORKFLOW_DIR = os.path.join(os.path.dirname(__file__), "../../..", "workflows/presets")
+
+# Seconds between checks of preset file mtimes
+RELOAD_INTERVAL = 2.0
+
+
+class Binding(NamedTuple):
+    """Request field bound to one or more (node id, input name) targets"""
+    field: str
+    targets: Tuple[Tuple[str, str], ...]
+    type: Callable[[Any], Any]
+    default: Any = None
+
+
+def _prompt_bindings(model: str, positive: str, negative: str) -> List[Binding]:
+    return [
+        Binding("model", ((model, "ckpt_name"),), str),
+        Binding("prompt", ((positive, "text"),), str),
+        Binding("negative_prompt", ((negative, "text"),), str, "blurry, low quality"),
+    ]
+
+
+def _sampler_bindings(sampler: str) -> List[Binding]:
+    return [
+        Binding("seed", ((sampler, "seed"),), int, -1),
+        Binding("steps", ((sampler, "steps"),), int, 20),
+        Binding("cfg", ((sampler, "cfg"),), float, 7.0),
+    ]
+
+
+def _latent_bindings(latent: str) -> List[Binding]:
+    return [
+        Binding("width", ((latent, "width"),), int),
+        Binding("height", ((latent, "height"),), int),
+        Binding("batch_size", ((latent, "batch_size"),), int, 1),
+    ]
+
+
+# FUN-GEN-REQUEST-007: Node inputs each preset exposes to requests
+PRESET_BINDINGS: Dict[str, List[Binding]] = {
+    "txt2img_basic": (
+        _prompt_bindings("1", "2", "3") + _latent_bindings("4") + _sampler_bindings("5")
+    ),
+    "txt2img_lora": (
+        _prompt_bindings("1", "3", "4") + _latent_bindings("5") + _sampler_bindings("6") + [
+            Binding("lora", (("2", "lora_name"),), str),
+            Binding("lora_strength", (("2", "strength_model"), ("2", "strength_clip")), float),
+        ]
+    ),
+    "txt2img_pag": (
+        _prompt_bindings("1", "2", "3") + _latent_bindings("4") + _sampler_bindings("5") + [
+            Binding("pag_scale", (("8", "scale"),), float),
+        ]
+    ),
+    "img2img": (
+        _prompt_bindings("1", "4", "5") + _sampler_bindings("6") + [
+            Binding("image", (("2", "image"),), str),
+            Binding("denoise", (("6", "denoise"),), float),
+        ]
+    ),
+    "upscale": [
+        Binding("image", (("1", "image"),), str),
+        Binding("upscale_model", (("2", "model_name"),), str),
+    ],
+}
+
+# Fields a request must supply for each preset
+REQUIRED_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "txt2img_basic": ("model", "prompt"),
+    "txt2img_lora": ("model", "prompt", "lora"),
+    "txt2img_pag": ("model", "prompt"),
+    "img2img": ("model", "prompt", "image"),
+    "upscale": ("image",),
+}
+
+
+class WorkflowRegistry:
+    """Parsed preset graphs kept in memory, refreshed when their files change"""
+
+    def __init__(self, workflow_dir: str = WORKFLOW_DIR):
+        self.workflow_dir = workflow_dir
+        self._templates: Dict[str, Dict] = {}
+        self._mtimes: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.workflow_dir, f"{name}.json")
+
+    def load(self):
+        """Parse every preset whose file changed since it was last loaded"""
+        for name in PRESET_BINDINGS:
+            try:
+                mtime = os.stat(self.path(name)).st_mtime
+                if self._mtimes.get(name) == mtime:
+                    continue
+                with open(self.path(name), "r") as f:
+                    self._templates[name] = json.load(f)
+                self._mtimes[name] = mtime
+            except (OSError, json.JSONDecodeError) as e:
+                # Keep serving the last good version of the preset
+                log_event(logger, "preset_load_failed", level=logging.ERROR, preset=name, error=str(e))
+
+    def start(self):
+        """Load presets and start watching them for changes"""
+        self.load()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(RELOAD_INTERVAL)
+            self.load()
+
+    def presets(self) -> Dict[str, Dict]:
+        """Available presets with their bindable and required fields"""
+        if not self._templates:
+            self.load()
+        return {
+            name: {
+                "fields": [binding.field for binding in PRESET_BINDINGS[name]],
+                "required": list(REQUIRED_FIELDS[name])
+            }
+            for name in PRESET_BINDINGS
+            if name in self._templates
+        }
+
+    def node_classes(self) -> Set[str]:
+        """Node class types used by any preset"""
+        if not self._templates:
+            self.load()
+        return {
+            node["class_type"]
+            for template in self._templates.values()
+            for node in template.values()
+        }
+
+    def field_for(self, name: str, node_id: str, input_name: str) -> Optional[str]:
+        """Request field bound to a node input of a preset (None if not bound)"""
+        for binding in PRESET_BINDINGS.get(name, ()):
+            if (node_id, input_name) in binding.targets:
+                return binding.field
+        return None
+
+    def describe(self, name: str, workflow: Dict) -> Dict:
+        """Request fields as bound in a built workflow (e.g. the seed actually used)"""
+        fields = {}
+        for binding in PRESET_BINDINGS.get(name, ()):
+            node_id, input_name = binding.targets[0]
+            value = workflow.get(node_id, {}).get("inputs", {}).get(input_name)
+            # Skip inputs still wired to other nodes
+            if value is not None and not isinstance(value, list):
+                fields[binding.field] = value
+        return fields
+
+    def parse_form(self, name: str, form: Dict[str, str]) -> Dict:
+        """
+        Typed request fields from multipart form strings (unbound fields are dropped)
+        Raises ValueError for values that do not convert
+        """
+        params = {}
+        for binding in PRESET_BINDINGS.get(name, ()):
+            value = form.get(binding.field)
+            if value is None or value == "":
+                continue
+            try:
+                params[binding.field] = binding.type(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid value for {binding.field}: {value!r}")
+        return params
+
+    def is_deterministic(self, name: str, params: Dict) -> bool:
+        """False when build() would draw a random seed for these params"""
+        has_seed = any(binding.field == "seed" for binding in PRESET_BINDINGS.get(name, ()))
+        return not has_seed or params.get("seed") not in (None, -1)
+
+    def build(self, name: str, params: Dict) -> Dict:
+        """
+        Bind request fields onto a copy of the preset graph
+        Raises KeyError for unknown presets and ValueError for bad fields
+        """
+        if name not in PRESET_BINDINGS:
+            raise KeyError(name)
+        if name not in self._templates:
+            self.load()
+        template = self._templates[name]
+
+        missing = [field for field in REQUIRED_FIELDS[name] if params.get(field) in (None, "")]
+        if missing:
+            raise ValueError(f"Missing required field(s) for {name}: {', '.join(missing)}")
+
+        # Structural copy: nodes and their inputs are fresh dicts, links stay shared
+        workflow = {
+            node_id: {**node, "inputs": dict(node["inputs"])}
+            for node_id, node in template.items()
+        }
+
+        for binding in PRESET_BINDINGS[name]:
+            value = params.get(binding.field)
+            if value is None:
+                value = binding.default
+            if value is None:
+                continue
+            if binding.field == "seed" and value == -1:
+                value = random.randint(0, 2**32 - 1)
+            try:
+                value = binding.type(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid value for {binding.field}: {value!r}")
+            for node_id, input_name in binding.targets:
+                workflow[node_id]["inputs"][input_name] = value
+
+        return workflow
+
+
+workflow_registry = WorkflowRegistry()
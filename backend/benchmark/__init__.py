@@ -0,0 +1,6 @@
+"""
+Backend Benchmark Suite
+Fake ComfyUI server, synthetic gallery and load generator for measuring the
+API without a GPU (run with `python -m benchmark`, see bench_backend.sh)
+Traceability: STK-BACKEND-031
+"""
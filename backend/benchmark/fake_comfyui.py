@@ -0,0 +1,396 @@
+"""
+Fake ComfyUI Server
+Implements the slice of ComfyUI's API the backend talks to (/prompt,
+/history, /view, /upload/image, /object_info, /queue, /ws, ...) with
+configurable latencies.
+Prompts execute one at a time, like a single GPU, and "produce" a real PNG so
+downloads, ingestion and thumbnails do real work.
+Traceability: STK-BACKEND-031
+"""
+import argparse
+import asyncio
+import io
+import json
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Set
+
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response
+from PIL import Image
+
+# History entries kept before the oldest are forgotten
+MAX_HISTORY = 10000
+
+CHECKPOINTS = [
+    "base/sd_xl_base_1.0.safetensors",
+    "base/juggernautXL_v9.safetensors",
+    "merged/dreamshaperXL_turbo.safetensors"
+]
+LORAS = ["lora/detail_tweaker_xl.safetensors", "lora/film_grain.safetensors"]
+UPSCALE_MODELS = ["4x-UltraSharp.pth"]
+SAMPLERS = ["euler", "euler_ancestral", "dpmpp_2m", "dpmpp_2m_sde"]
+SCHEDULERS = ["normal", "karras", "exponential", "sgm_uniform"]
+
+# Node schemas in /object_info format for every class the presets use
+OBJECT_INFO = {
+    "CheckpointLoaderSimple": {
+        "input": {"required": {"ckpt_name": [CHECKPOINTS]}},
+        "output": ["MODEL", "CLIP", "VAE"]
+    },
+    "LoraLoader": {
+        "input": {"required": {
+            "model": ["MODEL"],
+            "clip": ["CLIP"],
+            "lora_name": [LORAS],
+            "strength_model": ["FLOAT", {"default": 1.0, "min": -100.0, "max": 100.0}],
+            "strength_clip": ["FLOAT", {"default": 1.0, "min": -100.0, "max": 100.0}]
+        }},
+        "output": ["MODEL", "CLIP"]
+    },
+    "CLIPTextEncode": {
+        "input": {"required": {"text": ["STRING", {"multiline": True}], "clip": ["CLIP"]}},
+        "output": ["CONDITIONING"]
+    },
+    "EmptyLatentImage": {
+        "input": {"required": {
+            "width": ["INT", {"default": 512, "min": 16, "max": 16384, "step": 8}],
+            "height": ["INT", {"default": 512, "min": 16, "max": 16384, "step": 8}],
+            "batch_size": ["INT", {"default": 1, "min": 1, "max": 4096}]
+        }},
+        "output": ["LATENT"]
+    },
+    "KSampler": {
+        "input": {"required": {
+            "model": ["MODEL"],
+            "seed": ["INT", {"default": 0, "min": 0, "max": 0xffffffffffffffff}],
+            "steps": ["INT", {"default": 20, "min": 1, "max": 10000}],
+            "cfg": ["FLOAT", {"default": 8.0, "min": 0.0, "max": 100.0}],
+            "sampler_name": [SAMPLERS],
+            "scheduler": [SCHEDULERS],
+            "positive": ["CONDITIONING"],
+            "negative": ["CONDITIONING"],
+            "latent_image": ["LATENT"],
+            "denoise": ["FLOAT", {"default": 1.0, "min": 0.0, "max": 1.0}]
+        }},
+        "output": ["LATENT"]
+    },
+    "PerturbedAttentionGuidance": {
+        "input": {"required": {
+            "model": ["MODEL"],
+            "scale": ["FLOAT", {"default": 3.0, "min": 0.0, "max": 100.0}]
+        }},
+        "output": ["MODEL"]
+    },
+    "VAEDecode": {
+        "input": {"required": {"samples": ["LATENT"], "vae": ["VAE"]}},
+        "output": ["IMAGE"]
+    },
+    "VAEEncode": {
+        "input": {"required": {"pixels": ["IMAGE"], "vae": ["VAE"]}},
+        "output": ["LATENT"]
+    },
+    "LoadImage": {
+        "input": {"required": {"image": [[], {"image_upload": True}]}},
+        "output": ["IMAGE", "MASK"]
+    },
+    "UpscaleModelLoader": {
+        "input": {"required": {"model_name": [UPSCALE_MODELS]}},
+        "output": ["UPSCALE_MODEL"]
+    },
+    "ImageUpscaleWithModel": {
+        "input": {"required": {"upscale_model": ["UPSCALE_MODEL"], "image": ["IMAGE"]}},
+        "output": ["IMAGE"]
+    },
+    "SaveImage": {
+        "input": {"required": {"images": ["IMAGE"], "filename_prefix": ["STRING", {"default": "ComfyUI"}]}},
+        "output": [],
+        "output_node": True
+    }
+}
+
+
+class Latencies(NamedTuple):
+    """Simulated timings (seconds)"""
+    api: float = 0.002          # added to every HTTP endpoint
+    execution: float = 1.0      # GPU time per prompt
+    steps: int = 10             # progress messages per prompt
+    view: float = 0.005         # extra time to serve an output image
+
+
+def render_output_png(size: int) -> bytes:
+    """A gradient PNG that costs real work to decode and thumbnail"""
+    image = Image.linear_gradient("L").resize((size, size)).convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class FakeComfyUI:
+    """State of the fake instance: serial prompt queue, history, websocket clients"""
+
+    def __init__(self, latencies: Latencies = Latencies(), image_size: int = 512):
+        self.latencies = latencies
+        self.image_bytes = render_output_png(image_size)
+        self.pending: "OrderedDict[str, Dict]" = OrderedDict()
+        self.running: Optional[str] = None
+        self._current: Optional[Dict] = None
+        self.history: "OrderedDict[str, Dict]" = OrderedDict()
+        self.outputs: Set[str] = set()
+        self.inputs: Dict[str, int] = {}
+        self.clients: Dict[str, Set[WebSocket]] = {}
+        self.interrupted = False
+        self.counter = 0
+        self._wakeup = asyncio.Event()
+        self._worker: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+
+    def enqueue(self, prompt: Dict, client_id: Optional[str], prompt_id: Optional[str]) -> Dict:
+        prompt_id = prompt_id or str(uuid.uuid4())
+        self.counter += 1
+        self.pending[prompt_id] = {"number": self.counter, "prompt": prompt, "client_id": client_id}
+        self._wakeup.set()
+        return {"prompt_id": prompt_id, "number": self.counter, "node_errors": {}}
+
+    def queue_state(self) -> Dict:
+        def entry(prompt_id: str, job: Dict) -> List:
+            return [job["number"], prompt_id, job["prompt"], {"client_id": job["client_id"]}, []]
+
+        running = []
+        if self.running is not None:
+            running.append(entry(self.running, self._current))
+        return {
+            "queue_running": running,
+            "queue_pending": [entry(prompt_id, job) for prompt_id, job in self.pending.items()]
+        }
+
+    async def broadcast(self, client_id: Optional[str], event_type: str, data: Dict):
+        """Send to the prompt's client, or to everyone for unaddressed events"""
+        targets = self.clients.get(client_id, set()) if client_id else set().union(*self.clients.values())
+        message = json.dumps({"type": event_type, "data": data})
+        for websocket in list(targets):
+            try:
+                await websocket.send_text(message)
+            except Exception:
+                targets.discard(websocket)
+
+    async def broadcast_status(self):
+        remaining = len(self.pending) + (1 if self.running else 0)
+        await self.broadcast(None, "status", {"status": {"exec_info": {"queue_remaining": remaining}}})
+
+    async def _run(self):
+        while True:
+            if not self.pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            prompt_id, job = self.pending.popitem(last=False)
+            self.running, self._current = prompt_id, job
+            try:
+                await self._execute(prompt_id, job)
+            finally:
+                self.running = None
+                await self.broadcast_status()
+
+    async def _execute(self, prompt_id: str, job: Dict):
+        client_id = job["client_id"]
+        self.interrupted = False
+        await self.broadcast_status()
+        await self.broadcast(client_id, "execution_start", {"prompt_id": prompt_id})
+
+        steps = max(1, self.latencies.steps)
+        sampler = next(
+            (node_id for node_id, node in job["prompt"].items() if node.get("class_type") == "KSampler"),
+            None
+        )
+        for step in range(1, steps + 1):
+            await asyncio.sleep(self.latencies.execution / steps)
+            if self.interrupted:
+                self._record(prompt_id, job, {}, "error")
+                await self.broadcast(client_id, "execution_interrupted", {"prompt_id": prompt_id})
+                return
+            await self.broadcast(client_id, "progress", {
+                "prompt_id": prompt_id, "node": sampler, "value": step, "max": steps
+            })
+
+        outputs = {}
+        saved = 0
+        for node_id, node in job["prompt"].items():
+            if node.get("class_type") != "SaveImage":
+                continue
+            images = []
+            for _ in range(self._batch_size(job["prompt"])):
+                filename = f"ComfyUI_{job['number']:05d}_{saved:02d}_.png"
+                saved += 1
+                self.outputs.add(filename)
+                images.append({"filename": filename, "subfolder": "", "type": "output"})
+            outputs[node_id] = {"images": images}
+            await self.broadcast(client_id, "executed", {
+                "prompt_id": prompt_id, "node": node_id, "output": {"images": images}
+            })
+        self._record(prompt_id, job, outputs, "success")
+        await self.broadcast(client_id, "executing", {"prompt_id": prompt_id, "node": None})
+
+    @staticmethod
+    def _batch_size(prompt: Dict) -> int:
+        for node in prompt.values():
+            if node.get("class_type") == "EmptyLatentImage":
+                return int(node["inputs"].get("batch_size", 1))
+        return 1
+
+    def _record(self, prompt_id: str, job: Dict, outputs: Dict[str, Dict], status_str: str):
+        self.history[prompt_id] = {
+            "prompt": [job["number"], prompt_id, job["prompt"], {"client_id": job["client_id"]}, []],
+            "outputs": outputs,
+            "status": {"status_str": status_str, "completed": status_str == "success", "messages": []}
+        }
+        while len(self.history) > MAX_HISTORY:
+            self.history.popitem(last=False)
+
+
+def create_app(latencies: Latencies = Latencies(), image_size: int = 512) -> FastAPI:
+    app = FastAPI(title="Fake ComfyUI")
+    comfy = FakeComfyUI(latencies, image_size)
+    app.state.comfy = comfy
+
+    def load_image_info() -> Dict:
+        # Like ComfyUI, the option list is the current input folder
+        return {**OBJECT_INFO["LoadImage"], "input": {"required": {
+            "image": [sorted(comfy.inputs), {"image_upload": True}]
+        }}}
+
+    @app.on_event("startup")
+    async def startup():
+        comfy.start()
+
+    @app.on_event("shutdown")
+    async def shutdown():
+        await comfy.stop()
+
+    @app.middleware("http")
+    async def api_latency(request: Request, call_next):
+        if latencies.api > 0:
+            await asyncio.sleep(latencies.api)
+        return await call_next(request)
+
+    @app.get("/system_stats")
+    async def system_stats():
+        return {
+            "system": {"os": "posix", "comfyui_version": "fake"},
+            "devices": [{"name": "fake", "type": "cuda", "vram_total": 0, "vram_free": 0}]
+        }
+
+    @app.post("/prompt")
+    async def prompt(request: Request):
+        body = await request.json()
+        workflow = body.get("prompt")
+        if not isinstance(workflow, dict) or not workflow:
+            raise HTTPException(status_code=400, detail="No prompt provided")
+        return comfy.enqueue(workflow, body.get("client_id"), body.get("prompt_id"))
+
+    @app.get("/history/{prompt_id}")
+    async def history(prompt_id: str):
+        entry = comfy.history.get(prompt_id)
+        return {prompt_id: entry} if entry is not None else {}
+
+    @app.get("/queue")
+    async def queue():
+        return comfy.queue_state()
+
+    @app.post("/queue")
+    async def edit_queue(request: Request):
+        body = await request.json()
+        if body.get("clear"):
+            comfy.pending.clear()
+        for prompt_id in body.get("delete", []):
+            comfy.pending.pop(prompt_id, None)
+        return {}
+
+    @app.post("/interrupt")
+    async def interrupt():
+        comfy.interrupted = True
+        return {}
+
+    @app.get("/view")
+    async def view(filename: str, subfolder: str = "", type: str = "output"):
+        if filename not in comfy.outputs:
+            raise HTTPException(status_code=404, detail="Not found")
+        if latencies.view > 0:
+            await asyncio.sleep(latencies.view)
+        return Response(comfy.image_bytes, media_type="image/png")
+
+    @app.post("/upload/image")
+    async def upload_image(request: Request):
+        form = await request.form()
+        image = form.get("image")
+        if image is None or not hasattr(image, "read"):
+            raise HTTPException(status_code=400, detail="No image provided")
+        size = 0
+        while True:
+            chunk = await image.read(64 * 1024)
+            if not chunk:
+                break
+            size += len(chunk)
+        comfy.inputs[image.filename] = size
+        return {"name": image.filename, "subfolder": "", "type": form.get("type", "input")}
+
+    @app.get("/object_info")
+    async def object_info():
+        return {**OBJECT_INFO, "LoadImage": load_image_info()}
+
+    @app.get("/object_info/{node_class}")
+    async def object_info_node(node_class: str):
+        if node_class == "LoadImage":
+            return {"LoadImage": load_image_info()}
+        return {node_class: OBJECT_INFO[node_class]} if node_class in OBJECT_INFO else {}
+
+    @app.websocket("/ws")
+    async def websocket_endpoint(websocket: WebSocket, clientId: str = ""):
+        await websocket.accept()
+        client_id = clientId or uuid.uuid4().hex
+        comfy.clients.setdefault(client_id, set()).add(websocket)
+        await comfy.broadcast_status()
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+        finally:
+            sockets = comfy.clients.get(client_id, set())
+            sockets.discard(websocket)
+            if not sockets:
+                comfy.clients.pop(client_id, None)
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    defaults = Latencies()
+    parser = argparse.ArgumentParser(description="Fake ComfyUI server for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8188)
+    parser.add_argument("--api-latency", type=float, default=defaults.api, help="seconds added to every HTTP call")
+    parser.add_argument("--execution-time", type=float, default=defaults.execution, help="seconds per prompt")
+    parser.add_argument("--steps", type=int, default=defaults.steps, help="progress events per prompt")
+    parser.add_argument("--view-latency", type=float, default=defaults.view, help="seconds added to /view")
+    parser.add_argument("--image-size", type=int, default=512, help="output PNG edge in pixels")
+    args = parser.parse_args()
+
+    latencies = Latencies(args.api_latency, args.execution_time, args.steps, args.view_latency)
+    uvicorn.run(create_app(latencies, args.image_size), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Load Generator
+Scenarios that drive the backend API at a fixed concurrency for a fixed time
+and record per-operation latencies
+Traceability: STK-BACKEND-031
+"""
+import asyncio
+import math
+import random
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from benchmark.fake_comfyui import CHECKPOINTS
+from benchmark.synthetic_gallery import SUBJECTS, STYLES
+
+# Seconds between status polls of one in-flight generation
+DEFAULT_POLL_INTERVAL = 0.1
+
+# Give up on a generation that has not finished after this long (seconds)
+GENERATION_TIMEOUT = 120
+
+FINISHED = ("completed", "failed", "cancelled")
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Recorder:
+    """Latency samples and error counts per operation"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def record(self, operation: str, seconds: float, ok: bool = True):
+        self.samples.setdefault(operation, []).append(seconds)
+        if not ok:
+            self.errors[operation] = self.errors.get(operation, 0) + 1
+
+    async def timed(self, operation: str, call: Awaitable[httpx.Response]) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await call
+        except httpx.HTTPError:
+            self.record(operation, time.perf_counter() - started, ok=False)
+            return None
+        self.record(operation, time.perf_counter() - started, ok=response.status_code < 400)
+        return response
+
+    def summary(self, elapsed: float) -> Dict[str, Dict]:
+        report = {}
+        for operation, values in self.samples.items():
+            ordered = sorted(values)
+            report[operation] = {
+                "count": len(ordered),
+                "errors": self.errors.get(operation, 0),
+                "rps": round(len(ordered) / elapsed, 2) if elapsed > 0 else 0.0,
+                "mean_ms": round(1000 * sum(ordered) / len(ordered), 2),
+                "p50_ms": round(1000 * percentile(ordered, 0.50), 2),
+                "p90_ms": round(1000 * percentile(ordered, 0.90), 2),
+                "p99_ms": round(1000 * percentile(ordered, 0.99), 2),
+                "max_ms": round(1000 * ordered[-1], 2)
+            }
+        return report
+
+
+def generation_request(rng: random.Random) -> Dict:
+    return {
+        "prompt": f"{rng.choice(SUBJECTS)}, {', '.join(rng.sample(STYLES, 2))}",
+        "model": rng.choice(CHECKPOINTS),
+        "seed": rng.randrange(2**31),
+        "steps": 20
+    }
+
+
+async def generate_and_poll(
+    client: httpx.AsyncClient,
+    recorder: Recorder,
+    rng: random.Random,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+    finished: Optional[List[str]] = None
+):
+    """
+    One user: submit, poll status until done, then download the image
+    Ids of completed generations are appended to `finished`
+    """
+    started = time.perf_counter()
+    response = await recorder.timed("generate", client.post("/api/generate", json=generation_request(rng)))
+    if response is None or response.status_code >= 400:
+        return
+    request_id = response.json()["request_id"]
+
+    deadline = started + GENERATION_TIMEOUT
+    status = {}
+    while time.perf_counter() < deadline:
+        await asyncio.sleep(poll_interval)
+        response = await recorder.timed("status", client.get(f"/api/generate/status/{request_id}"))
+        if response is None or response.status_code >= 400:
+            continue
+        status = response.json()
+        if status["status"] in FINISHED:
+            break
+
+    completed = status.get("status") == "completed"
+    recorder.record("end_to_end", time.perf_counter() - started, ok=completed)
+    if completed and finished is not None:
+        finished.append(request_id)
+    if completed and status.get("image_url"):
+        await recorder.timed("image", client.get(status["image_url"]))
+
+
+async def poll_status(client: httpx.AsyncClient, recorder: Recorder, request_ids: List[str], rng: random.Random):
+    """Hot status polling of already finished generations"""
+    await recorder.timed("status", client.get(f"/api/generate/status/{rng.choice(request_ids)}"))
+
+
+async def browse_gallery(
+    client: httpx.AsyncClient,
+    recorder: Recorder,
+    state: Dict,
+    page_size: int = 50
+):
+    """Next /api/gallery page, following X-Next-Cursor and wrapping at the end"""
+    params = {"limit": page_size}
+    if state.get("cursor"):
+        params["cursor"] = state["cursor"]
+    response = await recorder.timed("gallery_page", client.get("/api/gallery", params=params))
+    state["cursor"] = response.headers.get("X-Next-Cursor") if response is not None else None
+
+
+async def fetch_gallery_images(client: httpx.AsyncClient, recorder: Recorder, images: List[Dict], rng: random.Random):
+    """A thumbnail, and now and then the full image, of a random gallery entry"""
+    image = rng.choice(images)
+    await recorder.timed("thumbnail", client.get(image["thumbnail_url"]))
+    if rng.random() < 0.2:
+        await recorder.timed("gallery_image", client.get(image["image_url"]))
+
+
+async def drive(
+    step: Callable[[random.Random, Dict], Awaitable[None]],
+    concurrency: int,
+    duration: float,
+    seed: int = 0
+) -> float:
+    """
+    Run `step(rng, state)` in a loop on `concurrency` workers, each with its
+    own RNG and state dict, until `duration` has passed (in-flight steps
+    finish); returns the elapsed wall time
+    """
+    deadline = time.perf_counter() + duration
+
+    async def worker(index: int):
+        rng = random.Random(seed * 1000 + index)
+        state = {}
+        while time.perf_counter() < deadline:
+            await step(rng, state)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(index) for index in range(concurrency)))
+    return time.perf_counter() - started
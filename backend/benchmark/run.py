@@ -0,0 +1,313 @@
+"""
+Benchmark Runner
+Starts fake ComfyUI instances and the backend against a synthetic gallery in
+a scratch HOME, runs the load scenarios at each concurrency level, prints
+p50/p99 latency and requests/sec, and saves the results as JSON next to
+earlier runs so regressions between versions show up as deltas
+Traceability: STK-BACKEND-031
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmark.load import (
+    Recorder, browse_gallery, drive, fetch_gallery_images, generate_and_poll, poll_status
+)
+from benchmark.synthetic_gallery import generate_gallery
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+SCENARIOS = ("generate", "status", "gallery", "images")
+
+# Seconds to wait for a started server to answer
+STARTUP_TIMEOUT = 30
+
+# Stats compared against the baseline run, per operation
+REPORTED_FIELDS = ("rps", "p50_ms", "p99_ms")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=BACKEND_DIR,
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _wait_until_up(url: str, process: subprocess.Popen, log_file: Path):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited during startup, see {log_file}")
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {STARTUP_TIMEOUT}s, see {log_file}")
+
+
+class Environment:
+    """Fake ComfyUI instances plus a backend, torn down together"""
+
+    def __init__(self, args: argparse.Namespace, workdir: Path):
+        self.args = args
+        self.workdir = workdir
+        self.processes: List[subprocess.Popen] = []
+
+    def _spawn(self, name: str, command: List[str], env: Optional[Dict] = None) -> subprocess.Popen:
+        log_file = self.workdir / f"{name}.log"
+        with open(log_file, "w") as log:
+            process = subprocess.Popen(
+                command, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+            )
+        self.processes.append(process)
+        return process
+
+    def start(self) -> str:
+        args = self.args
+        home = self.workdir / "home"
+        gallery = home / "images" / "outputs"
+        print(f"[INFO] Generating synthetic gallery ({args.gallery_runs}x{args.gallery_images} images)...")
+        generate_gallery(gallery, args.gallery_runs, args.gallery_images)
+
+        urls = []
+        for index in range(args.instances):
+            port = _free_port()
+            process = self._spawn(f"comfyui{index}", [
+                sys.executable, "-m", "benchmark.fake_comfyui",
+                "--port", str(port),
+                "--api-latency", str(args.api_latency),
+                "--execution-time", str(args.execution_time),
+                "--steps", str(args.steps),
+                "--view-latency", str(args.view_latency)
+            ])
+            url = f"http://127.0.0.1:{port}"
+            _wait_until_up(f"{url}/system_stats", process, self.workdir / f"comfyui{index}.log")
+            urls.append(url)
+        print(f"[INFO] Fake ComfyUI instances: {', '.join(urls)}")
+
+        port = _free_port()
+        env = {
+            **os.environ,
+            "HOME": str(home),
+            "COMFYUI_URLS": ",".join(urls),
+            "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+            # Every simulated user shares one address: lift per-client admission limits
+            "MAX_CLIENT_JOBS": os.environ.get("MAX_CLIENT_JOBS", "100000"),
+            "MAX_QUEUED_JOBS": os.environ.get("MAX_QUEUED_JOBS", "100000")
+        }
+        process = self._spawn("backend", [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--host", "127.0.0.1",
+            "--port", str(port),
+            "--workers", str(args.workers),
+            "--log-level", "warning"
+        ], env=env)
+        target = f"http://127.0.0.1:{port}"
+        _wait_until_up(f"{target}/api/health", process, self.workdir / "backend.log")
+        print(f"[INFO] Backend: {target} (logs in {self.workdir})")
+        return target
+
+    def stop(self):
+        for process in reversed(self.processes):
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+async def run_scenarios(target: str, args: argparse.Namespace) -> Dict[str, Dict]:
+    """Run every selected scenario at every concurrency level"""
+    results = {}
+    finished: List[str] = []
+    limits = httpx.Limits(max_connections=max(args.concurrency) * 2)
+    async with httpx.AsyncClient(base_url=target, limits=limits, timeout=60) as client:
+        gallery = (await client.get("/api/gallery", params={"limit": 1000})).json()
+
+        for scenario in args.scenarios:
+            for concurrency in args.concurrency:
+                recorder = Recorder()
+                if scenario == "generate":
+                    async def step(rng, state):
+                        await generate_and_poll(client, recorder, rng, args.poll_interval, finished)
+                elif scenario == "status":
+                    if not finished:
+                        # Status polling needs finished jobs to look up
+                        warmup = Recorder()
+                        await drive(
+                            lambda rng, state: generate_and_poll(client, warmup, rng, args.poll_interval, finished),
+                            concurrency=4,
+                            duration=2
+                        )
+                    async def step(rng, state):
+                        await poll_status(client, recorder, finished, rng)
+                elif scenario == "gallery":
+                    async def step(rng, state):
+                        await browse_gallery(client, recorder, state)
+                else:
+                    if not gallery:
+                        print("[WARN] Gallery is empty, skipping images scenario")
+                        continue
+                    async def step(rng, state):
+                        await fetch_gallery_images(client, recorder, gallery, rng)
+
+                elapsed = await drive(step, concurrency, args.duration, args.seed)
+                key = f"{scenario}@{concurrency}"
+                results[key] = recorder.summary(elapsed)
+                _print_scenario(key, results[key])
+    return results
+
+
+def _print_scenario(key: str, summary: Dict[str, Dict]):
+    print(f"\n{key}")
+    print(f"  {'operation':<14} {'count':>7} {'errors':>6} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for operation, stats in summary.items():
+        print(
+            f"  {operation:<14} {stats['count']:>7} {stats['errors']:>6} {stats['rps']:>9.1f} "
+            f"{stats['p50_ms']:>9.1f} {stats['p99_ms']:>9.1f} {stats['max_ms']:>9.1f}"
+        )
+
+
+def _latest_result(results_dir: Path, exclude: Path) -> Optional[Path]:
+    previous = sorted(path for path in results_dir.glob("*.json") if path != exclude)
+    return previous[-1] if previous else None
+
+
+def compare(current: Dict, baseline: Dict):
+    """Print relative change of throughput and latency against a baseline run"""
+    print(f"\n[INFO] Compared with {baseline['revision']} ({baseline['started_at']}); "
+          f"req/s higher is better, latency lower is better")
+    compared = 0
+    for key, summary in current["results"].items():
+        base_summary = baseline["results"].get(key)
+        if base_summary is None:
+            continue
+        for operation, stats in summary.items():
+            base = base_summary.get(operation)
+            if base is None:
+                continue
+            changes = []
+            for field in REPORTED_FIELDS:
+                if base[field]:
+                    delta = 100 * (stats[field] - base[field]) / base[field]
+                    changes.append(f"{field} {base[field]:.1f} -> {stats[field]:.1f} ({delta:+.0f}%)")
+            print(f"  {key:<14} {operation:<14} " + ", ".join(changes))
+            compared += 1
+    if not compared:
+        print("  No scenario/concurrency runs in common")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmark",
+        description="Benchmark the backend API against fake ComfyUI instances"
+    )
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"comma-separated subset of {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", default="1,16",
+                        help="comma-separated concurrent clients per scenario run")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per scenario run")
+    parser.add_argument("--poll-interval", type=float, default=0.1, help="status poll interval of generate clients")
+    parser.add_argument("--target", help="benchmark an already running backend instead of starting one")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the started backend")
+    parser.add_argument("--instances", type=int, default=1, help="fake ComfyUI instances")
+    parser.add_argument("--api-latency", type=float, default=0.002, help="fake ComfyUI seconds per HTTP call")
+    parser.add_argument("--execution-time", type=float, default=0.05, help="fake ComfyUI seconds per prompt")
+    parser.add_argument("--steps", type=int, default=5, help="fake ComfyUI progress events per prompt")
+    parser.add_argument("--view-latency", type=float, default=0.005, help="fake ComfyUI extra seconds per /view")
+    parser.add_argument("--gallery-runs", type=int, default=50, help="synthetic gallery run folders")
+    parser.add_argument("--gallery-images", type=int, default=20, help="images per synthetic run folder")
+    parser.add_argument("--seed", type=int, default=0, help="seed for client request randomness")
+    parser.add_argument("--label", default="", help="suffix for the results file name")
+    parser.add_argument("--results-dir", type=Path, default=RESULTS_DIR)
+    parser.add_argument("--baseline", type=Path, help="results file to compare with (default: latest in results dir)")
+    parser.add_argument("--no-save", action="store_true", help="do not write a results file")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch HOME and server logs")
+    args = parser.parse_args(argv)
+
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    args.concurrency = [int(value) for value in args.concurrency.split(",")]
+    return args
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    started_at = datetime.now()
+    workdir = Path(tempfile.mkdtemp(prefix="image-gen-bench-"))
+    environment = None
+    try:
+        target = args.target
+        if target is None:
+            environment = Environment(args, workdir)
+            target = environment.start()
+        results = asyncio.run(run_scenarios(target, args))
+    finally:
+        if environment is not None:
+            environment.stop()
+        if args.keep:
+            print(f"[INFO] Kept {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "revision": _git_revision(),
+        "label": args.label,
+        "started_at": started_at.isoformat(timespec="seconds"),
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": {
+            key: (str(value) if isinstance(value, Path) else value)
+            for key, value in vars(args).items()
+            if key not in ("results_dir", "baseline", "no_save", "keep")
+        },
+        "results": results
+    }
+
+    saved = None
+    if not args.no_save:
+        args.results_dir.mkdir(parents=True, exist_ok=True)
+        name = f"{started_at:%Y%m%d_%H%M%S}_{report['revision']}"
+        saved = args.results_dir / (f"{name}_{args.label}.json" if args.label else f"{name}.json")
+        with open(saved, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n[OK] Results saved to {saved}")
+
+    baseline_file = args.baseline or _latest_result(args.results_dir, exclude=saved)
+    if baseline_file is not None and baseline_file.exists():
+        with open(baseline_file) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Synthetic Gallery Generator
+Fills a gallery folder with run directories shaped like real ones: generate.sh
+runs (image_NNN.png + prompt_NNN.txt) and API runs (PNG + JSON sidecar)
+Traceability: STK-BACKEND-031
+"""
+import argparse
+import io
+import json
+import os
+import random
+import time
+from pathlib import Path
+
+from PIL import Image
+
+from benchmark.fake_comfyui import CHECKPOINTS
+
+SUBJECTS = [
+    "astronaut", "lighthouse", "fox", "samurai", "cathedral", "robot", "dragon",
+    "sailboat", "forest spirit", "desert caravan", "cyberpunk alley", "koi pond"
+]
+STYLES = [
+    "highly detailed", "oil painting", "photorealistic", "watercolor", "8k",
+    "cinematic lighting", "studio ghibli style", "volumetric fog", "golden hour"
+]
+NEGATIVE = "blurry, low quality, watermark, text"
+
+
+def _png(size: int, rng: random.Random) -> bytes:
+    """Small noisy PNG (distinct per image so thumbnails are real work)"""
+    color = tuple(rng.randrange(256) for _ in range(3))
+    image = Image.effect_noise((size, size), rng.uniform(20, 80)).convert("RGB")
+    image = Image.blend(image, Image.new("RGB", (size, size), color), 0.5)
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def _prompt(rng: random.Random) -> str:
+    return f"{rng.choice(SUBJECTS)}, {', '.join(rng.sample(STYLES, 3))}"
+
+
+def generate_gallery(
+    gallery_path: Path,
+    runs: int = 50,
+    images_per_run: int = 20,
+    image_size: int = 256,
+    api_fraction: float = 0.5,
+    seed: int = 0
+) -> int:
+    """
+    Write `runs` run folders of `images_per_run` images each, spread over
+    the past few months; returns the number of images written
+    """
+    rng = random.Random(seed)
+    gallery_path.mkdir(parents=True, exist_ok=True)
+    now = time.time()
+    written = 0
+
+    for run in range(runs):
+        created = now - rng.uniform(0, 90 * 24 * 3600)
+        stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(created))
+        api_run = rng.random() < api_fraction
+        run_dir = gallery_path / (f"api_{stamp[:8]}_{run:04d}" if api_run else f"{stamp}_{run:04d}")
+        run_dir.mkdir(exist_ok=True)
+        model = rng.choice(CHECKPOINTS)
+
+        for index in range(1, images_per_run + 1):
+            prompt = _prompt(rng)
+            image_seed = rng.randrange(2**32)
+            steps = rng.choice((20, 25, 30, 40))
+            cfg = rng.choice((4.5, 5.5, 7.0, 8.0))
+
+            if api_run:
+                image_file = run_dir / f"{run:08x}_{index:03d}.png"
+                with open(image_file.with_suffix(".json"), "w") as f:
+                    json.dump({
+                        "prompt": prompt,
+                        "negative_prompt": NEGATIVE,
+                        "model": model,
+                        "seed": image_seed,
+                        "parameters": {"steps": steps, "cfg": cfg, "width": 1024, "height": 1024},
+                        "preset": "txt2img_basic",
+                        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(created))
+                    }, f, indent=2)
+            else:
+                image_file = run_dir / f"image_{index:03d}.png"
+                with open(run_dir / f"prompt_{index:03d}.txt", "w") as f:
+                    f.write(
+                        f"Model: {model}\nPrompt: {prompt}\nNegative: {NEGATIVE}\n"
+                        f"Steps: {steps}\nCFG: {cfg}\nSeed: {image_seed}\nSize: 1024x1024\n"
+                    )
+
+            image_file.write_bytes(_png(image_size, rng))
+            timestamp = created + index
+            os.utime(image_file, (timestamp, timestamp))
+            written += 1
+
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic gallery for benchmarks")
+    parser.add_argument("path", type=Path, help="gallery folder to fill")
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--images-per-run", type=int, default=20)
+    parser.add_argument("--image-size", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    count = generate_gallery(args.path, args.runs, args.images_per_run, args.image_size, seed=args.seed)
+    print(f"[OK] Wrote {count} images to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,9 +3,26 @@ FastAPI Backend for Image Generation Frontend
 Integrates with ComfyUI for image generation
 Traceability: STK-BACKEND, FUN-GEN-REQUEST, FUN-GALLERY-VIEW
 """
-from fastapi import FastAPI
+import logging
+import time
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from app.api import generation, gallery, models
+from app.services.pool import comfyui_pool
+from app.services.job_store import job_store
+from app.services.thumbnails import thumbnail_service
+from app.services.workflows import workflow_registry
+from app.services.scheduler import generation_scheduler
+from app.services.ingest import gallery_ingester
+from app.services.metrics import registry, http_request_seconds
+from app.services.structured_log import configure_logging, get_logger, log_event, LOG_SAMPLE_RATE
+
+# Requests slower than this are always logged (seconds)
+SLOW_REQUEST_SECONDS = 1.0
+
+configure_logging()
+logger = get_logger("http")
 
 app = FastAPI(
     title="Image Generation API",
@@ -23,13 +40,65 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["Content-Type", "Authorization"],
+    expose_headers=["X-Next-Cursor", "X-Gallery-Revision", "Retry-After"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Per-route latency histogram plus sampled (and all slow) request logs"""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        # Route template keeps label cardinality bounded (ids stay out)
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        http_request_seconds.observe(elapsed, method=request.method, route=path, status=status)
+        slow = elapsed >= SLOW_REQUEST_SECONDS
+        log_event(
+            logger,
+            "slow_request" if slow else "request",
+            level=logging.WARNING if slow else logging.INFO,
+            sample_rate=1.0 if slow else LOG_SAMPLE_RATE,
+            method=request.method,
+            route=path,
+            status=status,
+            duration_ms=round(elapsed * 1000, 1)
+        )
+
 # Include API routers
 app.include_router(generation.router, prefix="/api", tags=["generation"])
 app.include_router(gallery.router, prefix="/api", tags=["gallery"])
 app.include_router(models.router, prefix="/api", tags=["models"])
 
+@app.on_event("startup")
+async def startup():
+    """Load workflow presets, probe ComfyUI instances and open their event streams"""
+    workflow_registry.start()
+    job_store.start()
+    await comfyui_pool.start()
+    generation_scheduler.start()
+    gallery_ingester.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Stop background tasks and release pooled ComfyUI connections"""
+    await generation_scheduler.stop()
+    await gallery_ingester.stop()
+    await comfyui_pool.stop()
+    await workflow_registry.stop()
+    await job_store.stop()
+    thumbnail_service.shutdown()
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint (metrics are per worker process)"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/api/health")
 async def health_check():
     """STK-BACKEND-030: Health check endpoint"""
@@ -0,0 +1,114 @@
+"""
+Admission control tests
+Traceability: FUN-GEN-REQUEST-008, FUN-BATCH-GEN, STK-BACKEND-029
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app.api import generation as generation_api
+from app.services import admission as admission_module
+from app.services.admission import MAX_RETRY_AFTER, AdmissionController, AdmissionRejected
+from app.services.scheduler import GenerationScheduler
+
+LIMITS = {"interactive": (2, 3), "bulk": (10, 15)}
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    """Idle scheduler whose pending list the tests fill directly"""
+    scheduler = GenerationScheduler()
+    monkeypatch.setattr(admission_module, "generation_scheduler", scheduler)
+    monkeypatch.setattr(admission_module.comfyui_pool, "healthy_nodes", lambda: [])
+    monkeypatch.setattr("app.services.scheduler.comfyui_pool.healthy_nodes", lambda: [])
+    return scheduler
+
+
+def _pending(scheduler, client, count=1):
+    for _ in range(count):
+        scheduler.pending.append({
+            "request_id": f"{client}-{len(scheduler.pending)}",
+            "key": ("sd15.safetensors", None),
+            "priority": 0,
+            "client": client,
+            "group": None,
+            "enqueued_at": time.monotonic()
+        })
+    scheduler._waits = None
+
+
+def test_client_over_its_limit_is_rejected_with_retry_after(scheduler):
+    control = AdmissionController(LIMITS)
+    scheduler.current_key = ("sd15.safetensors", None)
+    _pending(scheduler, "alice", 2)
+
+    with pytest.raises(AdmissionRejected, match="You have 2 generations outstanding") as rejected:
+        control.check("alice")
+    # alice's first job starts now on the loaded model, so one job's time frees a slot
+    assert rejected.value.retry_after == round(scheduler.job_seconds)
+
+    control.check("bob")
+
+
+def test_full_queue_rejects_every_client(scheduler):
+    control = AdmissionController(LIMITS)
+    _pending(scheduler, "alice", 2)
+    _pending(scheduler, "bob", 1)
+
+    with pytest.raises(AdmissionRejected, match="queue is full"):
+        control.check("carol")
+
+
+def test_prompts_from_other_comfyui_clients_count_toward_the_queue(scheduler, monkeypatch):
+    control = AdmissionController(LIMITS)
+    node = SimpleNamespace(queue_depth=3, in_flight=set())
+    monkeypatch.setattr(admission_module.comfyui_pool, "healthy_nodes", lambda: [node])
+
+    with pytest.raises(AdmissionRejected, match="queue is full"):
+        control.check("alice")
+    # Bulk work is bounded by its own limits
+    control.check("alice", 5, priority="bulk")
+
+
+def test_request_larger_than_the_client_limit_is_invalid(scheduler):
+    with pytest.raises(ValueError, match="split it up"):
+        AdmissionController(LIMITS).check("alice", 11, priority="bulk")
+
+
+def test_batches_count_their_remaining_images_while_running(scheduler):
+    control = AdmissionController(LIMITS)
+
+    async def scenario():
+        remaining = SimpleNamespace(images=8)
+        task = asyncio.create_task(asyncio.Event().wait())
+        control.track("batch-1", "alice", "bulk", lambda: remaining.images, task)
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            control.check("alice", 3, priority="bulk")
+        assert 1 <= rejected.value.retry_after <= MAX_RETRY_AFTER
+
+        remaining.images = 7
+        control.check("alice", 3, priority="bulk")
+
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert control.outstanding("bulk") == {}
+
+    asyncio.run(scenario())
+
+
+def test_rejection_is_a_429_with_retry_after(scheduler, monkeypatch):
+    monkeypatch.setattr(generation_api, "admission_control", AdmissionController(LIMITS))
+    _pending(scheduler, "alice", 2)
+
+    with pytest.raises(HTTPException) as rejected:
+        generation_api._admit("alice")
+    assert rejected.value.status_code == 429
+    assert int(rejected.value.headers["Retry-After"]) >= 1
+
+    with pytest.raises(HTTPException) as invalid:
+        generation_api._admit("alice", 3)
+    assert invalid.value.status_code == 422
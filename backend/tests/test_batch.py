@@ -0,0 +1,53 @@
+"""
+Batch planning tests
+Traceability: FUN-BATCH-GEN
+"""
+from app.services.batch import MAX_COLLAPSED_BATCH_SIZE, plan_batch
+
+
+def _indexes(entries):
+    return [index for entry in entries for index in entry["indexes"]]
+
+
+def test_incremental_seeds_follow_base_seed():
+    entries = plan_batch({"batch_count": 3, "seed_mode": "incremental", "base_seed": 2**32 - 2})
+
+    assert [entry["seed"] for entry in entries] == [2**32 - 2, 2**32 - 1, 0]
+    assert [entry["batch_size"] for entry in entries] == [1, 1, 1]
+    assert _indexes(entries) == [0, 1, 2]
+
+
+def test_fixed_seed_is_shared():
+    entries = plan_batch({"batch_count": 4, "seed_mode": "fixed", "base_seed": 42})
+
+    assert {entry["seed"] for entry in entries} == {42}
+
+
+def test_random_base_seed_is_drawn_when_unset():
+    entries = plan_batch({"batch_count": 2, "seed_mode": "incremental", "base_seed": -1})
+
+    assert entries[1]["seed"] == (entries[0]["seed"] + 1) % 2**32
+
+
+def test_collapse_chunks_incremental_batches():
+    count = MAX_COLLAPSED_BATCH_SIZE + 2
+    entries = plan_batch({"batch_count": count, "seed_mode": "incremental", "base_seed": 10}, collapse=True)
+
+    assert [entry["batch_size"] for entry in entries] == [MAX_COLLAPSED_BATCH_SIZE, 2]
+    assert [entry["seed"] for entry in entries] == [10, 10 + MAX_COLLAPSED_BATCH_SIZE]
+    assert _indexes(entries) == list(range(count))
+
+
+def test_collapse_keeps_fixed_seed_batches_apart():
+    entries = plan_batch({"batch_count": 3, "seed_mode": "fixed", "base_seed": 7}, collapse=True)
+
+    assert [entry["batch_size"] for entry in entries] == [1, 1, 1]
+    assert {entry["seed"] for entry in entries} == {7}
+
+
+def test_collapse_covers_random_batches():
+    count = MAX_COLLAPSED_BATCH_SIZE * 2
+    entries = plan_batch({"batch_count": count, "seed_mode": "random", "base_seed": 7}, collapse=True)
+
+    assert len(entries) == 2
+    assert _indexes(entries) == list(range(count))
@@ -0,0 +1,177 @@
+"""
+Cancellation tests
+Traceability: FUN-GEN-REQUEST-008, FUN-BATCH-GEN
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.api import generation as generation_api
+from app.services.job_store import generation_record, job_store
+from app.services.pool import ComfyUINode
+from app.services.progress import job_tracker
+from app.services.result_cache import ResultCache
+from app.services.scheduler import GenerationScheduler
+
+WORKFLOW = {"4": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "sd15.safetensors"}}}
+
+
+class FakeService:
+    """ComfyUI queue holding `running` and `queued` prompt ids; None from get_queue when `down`"""
+
+    def __init__(self):
+        self.base_url = "http://comfyui.test"
+        self.running = set()
+        self.queued = set()
+        self.down = False
+        self.interrupted = []
+
+    async def delete_queued(self, prompt_ids):
+        self.queued.difference_update(prompt_ids)
+        return True
+
+    async def get_queue(self):
+        if self.down:
+            return None
+        return {
+            "queue_running": [[0, prompt_id] for prompt_id in self.running],
+            "queue_pending": [[1, prompt_id] for prompt_id in self.queued]
+        }
+
+    async def interrupt(self, prompt_id=None):
+        self.interrupted.append(prompt_id)
+        return True
+
+
+@pytest.fixture
+def node():
+    return ComfyUINode(FakeService(), SimpleNamespace(client_id="test-client", connected=True))
+
+
+async def _scheduler_with(group=None):
+    """Scheduler holding one pending job (dispatch stopped)"""
+    scheduler = GenerationScheduler()
+    request_id = scheduler.enqueue(WORKFLOW, group=group)
+    await scheduler.stop()
+    job_store.put(request_id, generation_record("txt2img_basic", "queued"))
+    return scheduler, request_id
+
+
+def _in_flight(scheduler, request_id, node):
+    job = next(job for job in scheduler.pending if job["request_id"] == request_id)
+    scheduler.pending.remove(job)
+    job["node"] = node
+    scheduler.in_flight[request_id] = job
+
+
+def test_pending_job_is_dropped_before_reaching_comfyui():
+    async def scenario():
+        scheduler, request_id = await _scheduler_with()
+
+        assert await scheduler.cancel(request_id) == "pending"
+        assert scheduler.pending == []
+        assert job_tracker.get(request_id)["status"] == "cancelled"
+        assert job_store.get(request_id)["status"] == "cancelled"
+
+    asyncio.run(scenario())
+
+
+def test_job_waiting_in_comfyui_queue_is_deleted(node):
+    async def scenario():
+        scheduler, request_id = await _scheduler_with()
+        _in_flight(scheduler, request_id, node)
+        node.service.queued.add(request_id)
+
+        assert await scheduler.cancel(request_id) == "queued"
+        assert node.service.queued == set()
+        assert node.service.interrupted == []
+        assert job_tracker.get(request_id)["status"] == "cancelled"
+
+    asyncio.run(scenario())
+
+
+def test_running_job_is_interrupted(node):
+    async def scenario():
+        scheduler, request_id = await _scheduler_with()
+        _in_flight(scheduler, request_id, node)
+        node.service.running.add(request_id)
+
+        assert await scheduler.cancel(request_id) == "interrupted"
+        assert node.service.interrupted == [request_id]
+        # ComfyUI's execution_interrupted event settles the job
+        assert job_tracker.get(request_id)["status"] == "queued"
+
+    asyncio.run(scenario())
+
+
+def test_job_on_an_unreachable_instance_is_not_cancelled(node):
+    async def scenario():
+        scheduler, request_id = await _scheduler_with()
+        _in_flight(scheduler, request_id, node)
+        node.service.down = True
+
+        assert await scheduler.cancel(request_id) is None
+        assert await scheduler.cancel("unknown") is None
+
+    asyncio.run(scenario())
+
+
+def test_job_being_submitted_is_cancelled_once_submission_settles():
+    async def scenario():
+        scheduler, request_id = await _scheduler_with()
+        job = scheduler.pending.pop()
+        scheduler._dispatching = job
+
+        assert await scheduler.cancel(request_id) == "pending"
+        assert job["cancel"]
+
+    asyncio.run(scenario())
+
+
+def test_cancel_group_stops_only_that_batch():
+    async def scenario():
+        scheduler, first = await _scheduler_with(group="batch-1")
+        second = scheduler.enqueue(WORKFLOW, group="batch-1")
+        other = scheduler.enqueue(WORKFLOW, group="batch-2")
+        await scheduler.stop()
+
+        assert await scheduler.cancel_group("batch-1") == 2
+        assert [job["request_id"] for job in scheduler.pending] == [other]
+        assert job_tracker.get(first)["status"] == job_tracker.get(second)["status"] == "cancelled"
+
+    asyncio.run(scenario())
+
+
+def test_shared_job_is_cancelled_by_its_last_requester(monkeypatch):
+    async def scenario():
+        scheduler, request_id = await _scheduler_with()
+        cache = ResultCache()
+        cache._inflight["key"] = request_id
+        cache._holders[request_id] = 1
+        # An identical request joins the job
+        assert cache.inflight("key") == request_id
+        monkeypatch.setattr(generation_api, "result_cache", cache)
+        monkeypatch.setattr(generation_api, "generation_scheduler", scheduler)
+
+        assert await generation_api._cancel_request(request_id) == "detached"
+        assert job_tracker.get(request_id)["status"] == "queued"
+        assert await generation_api._cancel_request(request_id) == "pending"
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("followed_again, cancelled", [(False, True), (True, False)])
+def test_abandoned_work_is_cancelled_after_the_grace_period(monkeypatch, followed_again, cancelled):
+    monkeypatch.setattr(generation_api, "ABANDONED_JOB_GRACE", 0)
+    calls = []
+
+    async def cancel():
+        calls.append(True)
+
+    async def scenario():
+        generation_api._cancel_when_abandoned(lambda: followed_again, cancel)
+        await asyncio.gather(*generation_api.abandon_tasks)
+
+    asyncio.run(scenario())
+    assert bool(calls) == cancelled
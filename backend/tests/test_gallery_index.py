@@ -0,0 +1,186 @@
+"""
+Gallery index and search query tests
+Traceability: FUN-GALLERY-VIEW
+"""
+import json
+import os
+import sqlite3
+
+import pytest
+
+from app.services import gallery_index as gallery_index_module
+from app.services.gallery_index import GalleryIndex, fts_query
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("red car", '"red" "car"'),
+    ("cat*", '"cat"*'),
+    ('"red car" night', '"red car" "night"'),
+    ('sunset "golden  hour"', '"sunset" "golden hour"'),
+    ("AND OR NOT", '"AND" "OR" "NOT"'),
+    ("title:cat (dog)", '"title:cat" "(dog)"'),
+    ('open "quote', '"open" "quote"'),
+    ("**", None),
+    ('"" ', None),
+    ("", None),
+])
+def test_fts_query(text, expected):
+    assert fts_query(text) == expected
+
+
+@pytest.mark.parametrize("text, matches", [
+    ("red", ["a red car at night", "red sunset"]),
+    ("car night", ["a red car at night"]),
+    ('"red sunset"', ["red sunset"]),
+    ("sun*", ["red sunset"]),
+    ("NOT red", []),
+    ("col:umn - (x", []),
+])
+def test_queries_are_valid_fts5(text, matches):
+    db = sqlite3.connect(":memory:")
+    db.execute("CREATE VIRTUAL TABLE docs USING fts5(prompt)")
+    db.executemany("INSERT INTO docs VALUES (?)", [("a red car at night",), ("red sunset",), ("blue sky",)])
+
+    rows = db.execute("SELECT prompt FROM docs WHERE docs MATCH ? ORDER BY rowid", (fts_query(text),))
+    assert [row[0] for row in rows] == matches
+
+
+def _image(gallery, folder, stem, prompt, mtime):
+    """A run-folder PNG with a JSON sidecar, both dated `mtime`"""
+    run_dir = gallery / folder
+    run_dir.mkdir(exist_ok=True)
+    image_file = run_dir / f"{stem}.png"
+    image_file.write_bytes(b"png")
+    sidecar = image_file.with_suffix(".json")
+    sidecar.write_text(json.dumps({"prompt": prompt}))
+    for path in (sidecar, image_file):
+        os.utime(path, (mtime, mtime))
+    return image_file
+
+
+@pytest.fixture
+def gallery(tmp_path):
+    return tmp_path / "gallery"
+
+
+@pytest.fixture
+def index(gallery):
+    gallery.mkdir()
+    index = GalleryIndex(gallery, refresh_interval=0, full_rescan_interval=3600)
+    yield index
+    index.conn.close()
+
+
+def test_refresh_indexes_new_and_removed_images(gallery, index):
+    _image(gallery, "run1", "image_000", "a cat", 1000)
+    assert [row["prompt"] for row in index.iter_rows()] == ["a cat"]
+
+    _image(gallery, "run1", "image_001", "a dog", 2000)
+    (gallery / "run1" / "image_000.png").unlink()
+
+    assert [row["prompt"] for row in index.iter_rows()] == ["a dog"]
+
+
+def test_full_rescan_picks_up_sidecars_rewritten_in_place(gallery, index):
+    image_file = _image(gallery, "run1", "image_000", "a cat", 1000)
+    index.ensure_fresh()
+    run_stat = os.stat(gallery / "run1")
+
+    sidecar = image_file.with_suffix(".json")
+    sidecar.write_text(json.dumps({"prompt": "a dog"}))
+    os.utime(sidecar, (2000, 2000))
+    # Rewriting a file in place leaves its folder's mtime alone
+    os.utime(gallery / "run1", ns=(run_stat.st_atime_ns, run_stat.st_mtime_ns))
+    assert [row["prompt"] for row in index.iter_rows()] == ["a cat"]
+
+    index.full_rescan_interval = 0
+    assert [row["prompt"] for row in index.iter_rows()] == ["a dog"]
+
+
+def test_keyset_pagination_visits_every_row_once(gallery, index):
+    for number in range(5):
+        _image(gallery, "run1", f"image_{number:03d}", f"frame {number}", 1000 + number // 2)
+
+    pages = []
+    after = None
+    while True:
+        page = list(index.iter_rows(after=after, limit=2))
+        if not page:
+            break
+        pages.append([row["prompt"] for row in page])
+        after = (page[-1]["mtime"], page[-1]["path"])
+
+    assert pages == [["frame 4", "frame 3"], ["frame 2", "frame 1"], ["frame 0"]]
+
+
+def test_repeated_stems_get_folder_qualified_ids(gallery, index):
+    first = _image(gallery, "run1", "image_000", "a cat", 1000)
+    index.ensure_fresh()
+    revision = index.revision()
+
+    second = _image(gallery, "run2", "image_000", "a dog", 2000)
+
+    assert sorted(row["image_id"] for row in index.iter_rows()) == ["run1~image_000", "run2~image_000"]
+    assert index.resolve("run1~image_000") == [first]
+    assert sorted(index.resolve("image_000")) == [first, second]
+    # The existing image keeps its id: the feed only reports the new one
+    delta = index.changes(revision)
+    assert [row["image_id"] for row in delta["added"]] == ["run2~image_000"]
+    assert delta["updated"] == [] and delta["removed"] == []
+
+
+def test_change_feed_reports_each_path_at_its_latest_state(gallery, index):
+    kept = _image(gallery, "run1", "image_000", "a cat", 1000)
+    index.ensure_fresh()
+    revision = index.revision()
+
+    index.add_file(_image(gallery, "run1", "image_001", "a dog", 2000))
+    _image(gallery, "run1", "image_001", "a wolf", 3000)
+    index.ensure_fresh()
+    index.remove_file(kept)
+    kept.unlink()
+
+    delta = index.changes(revision)
+    assert [row["prompt"] for row in delta["added"]] == ["a wolf"]
+    assert delta["updated"] == []
+    assert delta["removed"] == ["run1~image_000"]
+    assert index.changes(delta["revision"])["added"] == []
+
+
+def test_change_feed_is_paged(gallery, index):
+    revision = index.revision()
+    for number in range(3):
+        _image(gallery, "run1", f"image_{number:03d}", f"frame {number}", 1000 + number)
+
+    first = index.changes(revision, limit=2)
+    rest = index.changes(first["revision"], limit=2)
+
+    assert first["more"] and not rest["more"]
+    assert len(first["added"]) == 2 and len(rest["added"]) == 1
+
+
+def test_clients_behind_pruned_tombstones_must_reload(gallery, index, monkeypatch):
+    monkeypatch.setattr(gallery_index_module, "MAX_TOMBSTONES", 1)
+    images = [_image(gallery, "run1", f"image_{number:03d}", "x", 1000) for number in range(3)]
+    index.ensure_fresh()
+    revision = index.revision()
+
+    index.remove_files(images[:2])
+
+    assert index.changes(revision)["reset"]
+    latest = index.changes(index.revision() - 1)
+    assert not latest["reset"] and latest["removed"] == ["run1~image_001"]
+
+
+def test_feed_resets_when_the_index_is_rebuilt(gallery, index):
+    _image(gallery, "run1", "image_000", "a cat", 1000)
+    revision = index.revision()
+    index.conn.execute("PRAGMA user_version = 0")
+    index.conn.close()
+
+    rebuilt = GalleryIndex(gallery, refresh_interval=0)
+    try:
+        assert rebuilt.changes(revision)["reset"]
+        assert [row["image_id"] for row in rebuilt.iter_rows()] == ["run1~image_000"]
+    finally:
+        rebuilt.conn.close()
@@ -0,0 +1,74 @@
+"""
+HTTP caching helper tests
+Traceability: STK-BACKEND-019, STK-BACKEND-020
+"""
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.api.http_cache import http_date, is_not_modified, parse_range
+
+ETAG = '"abc123"'
+MTIME = 1_700_000_000
+
+
+def _request(**headers) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]
+    })
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes=990-5000", (990, 999)),
+    (" bytes = 1-2", (1, 2)),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["items=0-10", "bytes=0-10,20-30", "bytes=a-b", "bytes=-0", "bytes=-"])
+def test_unsupported_ranges_get_the_full_body(header):
+    assert parse_range(header, 1000) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=50-10"])
+def test_unsatisfiable_range(header):
+    with pytest.raises(HTTPException) as raised:
+        parse_range(header, 1000)
+    assert raised.value.status_code == 416
+    assert raised.value.headers["Content-Range"] == "bytes */1000"
+
+
+@pytest.mark.parametrize("if_none_match, expected", [
+    (ETAG, True),
+    (f'"other", {ETAG}', True),
+    (f"W/{ETAG}", True),
+    ("*", True),
+    ('"other"', False),
+])
+def test_if_none_match(if_none_match, expected):
+    assert is_not_modified(_request(if_none_match=if_none_match), ETAG, MTIME) is expected
+
+
+def test_if_modified_since():
+    assert is_not_modified(_request(if_modified_since=http_date(MTIME)), ETAG, MTIME + 0.5)
+    assert not is_not_modified(_request(if_modified_since=http_date(MTIME - 1)), ETAG, MTIME)
+    assert not is_not_modified(_request(if_modified_since="not a date"), ETAG, MTIME)
+    assert not is_not_modified(_request(if_modified_since=http_date(MTIME)), ETAG)
+
+
+def test_if_none_match_takes_precedence():
+    request = _request(if_none_match='"other"', if_modified_since=http_date(MTIME))
+
+    assert not is_not_modified(request, ETAG, MTIME)
+
+
+def test_no_validators():
+    assert not is_not_modified(_request(), ETAG, MTIME)
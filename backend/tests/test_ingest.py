@@ -0,0 +1,67 @@
+"""
+Gallery ingest tests
+Traceability: FUN-GALLERY-VIEW-001, FUN-GEN-REQUEST-015
+"""
+import asyncio
+
+import pytest
+
+from app.services import ingest as ingest_module
+from app.services.ingest import GalleryIngester
+
+
+class FakeOutputCache:
+    """Blobs named after their digest; `evict` lists digests that vanish before the first copy"""
+
+    def __init__(self, blob_dir):
+        self.blob_dir = blob_dir
+        self.evict = set()
+        self.discarded = []
+
+    async def get(self, filename, instance=None, subfolder=""):
+        digest = f"{filename}-{len(self.discarded)}"
+        if digest not in self.evict:
+            (self.blob_dir / digest).write_bytes(filename.encode())
+        return digest
+
+    def blob_path(self, digest):
+        return self.blob_dir / digest
+
+    def discard(self, digest):
+        self.discarded.append(digest)
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    (tmp_path / "blobs").mkdir()
+    cache = FakeOutputCache(tmp_path / "blobs")
+    monkeypatch.setattr(ingest_module, "output_cache", cache)
+    monkeypatch.setattr(ingest_module, "build_metadata", lambda job, image, index: {"batch_index": index})
+    monkeypatch.setattr(ingest_module.gallery_index, "add_file", lambda image_file: None)
+    monkeypatch.setattr(ingest_module.thumbnail_service, "prewarm", lambda image_file: None)
+    return cache
+
+
+def _ingest(gallery, filenames):
+    job = {"request_id": "abcdef0123456789"}
+    result = {"images": [{"filename": filename} for filename in filenames]}
+    asyncio.run(GalleryIngester(gallery, enabled=True).ingest(job, result))
+    return sorted(path.name for path in gallery.glob("*/*"))
+
+
+def test_evicted_blob_is_fetched_again(tmp_path, cache):
+    cache.evict.add("a.png-0")
+
+    written = _ingest(tmp_path / "gallery", ["a.png", "b.png"])
+
+    assert cache.discarded == ["a.png-0"]
+    assert written == ["abcdef01_000.json", "abcdef01_000.png", "abcdef01_001.json", "abcdef01_001.png"]
+
+
+def test_image_whose_blob_stays_missing_is_skipped(tmp_path, cache):
+    cache.evict.update({"a.png-0", "a.png-1"})
+
+    written = _ingest(tmp_path / "gallery", ["a.png", "b.png"])
+
+    # No sidecar without its image; the rest of the job still lands
+    assert written == ["abcdef01_001.json", "abcdef01_001.png"]
@@ -0,0 +1,143 @@
+"""
+Job store tests, run against both backends
+Traceability: FUN-GEN-REQUEST-010, FUN-GEN-REQUEST-011, FUN-BATCH-GEN
+"""
+import asyncio
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from app.services.job_store import MemoryJobStore, SQLiteJobStore, create_job_store, generation_record
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        store = MemoryJobStore(ttl=60, max_records=3)
+    else:
+        store = SQLiteJobStore(tmp_path / "jobs.db", ttl=60, max_records=3)
+    yield store
+    store.close()
+
+
+def _age(store, job_id, seconds):
+    """Pretend a record was last updated `seconds` ago"""
+    if isinstance(store, MemoryJobStore):
+        store._updated[job_id] -= seconds
+    else:
+        store.conn.execute("UPDATE jobs SET updated_at = updated_at - ? WHERE id = ?", (seconds, job_id))
+
+
+def test_put_get_and_update(store):
+    store.put("a", generation_record("txt2img_basic", "queued"))
+
+    updated = store.update("a", status="completed", images=[{"filename": "a.png"}])
+
+    assert updated["status"] == "completed"
+    assert store.get("a")["images"] == [{"filename": "a.png"}]
+    assert store.get("a")["preset"] == "txt2img_basic"
+    assert store.update("missing", status="failed") is None
+    assert store.get("missing") is None
+
+
+def test_records_are_copies(store):
+    record = {"status": "queued", "frames": [{"status": "pending"}]}
+    store.put("a", record)
+    record["frames"][0]["status"] = "completed"
+
+    fetched = store.get("a")
+    fetched["frames"][0]["status"] = "failed"
+    store.update("a", status="generating")["frames"].append({})
+
+    assert store.get("a")["frames"] == [{"status": "pending"}]
+
+
+def test_purge_drops_only_expired_finished_records(store):
+    store.put("old-done", {"status": "completed"})
+    store.put("old-running", {"status": "generating"})
+    store.put("new-done", {"status": "failed"})
+    _age(store, "old-done", 120)
+    _age(store, "old-running", 120)
+
+    assert store.purge() == 1
+    assert store.get("old-done") is None
+    assert store.get("old-running") is not None
+    assert store.get("new-done") is not None
+
+
+def test_record_count_is_bounded(store):
+    store.put("running", {"status": "generating"})
+    for number in range(4):
+        store.put(f"done-{number}", {"status": "completed"})
+        # Distinct update times for the SQLite ordering
+        _age(store, f"done-{number}", 10 - number)
+    store.purge()
+
+    assert store.get("running") is not None
+    assert store.get("done-0") is None
+    assert store.get("done-3") is not None
+
+
+def test_async_variants_match_the_sync_calls(store):
+    async def scenario():
+        record = {"status": "queued", "images": []}
+        await store.put_async("a", record)
+        # Changes after the call are not stored, even while a thread writes
+        record["images"].append("late")
+        assert (await store.update_async("a", status="completed"))["status"] == "completed"
+        return await store.get_async("a")
+
+    assert asyncio.run(scenario()) == {"status": "completed", "images": []}
+
+
+def test_sqlite_records_are_shared_between_workers(tmp_path):
+    first = SQLiteJobStore(tmp_path / "jobs.db")
+    second = SQLiteJobStore(tmp_path / "jobs.db")
+    try:
+        first.put("a", {"status": "queued"})
+        second.update("a", status="completed")
+        assert first.get("a")["status"] == "completed"
+    finally:
+        first.close()
+        second.close()
+
+
+def test_sqlite_calls_wait_in_a_thread_while_another_worker_writes(tmp_path):
+    store = SQLiteJobStore(tmp_path / "jobs.db")
+    store.put("a", {"status": "queued"})
+    # Another worker holds the write lock for a moment
+    other = sqlite3.connect(str(tmp_path / "jobs.db"), isolation_level=None, check_same_thread=False)
+    other.execute("BEGIN IMMEDIATE")
+    threading.Timer(0.3, other.execute, ("COMMIT",)).start()
+
+    async def scenario():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        started = time.monotonic()
+        await store.update_async("a", status="completed")
+        waited = time.monotonic() - started
+        ticker.cancel()
+        return waited, ticks
+
+    try:
+        waited, ticks = asyncio.run(scenario())
+        assert waited >= 0.2
+        # The event loop kept running while the update waited for the lock
+        assert ticks >= 10
+        assert store.get("a")["status"] == "completed"
+    finally:
+        other.close()
+        store.close()
+
+
+def test_unknown_kind_falls_back_to_memory():
+    assert isinstance(create_job_store("redis"), MemoryJobStore)
@@ -0,0 +1,115 @@
+"""
+Workflow validation tests
+Traceability: FUN-GEN-REQUEST-007, STK-INTEGRATION-015
+"""
+import pytest
+
+from app.services.node_schema import _check_input, validate_workflow
+
+CHECKPOINTS = ["base/sd_xl_base_1.0.safetensors", "sd15.safetensors"]
+
+SCHEMA = {
+    "CheckpointLoaderSimple": {
+        "input": {"required": {"ckpt_name": [CHECKPOINTS]}},
+        "output": ["MODEL", "CLIP", "VAE"],
+        "output_node": False
+    },
+    "KSampler": {
+        "input": {
+            "required": {
+                "model": ["MODEL"],
+                "seed": ["INT", {"min": 0, "max": 2**64 - 1}],
+                "cfg": ["FLOAT", {"min": 0.0, "max": 100.0}],
+                "sampler_name": ["COMBO", {"options": ["euler", "dpmpp_2m"]}]
+            },
+            "optional": {"denoise": ["FLOAT", {"min": 0.0, "max": 1.0}]}
+        },
+        "output": ["LATENT"],
+        "output_node": False
+    },
+    "SaveImage": {
+        "input": {"required": {"images": ["IMAGE"], "filename_prefix": ["STRING", {}]}},
+        "output": [],
+        "output_node": True
+    }
+}
+
+WORKFLOW = {
+    "1": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": CHECKPOINTS[0]}},
+    "2": {
+        "class_type": "KSampler",
+        "inputs": {"model": ["1", 0], "seed": 5, "cfg": 7, "sampler_name": "euler"}
+    }
+}
+
+
+@pytest.mark.parametrize("value, spec", [
+    (CHECKPOINTS[1], [CHECKPOINTS]),
+    ("euler", ["COMBO", {"options": ["euler", "dpmpp_2m"]}]),
+    ("anything", ["COMBO", {}]),
+    ("upload.png", [["a.png"], {"image_upload": True}]),
+    (3, ["INT", {"min": 0, "max": 10}]),
+    (2.5, ["FLOAT", {"min": 0.0, "max": 10.0}]),
+    (3, ["FLOAT", {}]),
+    ("text", ["STRING", {"multiline": True}]),
+    (False, ["BOOLEAN", {}]),
+    ({"custom": 1}, ["MY_WIDGET", {}]),
+])
+def test_valid_inputs(value, spec):
+    assert _check_input(WORKFLOW, SCHEMA, value, spec) is None
+
+
+@pytest.mark.parametrize("value, spec, message", [
+    ("missing.safetensors", [CHECKPOINTS], "is not one of the available values"),
+    ("heun", ["COMBO", {"options": ["euler", "dpmpp_2m"]}], "is not one of the available values"),
+    (7, [["a.png"], {"image_upload": True}], "Expected a file name"),
+    (True, ["INT", {}], "Expected an integer"),
+    (1.5, ["INT", {}], "Expected an integer"),
+    (11, ["INT", {"min": 0, "max": 10}], "above the maximum"),
+    (-1.0, ["FLOAT", {"min": 0.0}], "below the minimum"),
+    ("7", ["FLOAT", {}], "Expected a number"),
+    (3, ["STRING", {}], "Expected a string"),
+    ("yes", ["BOOLEAN", {}], "Expected true or false"),
+])
+def test_invalid_inputs(value, spec, message):
+    assert message in _check_input(WORKFLOW, SCHEMA, value, spec)
+
+
+@pytest.mark.parametrize("link, spec, message", [
+    (["1", 0], ["MODEL"], None),
+    (["1", 1], ["CLIP,MODEL"], None),
+    (["1", 2], ["*"], None),
+    (["1", 0], ["COMBO", {"options": ["euler"]}], None),
+    (["1", 1], ["MODEL"], "Expected a MODEL link"),
+    (["1", 3], ["MODEL"], "has no output 3"),
+    (["9", 0], ["MODEL"], "Linked node 9 does not exist"),
+])
+def test_links(link, spec, message):
+    error = _check_input(WORKFLOW, SCHEMA, link, spec)
+    assert error is None if message is None else message in error
+
+
+def test_validate_workflow_reports_each_error():
+    workflow = {
+        "1": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "gone.safetensors"}},
+        "2": {"class_type": "KSampler", "inputs": {"model": ["1", 0], "seed": -1, "cfg": 7, "denoise": 2.0}},
+        "3": {"class_type": "SaveImage", "inputs": {"images": ["2", 0], "filename_prefix": "out"}},
+        "4": {"class_type": "UnknownCustomNode", "inputs": {}}
+    }
+    errors = {(error.node_id, error.input): error for error in validate_workflow(workflow, SCHEMA)}
+
+    assert set(errors) == {
+        ("1", "ckpt_name"), ("2", "seed"), ("2", "sampler_name"), ("2", "denoise"), ("3", "images")
+    }
+    # Only enum misses may be down to an outdated schema
+    assert errors[("1", "ckpt_name")].schema_dependent
+    assert not errors[("2", "seed")].schema_dependent
+    assert errors[("2", "sampler_name")].message == "Required input is missing"
+
+
+def test_unknown_node_type_and_missing_output_node():
+    errors = validate_workflow({"1": {"class_type": "Gone", "inputs": {}}}, {"Gone": None})
+    assert [(error.message, error.schema_dependent) for error in errors] == [("Unknown node type Gone", True)]
+
+    errors = validate_workflow({"1": WORKFLOW["1"]}, SCHEMA)
+    assert [error.message for error in errors] == ["Workflow has no output node"]
@@ -0,0 +1,99 @@
+"""
+Output cache tests
+Traceability: FUN-GEN-REQUEST-015, STK-BACKEND-019
+"""
+import asyncio
+import hashlib
+
+import pytest
+
+from app.services import output_cache as output_cache_module
+from app.services.output_cache import NAMES_FILE, OutputCache, output_url
+
+
+class FakeService:
+    """Serves every filename with its name (prefixed by the instance id) as content"""
+
+    def __init__(self, instance_id: str = "a"):
+        self.instance_id = instance_id
+        self.downloads = 0
+        self.fail = False
+
+    async def download_image_to(self, filename: str, destination: str, subfolder: str = ""):
+        self.downloads += 1
+        if self.fail:
+            raise RuntimeError("instance unreachable")
+        content = f"{self.instance_id}/{subfolder}/{filename}".encode()
+        with open(destination, "wb") as f:
+            f.write(content)
+        return hashlib.sha256(content).hexdigest()
+
+
+@pytest.fixture
+def service(monkeypatch):
+    service = FakeService()
+    monkeypatch.setattr(output_cache_module.comfyui_pool, "services_for_output", lambda instance: [service])
+    return service
+
+
+def test_names_survive_a_restart(tmp_path, service):
+    digest = asyncio.run(OutputCache(tmp_path).get("a.png"))
+
+    assert asyncio.run(OutputCache(tmp_path).get("a.png")) == digest
+    assert service.downloads == 1
+    assert (tmp_path / NAMES_FILE).read_text() == f"a.png\t{digest}\n"
+
+
+def test_evicted_names_are_not_reloaded(tmp_path, service):
+    cache = OutputCache(tmp_path, max_bytes=len("a.png"))
+    asyncio.run(cache.get("a.png"))
+    asyncio.run(cache.get("b.png"))
+
+    reloaded = OutputCache(tmp_path)
+    reloaded._load()
+    assert list(reloaded._names) == ["b.png"]
+
+
+def test_discarded_blob_is_downloaded_again(tmp_path, service):
+    cache = OutputCache(tmp_path)
+    digest = asyncio.run(cache.get("a.png"))
+    cache.blob_path(digest).unlink()
+    cache.discard(digest)
+
+    assert asyncio.run(cache.get("a.png")) == digest
+    assert service.downloads == 2
+    assert cache.blob_path(digest).exists()
+
+
+def test_failed_download_raises_and_is_not_remembered(tmp_path, service):
+    service.fail = True
+    cache = OutputCache(tmp_path)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(cache.get("a.png"))
+    assert cache._inflight == {}
+    assert "a.png" not in cache._names
+
+
+def test_instances_numbering_files_alike_get_separate_entries(tmp_path, monkeypatch):
+    services = {"a": FakeService("a"), "b": FakeService("b")}
+    monkeypatch.setattr(
+        output_cache_module.comfyui_pool, "services_for_output", lambda instance: [services[instance]]
+    )
+    cache = OutputCache(tmp_path)
+
+    first = asyncio.run(cache.get("ComfyUI_00001_.png", "a"))
+    second = asyncio.run(cache.get("ComfyUI_00001_.png", "b"))
+
+    assert first != second
+    assert cache.blob_path(second).read_bytes() == b"b//ComfyUI_00001_.png"
+    assert asyncio.run(cache.get("ComfyUI_00001_.png", "a")) == first
+    assert services["a"].downloads == 1
+
+
+def test_output_url_names_the_instance():
+    url = "/api/generate/image/x.png"
+
+    assert output_url({"filename": "x.png", "subfolder": "", "instance": "abc"}) == f"{url}?instance=abc"
+    assert output_url({"filename": "x.png", "subfolder": "day 1"}) == f"{url}?subfolder=day+1"
+    assert output_url({"filename": "x.png"}) == url
@@ -0,0 +1,73 @@
+"""
+Job wait tests
+Traceability: FUN-GEN-REQUEST-011 to FUN-GEN-REQUEST-014
+"""
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+from app.services.progress import job_tracker, wait_for_job
+
+
+class FakeService:
+    """ComfyUI instance that is down (None answers) or up without knowing any job"""
+
+    def __init__(self, up: bool):
+        self.base_url = "http://comfyui.test"
+        self.up = up
+
+    async def get_generation_status(self, prompt_id):
+        return {} if self.up else None
+
+    async def get_queue(self):
+        return {"queue_running": [], "queue_pending": []} if self.up else None
+
+
+def test_job_fails_once_its_instance_stays_unreachable():
+    listener = SimpleNamespace(service=FakeService(up=False), connected=False, connects=1)
+    prompt_id = str(uuid.uuid4())
+
+    job = asyncio.run(
+        wait_for_job(prompt_id, locate=lambda _: listener, poll_interval=0.01, lost_timeout=0.05)
+    )
+
+    assert job["status"] == "failed"
+    assert "unreachable" in job["error"]
+
+
+def test_job_fails_when_a_restarted_instance_lost_it():
+    listener = SimpleNamespace(service=FakeService(up=True), connected=True, connects=1)
+    prompt_id = str(uuid.uuid4())
+
+    async def restart():
+        await asyncio.sleep(0.03)
+        listener.connects += 1
+
+    async def scenario():
+        restarting = asyncio.create_task(restart())
+        job = await wait_for_job(prompt_id, locate=lambda _: listener, poll_interval=0.01)
+        await restarting
+        return job
+
+    job = asyncio.run(scenario())
+    assert job["status"] == "failed"
+    assert "restarted" in job["error"]
+
+
+def test_job_survives_a_brief_disconnect():
+    listener = SimpleNamespace(service=FakeService(up=False), connected=False, connects=1)
+    prompt_id = str(uuid.uuid4())
+
+    async def recover():
+        await asyncio.sleep(0.03)
+        listener.service.up = True
+        await asyncio.sleep(0.03)
+        job_tracker.complete(prompt_id, [{"filename": "ComfyUI_00001_.png"}])
+
+    async def scenario():
+        recovering = asyncio.create_task(recover())
+        job = await wait_for_job(prompt_id, locate=lambda _: listener, poll_interval=0.01, lost_timeout=0.2)
+        await recovering
+        return job
+
+    assert asyncio.run(scenario())["status"] == "completed"
@@ -0,0 +1,103 @@
+"""
+Result cache tests
+Traceability: FUN-GEN-REQUEST-008, FUN-GEN-REQUEST-014
+"""
+import asyncio
+
+import pytest
+
+from app.services import result_cache as result_cache_module
+from app.services.result_cache import ResultCache, workflow_hash
+
+WORKFLOW = {
+    "3": {"class_type": "KSampler", "inputs": {"seed": 1, "steps": 20, "model": ["4", 0]}},
+    "4": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "sd15.safetensors"}}
+}
+
+
+def test_workflow_hash_ignores_key_order():
+    reordered = {
+        "4": {"inputs": {"ckpt_name": "sd15.safetensors"}, "class_type": "CheckpointLoaderSimple"},
+        "3": {"inputs": {"model": ["4", 0], "steps": 20, "seed": 1}, "class_type": "KSampler"}
+    }
+
+    assert workflow_hash(reordered) == workflow_hash(WORKFLOW)
+    assert len(workflow_hash(WORKFLOW)) == 64
+
+
+def test_workflow_hash_changes_with_any_input():
+    changed = {**WORKFLOW, "3": {**WORKFLOW["3"], "inputs": {**WORKFLOW["3"]["inputs"], "seed": 2}}}
+
+    assert workflow_hash(changed) != workflow_hash(WORKFLOW)
+
+
+@pytest.fixture
+def jobs(monkeypatch):
+    """Finishes waited-on jobs when the test sets their result"""
+    results = {}
+
+    async def wait_for_job(request_id):
+        return await results.setdefault(request_id, asyncio.get_running_loop().create_future())
+
+    monkeypatch.setattr(result_cache_module.comfyui_pool, "wait_for_job", wait_for_job)
+    return results
+
+
+def test_identical_workflows_share_a_job_until_it_completes(jobs):
+    async def scenario():
+        cache = ResultCache()
+        key = workflow_hash(WORKFLOW)
+        assert cache.inflight(key) is None
+        cache.begin(key, "job-1")
+        await asyncio.sleep(0)
+
+        assert cache.inflight(key) == "job-1"
+        images = [{"filename": "ComfyUI_00001_.png"}]
+        jobs["job-1"].set_result({"status": "completed", "images": images})
+        await asyncio.sleep(0)
+
+        assert cache.lookup(key) == images
+        assert cache.inflight(key) is None
+
+    asyncio.run(scenario())
+
+
+def test_failed_jobs_are_not_cached(jobs):
+    async def scenario():
+        cache = ResultCache()
+        cache.begin("key", "job-1")
+        await asyncio.sleep(0)
+        jobs["job-1"].set_result({"status": "failed", "images": []})
+        await asyncio.sleep(0)
+
+        assert cache.lookup("key") is None
+        assert cache.inflight("key") is None
+
+    asyncio.run(scenario())
+
+
+def test_shared_job_is_released_by_its_last_holder(jobs):
+    async def scenario():
+        cache = ResultCache()
+        cache.begin("key", "job-1")
+        cache.inflight("key")
+
+        assert not cache.release("job-1")
+        assert cache.release("job-1")
+
+    asyncio.run(scenario())
+
+
+def test_oldest_results_are_dropped(jobs):
+    async def scenario():
+        cache = ResultCache(max_entries=2)
+        for index in range(3):
+            cache.begin(f"key-{index}", f"job-{index}")
+            await asyncio.sleep(0)
+            jobs[f"job-{index}"].set_result({"status": "completed", "images": [{"filename": f"{index}.png"}]})
+            await asyncio.sleep(0)
+
+        assert cache.lookup("key-0") is None
+        assert cache.lookup("key-2") == [{"filename": "2.png"}]
+
+    asyncio.run(scenario())
@@ -0,0 +1,141 @@
+"""
+Generation scheduler dispatch tests
+Traceability: FUN-GEN-REQUEST-008, STK-INTEGRATION-015
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import scheduler as scheduler_module
+from app.services.pool import ComfyUINode
+from app.services.progress import job_tracker
+from app.services.scheduler import GenerationScheduler
+
+WORKFLOW = {"4": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "sd15.safetensors"}}}
+
+
+class FakeService:
+    """Accepts prompts, except those whose request id is in `broken` (raises) or `rejected`"""
+
+    def __init__(self):
+        self.base_url = "http://comfyui.test"
+        self.broken = set()
+        self.rejected = set()
+
+    async def submit_generation(self, workflow, client_id=None, prompt_id=None):
+        if prompt_id in self.broken:
+            raise RuntimeError("malformed response")
+        if prompt_id in self.rejected:
+            return None
+        return {"prompt_id": prompt_id}
+
+
+@pytest.fixture
+def node():
+    node = ComfyUINode(FakeService(), SimpleNamespace(client_id="test-client", connected=True))
+    node.healthy = True
+    return node
+
+
+@pytest.fixture
+def pool(monkeypatch, node):
+    """Single-instance pool whose health probe answers `pool.healthy`"""
+    pool = scheduler_module.comfyui_pool
+    state = SimpleNamespace(healthy=True)
+
+    async def probe(probed):
+        return state.healthy
+
+    async def wait_for_job(request_id):
+        # Jobs stay in flight for the whole test
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(pool, "probe", probe)
+    monkeypatch.setattr(pool, "free_nodes", lambda depth: [node] if len(node.in_flight) < depth else [])
+    monkeypatch.setattr(pool, "wait_for_job", wait_for_job)
+    return state
+
+
+def _pending_job(scheduler, request_id):
+    return next(job for job in scheduler.pending if job["request_id"] == request_id)
+
+
+def test_job_is_held_when_its_instance_went_away(node, pool):
+    async def scenario():
+        scheduler = GenerationScheduler(depth=1)
+        request_id = scheduler.enqueue(WORKFLOW)
+        await scheduler.stop()
+        job = _pending_job(scheduler, request_id)
+        scheduler.pending.remove(job)
+        node.service.rejected.add(request_id)
+        pool.healthy = False
+
+        await scheduler._dispatch(node, job)
+
+        assert scheduler.pending == [job]
+        assert request_id not in scheduler.in_flight
+        assert job_tracker.get(request_id)["status"] == "queued"
+
+    asyncio.run(scenario())
+
+
+def test_job_fails_when_a_healthy_instance_rejects_it(node, pool):
+    async def scenario():
+        scheduler = GenerationScheduler(depth=1)
+        request_id = scheduler.enqueue(WORKFLOW)
+        await scheduler.stop()
+        job = _pending_job(scheduler, request_id)
+        scheduler.pending.remove(job)
+        node.service.rejected.add(request_id)
+
+        await scheduler._dispatch(node, job)
+
+        assert scheduler.pending == []
+        assert job_tracker.get(request_id)["status"] == "failed"
+
+    asyncio.run(scenario())
+
+
+def test_dispatch_error_fails_the_job_and_keeps_dispatching(node, pool):
+    async def scenario():
+        scheduler = GenerationScheduler(depth=2)
+        broken = scheduler.enqueue(WORKFLOW)
+        node.service.broken.add(broken)
+        healthy = scheduler.enqueue(WORKFLOW)
+        for _ in range(100):
+            if healthy in scheduler.in_flight:
+                break
+            await asyncio.sleep(0.01)
+
+        try:
+            assert healthy in scheduler.in_flight
+            assert job_tracker.get(broken)["status"] == "failed"
+            assert "malformed response" in job_tracker.get(broken)["error"]
+            assert scheduler._dispatching is None
+            assert not scheduler._task.done()
+        finally:
+            await scheduler.stop()
+
+    asyncio.run(scenario())
+
+
+def test_wait_projection_is_reused_until_the_queue_changes(node, pool, monkeypatch):
+    async def scenario():
+        scheduler = GenerationScheduler(depth=1)
+        first = scheduler.enqueue(WORKFLOW)
+        await scheduler.stop()
+        projections = []
+        project = scheduler._project_waits
+        monkeypatch.setattr(scheduler, "_project_waits", lambda: projections.append(1) or project())
+
+        assert scheduler.estimated_wait(first) is not None
+        scheduler.estimated_wait(first)
+        assert len(projections) == 1
+
+        second = scheduler.enqueue(WORKFLOW)
+        await scheduler.stop()
+        assert scheduler.estimated_wait(second) > scheduler.estimated_wait(first)
+        assert len(projections) == 2
+
+    asyncio.run(scenario())
@@ -0,0 +1,71 @@
+"""
+Sequence planning tests
+Traceability: FUN-SEQUENCE-GEN
+"""
+import pytest
+
+from app.services.sequence import MAX_SEQUENCE_FRAMES, plan_sequence
+
+MODEL = "base/sd_xl_base_1.0.safetensors"
+
+
+def test_frames_get_prompts_and_incremental_seeds():
+    record = plan_sequence({
+        "model": MODEL,
+        "seed": 100,
+        "prefix": "film still",
+        "suffix": "35mm",
+        "steps": 20,
+        "frames": [
+            {"frame_number": 2, "prompt": "the door opens"},
+            {"frame_number": 1, "prompt": "a dark hallway", "negative_prompt": "people"}
+        ]
+    })
+
+    assert record["type"] == "sequence"
+    assert record["preset"] == "txt2img_basic"
+    assert record["params"] == {"model": MODEL, "steps": 20}
+    assert record["total_frames"] == 2
+    # Sorted by frame number; seeds follow request order
+    assert [frame["frame_number"] for frame in record["frames"]] == [1, 2]
+    assert [frame["seed"] for frame in record["frames"]] == [101, 100]
+    assert record["frames"][0]["prompt"] == "film still, a dark hallway, 35mm"
+    assert record["frames"][0]["negative_prompt"] == "people"
+    assert all(frame["status"] == "pending" for frame in record["frames"])
+
+
+def test_plain_prompt_strings_and_fixed_seed():
+    record = plan_sequence({"model": MODEL, "seed": 5, "seed_mode": "fixed", "frames": ["one", "two"]})
+
+    assert [frame["frame_number"] for frame in record["frames"]] == [1, 2]
+    assert [frame["seed"] for frame in record["frames"]] == [5, 5]
+
+
+def test_lora_selects_lora_preset():
+    record = plan_sequence({"model": MODEL, "lora": "style.safetensors", "frames": ["one"]})
+
+    assert record["preset"] == "txt2img_lora"
+    assert record["params"]["lora"] == "style.safetensors"
+
+
+@pytest.mark.parametrize("request_data, message", [
+    ({"model": MODEL, "frames": []}, "at least one frame"),
+    ({"model": MODEL, "frames": ["x"] * (MAX_SEQUENCE_FRAMES + 1)}, "At most"),
+    ({"frames": ["x"]}, "model"),
+    ({"model": MODEL, "frames": ["x"], "seed_mode": "zigzag"}, "Invalid seed_mode"),
+    ({"model": MODEL, "frames": [{"prompt": ""}]}, "Frame 1 has no prompt"),
+    (
+        {"model": MODEL, "frames": [{"frame_number": 1, "prompt": "a"}, {"frame_number": 1, "prompt": "b"}]},
+        "unique"
+    ),
+    ({"model": MODEL, "frames": "one frame"}, "must be a list"),
+    ({"model": MODEL, "frames": ["x"], "seed": "42"}, "seed must be an integer"),
+    ({"model": MODEL, "frames": [{"prompt": 7}]}, "prompt must be a string"),
+    (
+        {"model": MODEL, "frames": [{"frame_number": 2, "prompt": "a"}, {"frame_number": "1", "prompt": "b"}]},
+        "Frame 2 frame_number must be an integer"
+    ),
+])
+def test_invalid_requests_are_rejected(request_data, message):
+    with pytest.raises(ValueError, match=message):
+        plan_sequence(request_data)
@@ -0,0 +1,62 @@
+"""
+Upload store tests
+Traceability: FUN-GEN-REQUEST-007, STK-INTEGRATION-015
+"""
+import asyncio
+from types import SimpleNamespace
+
+from app.services.uploads import UploadStore
+
+NAME = f"{'a' * 64}.png"
+WORKFLOW = {"10": {"class_type": "LoadImage", "inputs": {"image": NAME}}}
+
+
+class FakeService:
+    """Records every upload pushed to the instance"""
+
+    def __init__(self):
+        self.uploads = []
+
+    async def upload_image(self, path: str, name: str, content_type: str):
+        self.uploads.append(name)
+        return True
+
+
+def _node():
+    return SimpleNamespace(name="gpu-1", service=FakeService(), listener=SimpleNamespace(connects=1))
+
+
+def test_upload_stored_by_another_worker_is_found_on_disk(tmp_path):
+    store = UploadStore(tmp_path)
+    assert store.path(NAME) is None
+
+    # Another worker sharing the folder stores the upload after this one loaded it
+    (tmp_path / NAME).write_bytes(b"png")
+
+    assert store.path(NAME) == tmp_path / NAME
+    assert store._total_bytes == 3
+    assert store.missing(WORKFLOW) == []
+
+
+def test_names_that_are_not_uploads_are_not_looked_up(tmp_path):
+    (tmp_path / "notes.png").write_bytes(b"png")
+
+    assert UploadStore(tmp_path).path("notes.png") is None
+
+
+def test_uploads_are_pushed_once_per_connection(tmp_path):
+    (tmp_path / NAME).write_bytes(b"png")
+    store = UploadStore(tmp_path)
+    node = _node()
+
+    async def scenario():
+        assert await store.push_inputs(node, WORKFLOW)
+        assert await store.push_inputs(node, WORKFLOW)
+        assert node.service.uploads == [NAME]
+
+        # The instance may have restarted with an empty input folder
+        node.listener.connects += 1
+        assert await store.push_inputs(node, WORKFLOW)
+        assert node.service.uploads == [NAME, NAME]
+
+    asyncio.run(scenario())
@@ -0,0 +1,28 @@
+#!/bin/bash
+# Benchmark the Backend API against fake ComfyUI instances (no GPU needed)
+# Traceability: STK-BACKEND-031
+#
+# Usage: ./bench_backend.sh [options]   (see --help)
+#   ./bench_backend.sh --concurrency 1,8,32 --duration 20
+#   ./bench_backend.sh --instances 2 --execution-time 0.5 --label two-gpus
+# Results are saved to backend/benchmark/results/ and compared with the previous run.
+
+set -euo pipefail
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+BACKEND_DIR="$SCRIPT_DIR/backend"
+VENV_PATH="$HOME/.venvs/frontend-backend"
+
+# Activate virtual environment
+if [ ! -d "$VENV_PATH" ]; then
+    echo "[ERROR] Virtual environment not found at $VENV_PATH"
+    echo "[ERROR] Run setup scripts first: setup/0_check_gpu.sh through setup/6_env_export.sh"
+    exit 1
+fi
+
+source "$VENV_PATH/bin/activate"
+
+cd "$BACKEND_DIR"
+
+echo "[INFO] Running backend benchmark..."
+python -m benchmark "$@"